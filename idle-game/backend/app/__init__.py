@@ -12,6 +12,46 @@ def create_app():
 
     db.init_app(app)
 
+    from app import metrics
+    metrics.init_app(app)
+
+    from app.map_pool import MapPool
+    app.extensions['map_pool'] = MapPool(
+        size=app.config['MAP_POOL_SIZE'],
+        workers=app.config['MAP_POOL_WORKERS'],
+    )
+
+    from app.utils.chunks import ChunkedWorld
+    app.extensions['world'] = ChunkedWorld(
+        app.config['WORLD_SEED'],
+        chunk_size=app.config['WORLD_CHUNK_SIZE'],
+        ttl=app.config['WORLD_CHUNK_TTL'],
+        max_chunks=app.config['WORLD_MAX_CHUNKS'],
+    )
+
+    from app.shards import ShardBroker, ShardRegistry
+    app.extensions['shards'] = ShardRegistry(
+        app,
+        ShardBroker(app.config['SHARD_BROKER_PATH'], lease_ttl=app.config['SHARD_LEASE_TTL']),
+        engine_options={
+            'tick_rate': app.config['SIMULATION_TICK_RATE'],
+            'persist_interval': app.config['SIMULATION_PERSIST_INTERVAL'],
+            'max_staleness': app.config['SIMULATION_MAX_STALENESS'],
+            'publish_interval': app.config['SHARD_PUBLISH_INTERVAL'],
+            'crowd_radius': app.config['SIMULATION_CROWD_RADIUS'],
+        },
+    )
+
+    from app.streaming import StreamSlots
+    app.extensions['streams'] = StreamSlots(app.config['STREAM_MAX_PER_WORKER'])
+
+    from app.jobs import JobRunner, JobStore
+    app.extensions['jobs'] = JobRunner(
+        JobStore(app.config['JOBS_STORE_PATH'], timeout=app.config['JOBS_TIMEOUT']),
+        workers=app.config['JOBS_WORKERS'],
+        max_active=app.config['JOBS_MAX_ACTIVE'],
+    )
+
     from app.routes import main as main_routes
     app.register_blueprint(main_routes)
 
@@ -0,0 +1,347 @@
+# app/jobs.py
+import inspect
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.shards import LocalStore
+from app.utils.generator import MapGenerator, check_seed, check_size
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are queued or running"""
+
+
+class JobStore(LocalStore):
+    """Job records and progress, shared by every worker process and the job processes
+
+    A job is queued, then running, then done, failed or cancelled. Cancelling
+    a queued job finishes it at once; a running job sees the request the
+    next time it reports progress.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            state TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            owner TEXT,
+            cancel INTEGER NOT NULL DEFAULT 0,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_jobs_state ON jobs (state, updated);
+        CREATE INDEX IF NOT EXISTS ix_jobs_kind ON jobs (kind, created);
+    """
+    COLUMNS = ('id', 'kind', 'state', 'progress', 'message', 'result', 'error', 'created', 'updated')
+
+    def __init__(self, path, timeout=300.0, retention=86400.0):
+        self.timeout = timeout
+        self.retention = retention
+        super().__init__(path)
+
+    def create(self, kind, params, max_active=None, now=None, uncapped=()):
+        """Queue a job; raise JobQueueFull when max_active jobs are already queued or running
+
+        Jobs of the uncapped kinds neither count toward max_active nor are held to it.
+        """
+        now = time.time() if now is None else now
+        job_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            # Jobs whose process died stop counting once they go quiet for the timeout
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'Timed out', updated = ? "
+                "WHERE state IN ('queued', 'running') AND updated < ?",
+                (now, now - self.timeout),
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE state NOT IN ('queued', 'running') AND updated < ?",
+                (now - self.retention,),
+            )
+            if max_active is not None and kind not in uncapped:
+                active = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running') "
+                    f"AND kind NOT IN ({', '.join('?' * len(uncapped))})",
+                    tuple(uncapped),
+                ).fetchone()[0]
+                if active >= max_active:
+                    raise JobQueueFull(f'{active} jobs are already queued or running')
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, state, created, updated) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(params), now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._to_dict(row)
+
+    def latest(self, kind):
+        """The most recently created job of a kind, or None"""
+        row = self._connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE kind = ? ORDER BY created DESC LIMIT 1",
+            (kind,),
+        ).fetchone()
+        return self._to_dict(row)
+
+    def start(self, job_id, owner, now=None):
+        """Mark a queued job running; False if it was cancelled (or taken) meanwhile"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET state = 'running', owner = ?, updated = ? "
+                "WHERE id = ? AND state = 'queued' AND cancel = 0",
+                (owner, now, job_id),
+            ).rowcount
+        return updated == 1
+
+    def report(self, job_id, progress, message=None, now=None):
+        """Record progress of a running job; return whether cancellation was requested"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message), updated = ? "
+                "WHERE id = ? AND state = 'running'",
+                (progress, message, now, job_id),
+            )
+            row = conn.execute('SELECT cancel FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id, state, result=None, error=None, now=None):
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, updated = ?, "
+                "progress = CASE WHEN ? = 'done' THEN 100 ELSE progress END "
+                "WHERE id = ? AND state IN ('queued', 'running')",
+                (state, json.dumps(result), error, now, state, job_id),
+            )
+
+    def cancel(self, job_id, now=None):
+        """Request cancellation; return the job, or None if there is no such job"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET cancel = 1, updated = ?, "
+                "state = CASE WHEN state = 'queued' THEN 'cancelled' ELSE state END "
+                "WHERE id = ? AND state IN ('queued', 'running')",
+                (now, job_id),
+            )
+        return self.get(job_id)
+
+    def _to_dict(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+
+class JobContext:
+    """Handed to a running job: reports progress and delivers cancellation"""
+
+    def __init__(self, store, job_id, min_interval=0.1):
+        self.store = store
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_report = 0.0
+        self._message = None
+
+    def progress(self, percent, message=None):
+        """Report progress (0-100); raises JobCancelled if the job was cancelled
+
+        Reports closer together than min_interval are dropped unless they
+        carry a new message, so a tight loop may call this freely.
+        """
+        now = time.monotonic()
+        fresh = message is not None and message != self._message
+        if now - self._last_report < self.min_interval and percent < 100 and not fresh:
+            return
+        self._last_report = now
+        self._message = message if message is not None else self._message
+        if self.store.report(self.job_id, round(percent, 1), message):
+            raise JobCancelled()
+
+
+# Job kinds: functions taking the JobContext and the job's parameters.
+# They run in the job processes, inside an app context, except the THREAD_KINDS.
+
+def loading_job(job, steps=100, delay=0.03):
+    """Stand-in loading task behind /api/start-process"""
+    for step in range(steps + 1):
+        job.progress(100 * step / steps)
+        time.sleep(delay)
+
+
+def generate_map_job(job, width=800, height=600, seed=None):
+    """Generate a map, store it and make it the default world"""
+    from app.routes import save_map
+
+    def attempt(number, attempts):
+        job.progress(80 * (number - 1) / attempts, f'Generating layout (attempt {number})')
+
+    width, height = check_size(width, height)
+    generator = MapGenerator(width, height, seed=None if seed is None else check_seed(seed))
+    map_data = generator.generate_map(progress=attempt)
+    job.progress(90, 'Saving map')
+    return {'map_id': save_map(map_data).id, 'seed': map_data['seed']}
+
+
+JOB_KINDS = {
+    'loading': loading_job,
+    'generate_map': generate_map_job,
+}
+
+# Kinds that only wait rather than compute: they run on a thread of the submitting
+# worker, without an app context, and neither occupy a job process nor count
+# toward max_active
+THREAD_KINDS = frozenset({'loading'})
+
+
+# State of a job process, set up once by _init_process
+_process = {}
+
+
+def _init_process(store_path, timeout):
+    from app import create_app
+
+    _process['app'] = create_app()
+    _process['store'] = JobStore(store_path, timeout=timeout)
+
+
+def run_job(job_id, kind, params):
+    """Run one job in a job process"""
+    with _process['app'].app_context():
+        execute(_process['store'], job_id, kind, params)
+
+
+def execute(store, job_id, kind, params):
+    """Run one job and record how it ended"""
+    if not store.start(job_id, f'{socket.gethostname()}:{os.getpid()}'):
+        return
+    try:
+        result = JOB_KINDS[kind](JobContext(store, job_id), **params)
+    except JobCancelled:
+        store.finish(job_id, 'cancelled')
+    except Exception as error:
+        store.finish(job_id, 'failed', error=f'{type(error).__name__}: {error}')
+    else:
+        store.finish(job_id, 'done', result=result)
+
+
+class JobRunner:
+    """Runs jobs on a bounded pool of processes started by this worker
+
+    The pool has workers processes per web worker, and at most max_active
+    jobs may be queued or running across all web workers at once. Jobs of
+    the THREAD_KINDS run on up to threads threads instead and are not
+    capped. Records and progress live in the JobStore, so any worker can
+    report on (or cancel) a job another worker started.
+    """
+
+    def __init__(self, store, workers=1, max_active=16, threads=4):
+        self.store = store
+        self.workers = workers
+        self.max_active = max_active
+        self.threads = threads
+        self._threads = None
+        self._executor = None
+        self._pid = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, params=None):
+        """Queue a job and return its record
+
+        Raises ValueError for an unknown kind or parameters it does not take,
+        and JobQueueFull when too many jobs are active.
+        """
+        params = dict(params or {})
+        function = JOB_KINDS.get(kind)
+        if function is None:
+            raise ValueError(f'Unknown job kind: {kind}')
+        try:
+            inspect.signature(function).bind(None, **params)
+        except TypeError as error:
+            raise ValueError(str(error))
+
+        job = self.store.create(kind, params, self.max_active, uncapped=THREAD_KINDS)
+        with self._lock:
+            if kind in THREAD_KINDS:
+                future = self._thread_pool().submit(execute, self.store, job['id'], kind, params)
+            else:
+                future = self._pool().submit(run_job, job['id'], kind, params)
+            self._futures[job['id']] = future
+        future.add_done_callback(lambda done: self._collect(job['id'], done))
+        return job
+
+    def cancel(self, job_id):
+        job = self.store.cancel(job_id)
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()  # only succeeds while it waits in this worker's queue
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _pool(self):
+        if self._pid != os.getpid():
+            # A forked worker cannot use its parent's pool
+            self._executor = None
+            self._futures = {}
+        if self._executor is None:
+            # spawn: forking a process that runs threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process,
+                initargs=(self.store.path, self.store.timeout),
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def _thread_pool(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job')
+        return self._threads
+
+    def _collect(self, job_id, future):
+        error = None if future.cancelled() else future.exception()
+        with self._lock:
+            self._futures.pop(job_id, None)
+            if isinstance(error, BrokenProcessPool) and self._executor is not None:
+                # A job process died; the next job gets a fresh pool
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        if future.cancelled():
+            self.store.finish(job_id, 'cancelled')
+        elif error is not None:
+            self.store.finish(job_id, 'failed', error=f'Job process failed: {error}')
+
+    def shutdown(self):
+        with self._lock:
+            executors = (self._executor, self._threads)
+            self._executor = self._threads = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
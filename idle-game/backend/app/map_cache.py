@@ -0,0 +1,245 @@
+# app/map_cache.py
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional: without it maps are only served gzip-compressed
+    brotli = None
+
+from app.utils.binary import encode_map
+from app.utils.movement import points_to_array
+from app.utils.pathfinding import PathFinder
+from app.utils.tiles import MAX_ZOOM, MIN_ZOOM, NATIVE_ZOOM, MapLayer
+
+# Content codings maps are precompressed with, in order of preference
+ENCODINGS = ('br', 'gzip', 'identity') if brotli is not None else ('gzip', 'identity')
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return body
+
+
+class CompiledMap:
+    """Parsed in-memory view of a GameMap row with its PathFinder attached"""
+
+    def __init__(self, game_map):
+        self.id = game_map.id
+        self.created_at = game_map.created_at
+        self.width = game_map.width
+        self.height = game_map.height
+        self.seed = game_map.seed
+
+        # PathFinder parses the JSON columns once; reuse its structures
+        self.pathfinder = PathFinder(game_map)
+        self.buildings = self.pathfinder.buildings
+        self.trees = self.pathfinder.trees
+        self.paths = self.pathfinder.paths
+        self.points = self.paths.get('points', []) if isinstance(self.paths, dict) else []
+        self.point_array = points_to_array(self.points)
+        self._binary = None
+        self._line_boxes = None
+        self._bodies = {}  # (binary, encoding) -> (body, etag)
+        self._layer = None
+        self._layer_lock = threading.Lock()
+
+    @property
+    def key(self):
+        return (self.id, self.created_at)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'width': self.width,
+            'height': self.height,
+            'seed': self.seed,
+            'buildings': self.buildings,
+            'trees': self.trees,
+            'paths': self.paths
+        }
+
+    @property
+    def lines(self):
+        return self.paths.get('lines', []) if isinstance(self.paths, dict) else []
+
+    @property
+    def line_boxes(self):
+        """Bounding box of every path line as an (n, 4) array, built on first use"""
+        if self._line_boxes is None:
+            ends = np.array(
+                [[ln['x1'], ln['y1'], ln['x2'], ln['y2']] for ln in self.lines], dtype=np.float64
+            ).reshape(-1, 4)
+            self._line_boxes = np.concatenate(
+                [np.minimum(ends[:, :2], ends[:, 2:]), np.maximum(ends[:, :2], ends[:, 2:])], axis=1
+            )
+        return self._line_boxes
+
+    def region(self, box):
+        """to_dict() cut down to the buildings, trees, lines and points overlapping a box"""
+        min_x, min_y, max_x, max_y = box
+        pathfinder = self.pathfinder
+        lines = self.lines
+
+        def overlapping(boxes):
+            return np.flatnonzero(
+                (boxes[:, 0] <= max_x) & (boxes[:, 2] >= min_x)
+                & (boxes[:, 1] <= max_y) & (boxes[:, 3] >= min_y)
+            ).tolist()
+
+        circles = pathfinder.tree_circles
+        tree_boxes = np.concatenate(
+            [circles[:, :2] - circles[:, 2:], circles[:, :2] + circles[:, 2:]], axis=1
+        )
+        return {
+            **self.to_dict(),
+            'viewport': [min_x, min_y, max_x, max_y],
+            'buildings': [self.buildings[i] for i in overlapping(pathfinder.building_boxes)],
+            'trees': [self.trees[i] for i in overlapping(tree_boxes)],
+            'paths': {
+                'lines': [lines[i] for i in overlapping(self.line_boxes)],
+                'points': [self.points[i] for i in pathfinder.point_cells.in_box(*box).tolist()],
+            },
+        }
+
+    @property
+    def layer(self):
+        """The static layer (buildings, trees, path lines) as image tiles, built on first use"""
+        if self._layer is None:
+            with self._layer_lock:
+                if self._layer is None:
+                    self._layer = MapLayer(self.width, self.height, self.buildings, self.trees, self.lines)
+        return self._layer
+
+    def to_binary(self):
+        """Binary snapshot of the map, encoded on first use"""
+        if self._binary is None:
+            self._binary = encode_map(self.to_dict())
+        return self._binary
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'), sort_keys=True).encode()
+
+    def body(self, binary=False, encoding='identity'):
+        """Return (body, etag) of one representation, serialized and compressed once per map
+
+        Maps never change after creation, so the body and its strong ETag stay
+        valid for the life of the map. Each content coding gets its own ETag.
+        """
+        key = (binary, encoding)
+        cached = self._bodies.get(key)
+        if cached is None:
+            raw = self.to_binary() if binary else self.to_json()
+            etag = hashlib.sha256(raw).hexdigest()[:32]
+            if encoding != 'identity':
+                etag = f'{etag}-{encoding}'
+            cached = self._bodies[key] = (compress(raw, encoding), etag)
+        return cached
+
+    def warm(self, tile_zoom=NATIVE_ZOOM):
+        """Build now what requests would otherwise build on first use
+
+        That is every precompressed body, the line boxes behind region() and
+        the static layer's tiles up to tile_zoom (-1 renders none).
+        """
+        for binary in (False, True):
+            for encoding in ENCODINGS:
+                self.body(binary, encoding)
+        self.line_boxes  # built on first access
+        for zoom in range(MIN_ZOOM, min(tile_zoom, MAX_ZOOM) + 1):
+            columns, rows = self.layer.grid_size(zoom)
+            for x in range(columns):
+                for y in range(rows):
+                    self.layer.tile(zoom, x, y)
+
+
+class MapCache:
+    """Per-process LRU cache of compiled maps, invalidated by map id and created_at
+
+    Each compiled map holds its pathfinder grid, compressed bodies and
+    rendered tiles, so only the maxsize most recently used maps are kept.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._maps = OrderedDict()
+        self._current_id = None
+        self._lock = threading.Lock()
+
+    def compile(self, game_map):
+        """Return the compiled form of a loaded GameMap row, reusing it if unchanged"""
+        with self._lock:
+            compiled = self._maps.get(game_map.id)
+            if compiled is not None and compiled.key == (game_map.id, game_map.created_at):
+                self._maps.move_to_end(game_map.id)
+                return compiled
+
+        compiled = CompiledMap(game_map)
+        with self._lock:
+            self._maps[game_map.id] = compiled
+            self._maps.move_to_end(game_map.id)
+            while len(self._maps) > self.maxsize:
+                self._maps.popitem(last=False)
+        return compiled
+
+    def peek(self, map_id):
+        """Return a compiled map by id if it is cached, without reading the database"""
+        with self._lock:
+            compiled = self._maps.get(map_id)
+            if compiled is not None:
+                self._maps.move_to_end(map_id)
+        return compiled
+
+    def get(self, map_id):
+        """Return a compiled map by id, only reading the database on a miss"""
+        compiled = self.peek(map_id)
+        if compiled is not None:
+            return compiled
+
+        from app.models import GameMap, db
+        game_map = db.session.get(GameMap, map_id)
+        return self.compile(game_map) if game_map else None
+
+    def current(self):
+        """Return the compiled active map (the newest map row), or None if there is none"""
+        with self._lock:
+            current_id = self._current_id
+        if current_id is not None:
+            compiled = self.get(current_id)
+            if compiled is not None:
+                return compiled
+
+        from app.models import GameMap
+        game_map = GameMap.query.order_by(GameMap.id.desc()).first()
+        if not game_map:
+            return None
+        return self.set_current(game_map)
+
+    def set_current(self, game_map):
+        """Compile a map row and make it the active map for this process"""
+        compiled = self.compile(game_map)
+        with self._lock:
+            self._current_id = compiled.id
+        return compiled
+
+    def invalidate(self, map_id=None):
+        """Forget one compiled map, or all of them when map_id is None"""
+        with self._lock:
+            if map_id is None:
+                self._maps.clear()
+                self._current_id = None
+            else:
+                self._maps.pop(map_id, None)
+                if self._current_id == map_id:
+                    self._current_id = None
+
+
+map_cache = MapCache()
@@ -0,0 +1,90 @@
+# app/map_pool.py
+import multiprocessing
+import random
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.generator import MapGenerator
+
+
+def is_valid_map(map_data):
+    """A generated map is usable unless generate_map fell back to the empty map"""
+    return bool(map_data["buildings"]) and bool(map_data["paths"]["points"])
+
+
+def generate_valid_map(width, height, seed, max_seeds=5):
+    """Generate maps from successive seeds until one is valid (runs in a worker process)
+
+    Returns None when every seed fell back to the empty map.
+    """
+    seeds = random.Random(seed)
+    for _ in range(max_seeds):
+        map_data = MapGenerator(width, height, seed=seed).generate_map()
+        if is_valid_map(map_data):
+            return map_data
+        seed = seeds.randrange(2**32)
+    return None
+
+
+class MapPool:
+    """Keeps pre-generated maps ready so creating a map never blocks on generation"""
+
+    def __init__(self, size=2, width=800, height=600, workers=1):
+        self.size = size
+        self.width = width
+        self.height = height
+        self.workers = workers
+        self._ready = deque()
+        self._pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ready)
+
+    def start(self):
+        """Start the worker processes and begin filling the pool"""
+        with self._lock:
+            if self._executor is None and self.size > 0:
+                # spawn: forking a process that runs threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+        self._refill()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def take(self):
+        """Return a ready map dict, or None if the pool is empty"""
+        with self._lock:
+            map_data = self._ready.popleft() if self._ready else None
+        self._refill()
+        return map_data
+
+    def _refill(self):
+        futures = []
+        with self._lock:
+            if self._executor is None:
+                return
+            missing = self.size - len(self._ready) - self._pending
+            for _ in range(max(0, missing)):
+                futures.append(self._executor.submit(
+                    generate_valid_map, self.width, self.height, random.randrange(2**32)
+                ))
+                self._pending += 1
+        # Outside the lock: a future that is already done runs _collect right here
+        for future in futures:
+            future.add_done_callback(self._collect)
+
+    def _collect(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None or future.result() is None:
+                return
+            self._ready.append(future.result())
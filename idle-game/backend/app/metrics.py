@@ -0,0 +1,357 @@
+# app/metrics.py
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounts
+
+from flask import g, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds: from sub-millisecond cache hits to multi-second map generation
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+SIZE_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    """A named metric with one value per combination of label values
+
+    Label values are passed positionally, in the order of labelnames, so the
+    hot path is a tuple lookup and an update under a lock.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def dump(self):
+        with self._lock:
+            return [[list(labels), self._copy(value)] for labels, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Counts observations into fixed buckets and keeps their sum
+
+    Each value is [count per bucket..., count above the last bucket, sum].
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the seconds spent inside it"""
+        return Timer(self, labels)
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+
+class Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    """Every metric of this process, rendered in the Prometheus text format
+
+    Metrics live per process. dump() gives a JSON-able copy another process
+    can merge with its own (see render), so one scrape can report every
+    worker: counters, histograms and gauges are summed across processes.
+    """
+
+    def __init__(self, prefix='idle_game_'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets)
+
+    def dump(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                'kind': metric.kind,
+                'help': metric.help,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'values': metric.dump(),
+            }
+            for metric in metrics
+        }
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self, others=()):
+        """Prometheus text exposition of this process merged with dumps from other processes"""
+        merged = merge([self.dump(), *others])
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {_escape_help(metric['help'])}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            labelnames = metric['labelnames']
+            values = sorted(metric['values'].items(), key=lambda item: tuple(map(str, item[0])))
+            for labels, value in values:
+                pairs = list(zip(labelnames, labels))
+                if metric['kind'] != 'histogram':
+                    lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + [math.inf], value):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _number(bound)
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def merge(dumps):
+    """Sum Registry.dump() results; values are keyed by label tuple"""
+    merged = {}
+    for dump in dumps:
+        for name, metric in dump.items():
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = {**metric, 'values': {}}
+            elif target['kind'] != metric['kind'] or target['buckets'] != metric['buckets']:
+                continue  # a worker running other code; its samples cannot be combined
+            values = target['values']
+            for labels, value in metric['values']:
+                labels = tuple(labels)
+                current = values.get(labels)
+                if current is None:
+                    values[labels] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    values[labels] = [a + b for a, b in zip(current, value)]
+                else:
+                    values[labels] = current + value
+    return merged
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return repr(int(value)) if abs(value) < 2**53 else repr(value)
+    return repr(value)
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread at a fixed interval
+
+    Counts are kept per folded stack ("thread;module:function;..." root
+    first), the input format of flame graph tools. The sampler only reads
+    sys._current_frames(), so the sampled threads pay nothing; the cost is
+    the sampler's own CPU, about 50 microseconds per thread per sample.
+    """
+
+    def __init__(self, interval=0.01, max_depth=48, max_stacks=10000):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self._stacks = StackCounts()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling in this process (again after a fork, which does not copy threads)"""
+        with self._lock:
+            if self.running:
+                return
+            if self._pid != os.getpid():
+                self._stacks.clear()
+                self.samples = 0
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                self._fold(names.get(ident, str(ident)), frame)
+                for ident, frame in sys._current_frames().items() if ident != own
+            ]
+            with self._lock:
+                self.samples += 1
+                for stack in stacks:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self._stacks['(other)'] += 1
+
+    def _fold(self, thread_name, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        names.append(thread_name)
+        return ';'.join(reversed(names))
+
+    def folded(self):
+        """The sampled stacks as 'stack count' lines, most frequent first"""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+    def clear(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+
+metrics = Registry()
+profiler = SamplingProfiler()
+
+ENCODE_SECONDS = metrics.histogram(
+    'encode_duration_seconds', 'Time spent serializing response bodies', ('format',)
+)
+DB_QUERY_SECONDS = metrics.histogram(
+    'db_query_duration_seconds', 'Time spent in database statements', ('statement',)
+)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing every dumps (and so every jsonify)"""
+
+    def dumps(self, obj, **kwargs):
+        with ENCODE_SECONDS.time('json'):
+            return super().dumps(obj, **kwargs)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A connection runs one statement at a time, so one start time is enough.
+    # A statement that raises never reaches _after_cursor_execute, and the next
+    # statement simply overwrites its start time.
+    conn.info['query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_start', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    verb = statement.lstrip()[:6].upper()
+    DB_QUERY_SECONDS.observe(elapsed, verb if verb in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else 'OTHER')
+    if has_request_context():
+        g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+
+
+def init_app(app):
+    """Time JSON encoding and database statements, and set up the profiler if configured"""
+    app.json = TimedJSONProvider(app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    interval = app.config.get('METRICS_PROFILE_INTERVAL', 0)
+    if interval > 0:
+        # Started by the first request, so each forked worker samples its own threads
+        profiler.interval = interval
+        app.extensions['profiler'] = profiler
@@ -3,30 +3,221 @@ from app import db
 from datetime import datetime
 import json
 from flask import current_app
-from flask_sqlalchemy import SQLAlchemy
-
-db = SQLAlchemy()
-db = SQLAlchemy()
+from sqlalchemy import insert, select
+from sqlalchemy.orm import declared_attr
 
 class GameMap(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     width = db.Column(db.Integer, default=800)
     height = db.Column(db.Integer, default=600)
-    buildings = db.Column(db.Text)  # JSON string
-    trees = db.Column(db.Text)      # JSON string
-    paths = db.Column(db.Text)      # JSON string
+    # JSON strings, only set on maps saved before the geometry tables below existed
+    buildings = db.Column(db.Text)
+    trees = db.Column(db.Text)
+    paths = db.Column(db.Text)
+    seed = db.Column(db.BigInteger)  # MapGenerator seed that reproduces this map
+    grid = db.Column(db.LargeBinary(length=2**24))  # bit-packed walkability grid (see pack_grid)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+
+    @classmethod
+    def create(cls, map_data):
+        """Add a generated map (a generate_map() dict) and its geometry rows to the session"""
+        game_map = cls(
+            width=map_data['width'],
+            height=map_data['height'],
+            seed=map_data.get('seed'),
+            grid=map_data.get('grid')
+        )
+        db.session.add(game_map)
+        db.session.flush()
+        paths = map_data.get('paths') or {}
+        items = {
+            MapBuilding: map_data.get('buildings') or [],
+            MapTree: map_data.get('trees') or [],
+            MapPathLine: paths.get('lines') or [],
+            MapPathPoint: paths.get('points') or [],
+        }
+        for model, rows in items.items():
+            if rows:
+                db.session.execute(insert(model), [model.row(game_map.id, item) for item in rows])
+        return game_map
+
+    def geometry(self, box=None):
+        """Buildings, trees and paths of the map, or only those overlapping a box
+
+        box is (min_x, min_y, max_x, max_y). Rows are read with one indexed
+        query per table, without loading the rest of the map.
+        """
+        if self.buildings is not None:
+            return self._legacy_geometry(box)
+        return {
+            'buildings': MapBuilding.load(self.id, box),
+            'trees': MapTree.load(self.id, box),
+            'paths': {
+                'lines': MapPathLine.load(self.id, box),
+                'points': MapPathPoint.load(self.id, box),
+            },
+        }
+
+    def _legacy_geometry(self, box):
+        paths = json.loads(self.paths) if self.paths else {}
+        geometry = {
+            'buildings': json.loads(self.buildings) if self.buildings else [],
+            'trees': json.loads(self.trees) if self.trees else [],
+            'paths': {'lines': paths.get('lines', []), 'points': paths.get('points', [])},
+        }
+        if box is None:
+            return geometry
+        return {
+            'buildings': MapBuilding.within(geometry['buildings'], box),
+            'trees': MapTree.within(geometry['trees'], box),
+            'paths': {
+                'lines': MapPathLine.within(geometry['paths']['lines'], box),
+                'points': MapPathPoint.within(geometry['paths']['points'], box),
+            },
+        }
+
     def to_dict(self):
         return {
             'id': self.id,
             'width': self.width,
             'height': self.height,
-            'buildings': json.loads(self.buildings) if self.buildings else [],
-            'trees': json.loads(self.trees) if self.trees else [],
-            'paths': json.loads(self.paths) if self.paths else []
+            'seed': self.seed,
+            **self.geometry()
+        }
+
+    def region(self, box):
+        """to_dict() cut down to the geometry overlapping a box, as CompiledMap.region returns it"""
+        return {
+            'id': self.id,
+            'width': self.width,
+            'height': self.height,
+            'seed': self.seed,
+            **self.geometry(box),
+            'viewport': list(box),
         }
 
+class MapGeometry:
+    """A table of one kind of map geometry, with bounding-box columns for region queries
+
+    Subclasses list the FIELDS a to_dict()-style item has and compute its
+    bounds. The (map_id, min_x, max_x, min_y, max_y) index covers every
+    region predicate, so a query reads index entries only for rows whose
+    min_x is left of the region's right edge.
+    """
+
+    FIELDS = ()
+
+    id = db.Column(db.Integer, primary_key=True)
+    min_x = db.Column(db.Float, nullable=False)
+    min_y = db.Column(db.Float, nullable=False)
+    max_x = db.Column(db.Float, nullable=False)
+    max_y = db.Column(db.Float, nullable=False)
+
+    @declared_attr
+    def map_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('game_map.id', ondelete='CASCADE'), nullable=False)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (db.Index(f'ix_{cls.__tablename__}_region', 'map_id', 'min_x', 'max_x', 'min_y', 'max_y'),)
+
+    @staticmethod
+    def bounds(item):
+        raise NotImplementedError
+
+    @classmethod
+    def row(cls, map_id, item):
+        min_x, min_y, max_x, max_y = cls.bounds(item)
+        return {
+            'map_id': map_id, 'min_x': min_x, 'min_y': min_y, 'max_x': max_x, 'max_y': max_y,
+            **{field: item.get(field) for field in cls.FIELDS}
+        }
+
+    @classmethod
+    def overlaps(cls, box):
+        min_x, min_y, max_x, max_y = box
+        return (cls.min_x <= max_x) & (cls.max_x >= min_x) & (cls.min_y <= max_y) & (cls.max_y >= min_y)
+
+    @classmethod
+    def load(cls, map_id, box=None):
+        """Items of a map in insertion order, optionally only those overlapping box"""
+        query = select(*(getattr(cls, field) for field in cls.FIELDS)).where(cls.map_id == map_id)
+        if box is not None:
+            query = query.where(cls.overlaps(box))
+        rows = db.session.execute(query.order_by(cls.id))
+        return [dict(zip(cls.FIELDS, row)) for row in rows]
+
+    @classmethod
+    def within(cls, items, box):
+        """Filter already loaded items the way load() filters rows"""
+        min_x, min_y, max_x, max_y = box
+        kept = []
+        for item in items:
+            left, top, right, bottom = cls.bounds(item)
+            if left <= max_x and right >= min_x and top <= max_y and bottom >= min_y:
+                kept.append(item)
+        return kept
+
+class MapBuilding(MapGeometry, db.Model):
+    __tablename__ = 'map_buildings'
+    FIELDS = ('x', 'y', 'width', 'height', 'color')
+
+    x = db.Column(db.Integer, nullable=False)
+    y = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    color = db.Column(db.String(7))
+
+    @staticmethod
+    def bounds(item):
+        return item['x'], item['y'], item['x'] + item['width'], item['y'] + item['height']
+
+class MapTree(MapGeometry, db.Model):
+    __tablename__ = 'map_trees'
+    FIELDS = ('x', 'y', 'size', 'color')
+
+    x = db.Column(db.Integer, nullable=False)
+    y = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    color = db.Column(db.String(7))
+
+    @staticmethod
+    def bounds(item):
+        return item['x'] - item['size'], item['y'] - item['size'], item['x'] + item['size'], item['y'] + item['size']
+
+class MapPathLine(MapGeometry, db.Model):
+    __tablename__ = 'map_path_lines'
+    FIELDS = ('x1', 'y1', 'x2', 'y2', 'color')
+
+    x1 = db.Column(db.Integer, nullable=False)
+    y1 = db.Column(db.Integer, nullable=False)
+    x2 = db.Column(db.Integer, nullable=False)
+    y2 = db.Column(db.Integer, nullable=False)
+    color = db.Column(db.String(7))
+
+    @staticmethod
+    def bounds(item):
+        return (
+            min(item['x1'], item['x2']), min(item['y1'], item['y2']),
+            max(item['x1'], item['x2']), max(item['y1'], item['y2']),
+        )
+
+class MapPathPoint(MapGeometry, db.Model):
+    __tablename__ = 'map_path_points'
+    FIELDS = ('x', 'y')
+
+    # Points are fractional; a single-precision FLOAT would move them off their paths
+    x = db.Column(db.Double, nullable=False)
+    y = db.Column(db.Double, nullable=False)
+    min_x = db.Column(db.Double, nullable=False)
+    min_y = db.Column(db.Double, nullable=False)
+    max_x = db.Column(db.Double, nullable=False)
+    max_y = db.Column(db.Double, nullable=False)
+
+    @staticmethod
+    def bounds(item):
+        return item['x'], item['y'], item['x'], item['y']
+
 class Character(db.Model):
     __tablename__ = 'characters'
     id = db.Column(db.Integer, primary_key=True)
@@ -38,7 +229,7 @@ class Character(db.Model):
     target_y = db.Column(db.Float, default=100.0)
     speed = db.Column(db.Float, default=2.0)
     color = db.Column(db.String(7), default='#3498db')
-    map_id = db.Column(db.Integer, db.ForeignKey('game_map.id'), default=1)
+    map_id = db.Column(db.Integer, db.ForeignKey('game_map.id'), default=1, index=True)
     last_update = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -0,0 +1,91 @@
+# app/persistence.py
+import time
+
+from sqlalchemy import case, update
+
+from app.metrics import metrics
+
+FLUSH_SECONDS = metrics.histogram('persist_flush_seconds', 'Time to write changed characters back')
+ROWS_WRITTEN = metrics.counter('persist_rows_total', 'Character rows written by write-behind flushes')
+FLUSH_FAILURES = metrics.counter('persist_failures_total', 'Write-behind flushes that failed')
+
+
+class WriteBehind:
+    """Flushes changed character rows in bulk on a schedule instead of on every change
+
+    flush_interval is the normal spacing between flushes. max_staleness caps how
+    long a pending change may wait. After a failed flush, retries back off
+    exponentially, but never past the staleness limit.
+    """
+
+    COLUMNS = ('x', 'y', 'target_x', 'target_y', 'last_update')
+
+    def __init__(self, flush_interval=5.0, max_staleness=30.0, batch_size=1000):
+        self.flush_interval = flush_interval
+        self.max_staleness = max(max_staleness, flush_interval)
+        self.batch_size = batch_size
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+
+        now = time.monotonic()
+        self._last_flush = now
+        self._pending_since = None
+        self._retry_at = None
+
+    def mark_pending(self, now=None):
+        """Record that there are changes waiting to be written"""
+        if self._pending_since is None:
+            self._pending_since = time.monotonic() if now is None else now
+
+    def due(self, now=None):
+        """Whether pending changes should be flushed now"""
+        if self._pending_since is None:
+            return False
+        now = time.monotonic() if now is None else now
+        if self._retry_at is not None:
+            # Backing off after a failure: stale changes wait for the retry too
+            return now >= self._retry_at
+        if now - self._pending_since >= self.max_staleness:
+            return True
+        return now - self._last_flush >= self.flush_interval
+
+    def flush(self, rows, session, model, now=None):
+        """Write rows (dicts with 'id' and COLUMNS) with one CASE update per batch"""
+        now = time.monotonic() if now is None else now
+        started = time.monotonic()
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                session.execute(self.bulk_update(model, rows[start:start + self.batch_size]))
+            session.commit()
+        except Exception:
+            session.rollback()
+            FLUSH_FAILURES.inc()
+            self.failures += 1
+            delay = min(self.flush_interval * 2 ** self.failures, self.max_staleness)
+            self._retry_at = now + delay
+            raise
+
+        FLUSH_SECONDS.observe(time.monotonic() - started)
+        ROWS_WRITTEN.inc(amount=len(rows))
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self.failures = 0
+        self._retry_at = None
+        self._last_flush = now
+        self._pending_since = None
+        return len(rows)
+
+    def bulk_update(self, model, rows):
+        """UPDATE ... SET col = CASE id WHEN ... THEN ... END ... WHERE id IN (...)"""
+        ids = [row['id'] for row in rows]
+        values = {
+            column: case({row['id']: row[column] for row in rows}, value=model.id)
+            for column in self.COLUMNS
+        }
+        return (
+            update(model)
+            .where(model.id.in_(ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,58 @@
+# app/preload.py
+import gc
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.map_cache import map_cache
+from app.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+def preload(app):
+    """Compile and warm the newest maps in this process, then get it ready to fork
+
+    Run in the gunicorn master with preload_app (see gunicorn.conf.py). The
+    workers forked afterwards start with every preloaded map compiled, its
+    bodies compressed and its low-zoom tiles rendered, and share those pages
+    with the master copy-on-write instead of each querying and parsing the
+    maps on their first requests. Returns the ids of the maps loaded.
+    """
+    count = app.config['MAP_PRELOAD_COUNT']
+    if count <= 0:
+        return []
+
+    from app.models import GameMap, db
+    loaded = []
+    with app.app_context():
+        try:
+            map_ids = db.session.execute(
+                select(GameMap.id).order_by(GameMap.id.desc()).limit(count)
+            ).scalars().all()
+            default_id = app.extensions['shards'].broker.default_map()
+            if default_id is not None and default_id not in map_ids:
+                map_ids.append(default_id)
+            for map_id in map_ids:
+                compiled = map_cache.get(map_id)
+                if compiled is not None:
+                    compiled.warm(app.config['MAP_PRELOAD_TILE_ZOOM'])
+                    loaded.append(map_id)
+            map_cache.current()
+        except SQLAlchemyError as error:
+            # Workers still load maps on demand; a missing database must not stop the server
+            log.warning('Map preload failed: %s', error)
+        finally:
+            db.session.remove()
+            # Forked workers must open their own connections, not share the master's sockets
+            db.engine.dispose()
+
+    # The workers would otherwise each report the master's preload work as their own
+    metrics.clear()
+    # Keep the collector from writing to every preloaded object in each worker,
+    # which would copy the shared pages
+    gc.collect()
+    gc.freeze()
+    log.info('Preloaded maps %s', loaded)
+    return loaded
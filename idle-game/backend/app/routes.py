@@ -1,140 +1,585 @@
 # app/routes.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, abort, current_app, g, jsonify, request, stream_with_context
 from app.models import GameMap, Character, db
-from app.utils.generator import MapGenerator
-from app.utils.pathfinding import PathFinder
+from app.utils.generator import MapGenerator, check_seed, check_size
+from app.simulation import get_engine
+from app.map_cache import ENCODINGS, map_cache
+from app.jobs import JobQueueFull
+from app.metrics import CONTENT_TYPE, ENCODE_SECONDS, metrics
+from app.streaming import WorldStream
+from app.utils import binary, tiles
+from sqlalchemy import insert, select
+import numpy as np
+import math
 import random
-import json 
+import re
+import time
 
 main = Blueprint('main', __name__)
 
+COLOR = re.compile(r'#[0-9a-fA-F]{6}')
+
+REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Time to build a response', ('endpoint', 'method', 'status')
+)
+REQUEST_DB_SECONDS = metrics.histogram(
+    'http_request_db_seconds', 'Database time spent per request', ('endpoint',)
+)
+
+@main.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.db_seconds = 0.0
+    profiler = current_app.extensions.get('profiler')
+    if profiler is not None and not profiler.running:
+        profiler.start()
+
+@main.after_request
+def record_request(response):
+    # Streaming responses are timed up to their first byte
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - g.request_start, endpoint, request.method, response.status_code
+    )
+    REQUEST_DB_SECONDS.observe(g.db_seconds, endpoint)
+    return response
+
+def wants_binary():
+    """True when the client prefers the binary snapshot format over JSON"""
+    best = request.accept_mimetypes.best_match(['application/json', binary.MIME_TYPE])
+    return best == binary.MIME_TYPE
+
+def save_map(map_data):
+    """Store a generated map as a new world and make it the default one"""
+    game_map = GameMap.create(map_data)
+    db.session.commit()
+    # Other worker processes learn about the new default world through the broker
+    current_app.extensions['shards'].broker.set_default_map(game_map.id)
+    return map_cache.set_current(game_map)
+
+def take_pooled_map():
+    """Take a pre-generated map, generating one inline only if the pool is empty"""
+    pool = current_app.extensions['map_pool']
+    pool.start()
+    map_data = pool.take()
+    if map_data is None:
+        map_data = MapGenerator(pool.width, pool.height).generate_map()
+    return map_data
+
+def batch_items(data, key):
+    """Return the list of items in a batch request (a bare list or {key: [...]}), or None"""
+    items = data.get(key) if isinstance(data, dict) else data
+    if not isinstance(items, list) or len(items) > current_app.config['BATCH_MAX_SIZE']:
+        return None
+    return items
+
+def character_profile(data):
+    """name, role and color of a new character from a request item; ValueError if one is invalid"""
+    profile = {
+        'name': data.get('name', f'Character{random.randint(1, 1000)}'),
+        'role': data.get('role', 'Worker'),
+        'color': data.get('color', f'#{random.randint(0, 0xFFFFFF):06x}'),
+    }
+    for field in ('name', 'role'):
+        value, limit = profile[field], Character.__table__.c[field].type.length
+        # NUL separates the strings of binary snapshots
+        if not isinstance(value, str) or len(value) > limit or '\0' in value:
+            raise ValueError(f'{field} must be a string of at most {limit} characters without NUL')
+    if not isinstance(profile['color'], str) or not COLOR.fullmatch(profile['color']):
+        raise ValueError('color must be #rrggbb')
+    return profile
+
+def insert_characters(rows):
+    """Insert character rows with one bulk statement and return the stored characters in order"""
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        ids = db.session.execute(
+            insert(Character).returning(Character.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    else:
+        # Without INSERT ... RETURNING (MySQL) the ORM fetches each generated id
+        characters = [Character(**row) for row in rows]
+        db.session.add_all(characters)
+        db.session.flush()
+        ids = [character.id for character in characters]
+    db.session.commit()
+    if not ids:
+        return []
+    stored = db.session.execute(select(Character).where(Character.id.in_(ids))).scalars()
+    by_id = {character.id: character for character in stored}
+    return [by_id[character_id] for character_id in ids]
+
+def world_map():
+    """The map (world) a request addresses: ?map_id=, else the default map, generated if needed"""
+    map_id = request.args.get('map_id', type=int)
+    if map_id is not None:
+        compiled = map_cache.get(map_id)
+        if compiled is None:
+            abort(404)
+        return compiled
+    
+    default_id = current_app.extensions['shards'].broker.default_map()
+    if default_id is not None:
+        compiled = map_cache.get(default_id)
+        if compiled is not None:
+            return compiled
+    compiled = map_cache.current()
+    if not compiled:
+        compiled = save_map(take_pooled_map())
+    return compiled
+
+def viewport():
+    """The ?x=&y=&width=&height= rectangle grown by ?margin=, as (min_x, min_y, max_x, max_y)
+
+    Returns None when no viewport was given; raises ValueError for an invalid one.
+    """
+    keys = ('x', 'y', 'width', 'height')
+    if not any(key in request.args for key in keys):
+        return None
+    try:
+        x, y, width, height = (float(request.args[key]) for key in keys)
+        margin = float(request.args.get('margin', 0))
+    except KeyError:
+        raise ValueError('x, y, width and height are all required')
+    except ValueError:
+        raise ValueError('Invalid viewport')
+    if not all(np.isfinite([x, y, width, height, margin])) or width < 0 or height < 0 or margin < 0:
+        raise ValueError('Invalid viewport')
+    return (x - margin, y - margin, x + width + margin, y + height + margin)
+
+def cache_headers(response, immutable):
+    """Set Vary and Cache-Control on a map response
+
+    immutable marks responses for a URL that always names the same map
+    (?map_id=); the default map can change, so clients must revalidate it.
+    """
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def map_response(compiled, immutable=False):
+    """Serve a map from its precompressed bodies, answering conditional GETs with 304"""
+    as_binary = wants_binary()
+    encoding = request.accept_encodings.best_match(ENCODINGS, default='identity')
+    body, etag = compiled.body(as_binary, encoding)
+    
+    if request.method == 'GET' and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=binary.MIME_TYPE if as_binary else 'application/json')
+        if encoding != 'identity':
+            response.content_encoding = encoding
+    response.set_etag(etag)
+    return cache_headers(response, immutable)
+
+def region_response(source, box, immutable=False):
+    """Serve the part of a map (compiled, or a GameMap row) inside a viewport, hashed for conditional GETs"""
+    region = source.region(box)
+    if wants_binary():
+        response = Response(binary.encode_map(region), mimetype=binary.MIME_TYPE)
+    else:
+        response = jsonify(region)
+    response.add_etag()
+    return cache_headers(response, immutable).make_conditional(request)
+
 @main.route('/api/map', methods=['GET'])
 def get_map():
-    """Get current map or generate new one"""
-    game_map = GameMap.query.first()
-    
-    if not game_map:
-        # Generate new map
-        generator = MapGenerator(800, 600)
-        map_data = generator.generate_map()
-        
-        game_map = GameMap(
-            width=map_data['width'],
-            height=map_data['height'],
-            buildings=json.dumps(map_data['buildings']),
-            trees=json.dumps(map_data['trees']),
-            paths=json.dumps(map_data['paths'])
-        )
-        db.session.add(game_map)
-        db.session.commit()
+    """Get a map by ?map_id=, or the current map (generating one if there is none)
+
+    With a viewport (?x=&y=&width=&height=[&margin=]) only the buildings,
+    trees and paths overlapping it are returned.
+    """
+    try:
+        box = viewport()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    compiled = world_map()
+    immutable = 'map_id' in request.args
+    if box is not None:
+        return region_response(compiled, box, immutable)
+    return map_response(compiled, immutable)
+
+@main.route('/api/map/<int:map_id>/region', methods=['GET'])
+def get_map_region(map_id):
+    """Get the geometry of a map inside a viewport (?x=&y=&width=&height=[&margin=])
+
+    Cut from the map's compiled form when this process has it cached.
+    Otherwise only the overlapping rows are read through the geometry
+    tables' region indexes. Compiling the map would read all of it, build
+    its pathfinder and push a map a world is using out of the cache, just
+    to serve one viewport.
+    """
+    try:
+        box = viewport()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    if box is None:
+        return jsonify({'error': 'x, y, width and height are all required'}), 400
+
+    source = map_cache.peek(map_id) or db.session.get(GameMap, map_id)
+    if source is None:
+        abort(404)
+    return region_response(source, box, immutable=True)
+
+@main.route('/api/map/<int:map_id>/tiles', methods=['GET'])
+def get_map_tiles(map_id):
+    """Describe the pre-rendered tiles of a map's static layer
+
+    Clients draw the tiles as the map background and only draw characters
+    on top, instead of downloading and drawing every building, tree and path.
+    """
+    compiled = map_cache.get(map_id)
+    if compiled is None:
+        abort(404)
+    layer = compiled.layer
+    return jsonify({
+        'id': compiled.id,
+        'width': compiled.width,
+        'height': compiled.height,
+        'tile_size': tiles.TILE_SIZE,
+        'min_zoom': tiles.MIN_ZOOM,
+        'max_zoom': tiles.MAX_ZOOM,
+        'native_zoom': tiles.NATIVE_ZOOM,
+        'zooms': [
+            {'zoom': zoom, 'scale': layer.scale(zoom), 'columns': columns, 'rows': rows}
+            for zoom in range(tiles.MIN_ZOOM, tiles.MAX_ZOOM + 1)
+            for columns, rows in [layer.grid_size(zoom)]
+        ],
+        'url': f'/api/map/{compiled.id}/tiles/{{z}}/{{x}}/{{y}}.png',
+    })
+
+@main.route('/api/map/<int:map_id>/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_map_tile(map_id, z, x, y):
+    """One PNG tile of a map's static layer, rendered once and cached for good"""
+    compiled = map_cache.get(map_id)
+    tile = compiled.layer.tile(z, x, y) if compiled is not None else None
+    if tile is None:
+        abort(404)
+    png, etag = tile
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
+
+@main.route('/api/map/new', methods=['POST'])
+def new_map():
+    """Start a new world: reproduce a map from a seed, or take a pre-generated one"""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    seed = data.get('seed')
+    
+    if seed is not None:
+        try:
+            seed = check_seed(seed)
+            width, height = check_size(data.get('width', 800), data.get('height', 600))
+        except ValueError as error:
+            return jsonify({'error': str(error)}), 400
+        if width * height > current_app.config['MAP_INLINE_MAX_AREA']:
+            # Too slow to generate within a request: hand it to a job
+            return job_response('generate_map', {'width': width, 'height': height, 'seed': seed})
+        map_data = MapGenerator(width, height, seed=seed).generate_map()
+    else:
+        map_data = take_pooled_map()
     
-    return jsonify(game_map.to_dict())
+    return map_response(save_map(map_data))
+
+@main.route('/api/world/chunks', methods=['GET'])
+def get_world_chunks():
+    """Get the chunks of the chunked world that overlap a viewport, generating them lazily"""
+    world = current_app.extensions['world']
+    try:
+        x = float(request.args.get('x', 0))
+        y = float(request.args.get('y', 0))
+        width = float(request.args.get('width', world.chunk_size))
+        height = float(request.args.get('height', world.chunk_size))
+    except ValueError:
+        return jsonify({'error': 'Invalid viewport'}), 400
+
+    # Refuse viewports that would generate an unbounded number of chunks
+    limit = 64 * world.chunk_size
+    if (not all(np.isfinite([x, y, width, height])) or not 0 < width <= limit or not 0 < height <= limit
+            or width * height > 64 * world.chunk_size ** 2):
+        return jsonify({'error': 'Invalid viewport'}), 400
+
+    # Chunks are only kept alive by viewers, so stale ones are dropped here
+    world.evict()
+    return jsonify({
+        'seed': world.seed,
+        'chunk_size': world.chunk_size,
+        'chunks': world.chunks_in_view(x, y, width, height)
+    })
+
+@main.route('/api/world/chunks/<int(signed=True):chunk_x>/<int(signed=True):chunk_y>', methods=['GET'])
+def get_world_chunk(chunk_x, chunk_y):
+    """Get a single chunk of the chunked world"""
+    return jsonify(current_app.extensions['world'].get_chunk(chunk_x, chunk_y))
+
+@main.route('/api/worlds', methods=['GET'])
+def get_worlds():
+    """List the worlds that have been simulated and the worker process that owns each"""
+    return jsonify(current_app.extensions['shards'].broker.leases())
 
 @main.route('/api/characters', methods=['GET'])
 def get_characters():
-    """Get all characters"""
-    characters = Character.query.all()
-    return jsonify([char.to_dict() for char in characters])
+    """Get the characters of a world, or only those inside a viewport"""
+    try:
+        box = viewport()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    engine = get_engine(world_map().id)
+    if wants_binary():
+        with ENCODE_SECONDS.time('binary'):
+            body = binary.encode_characters(engine.snapshot(box), engine.tick)
+        return Response(body, mimetype=binary.MIME_TYPE)
+    return jsonify(engine.snapshot(box))
 
 @main.route('/api/characters', methods=['POST'])
 def create_character():
     """Create new character"""
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        profile = character_profile(data)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     
     # Find valid spawn position on path
-    game_map = GameMap.query.first()
-    if game_map:
-        paths = json.loads(game_map.paths)
-        if paths:
-            spawn_point = random.choice(paths)
-            x, y = spawn_point['x'], spawn_point['y']
-        else:
-            x, y = 100, 100
+    compiled = world_map()
+    if compiled.points:
+        spawn_point = random.choice(compiled.points)
+        x, y = spawn_point['x'], spawn_point['y']
     else:
         x, y = 100, 100
     
     character = Character(
-        name=data.get('name', f'Character{random.randint(1, 1000)}'),
-        role=data.get('role', 'Worker'),
+        **profile,
         x=x,
         y=y,
         target_x=x,
         target_y=y,
-        color=data.get('color', f'#{random.randint(0, 0xFFFFFF):06x}')
+        map_id=compiled.id
     )
     
     db.session.add(character)
     db.session.commit()
+    get_engine(compiled.id).add_character(character)
     
     return jsonify(character.to_dict())
 
+@main.route('/api/characters/batch', methods=['POST'])
+def create_characters():
+    """Create many characters in one request and one INSERT"""
+    items = batch_items(request.get_json(silent=True), 'characters')
+    if items is None or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'Expected a list of at most '
+                                 f"{current_app.config['BATCH_MAX_SIZE']} characters"}), 400
+    profiles = []
+    for number, item in enumerate(items):
+        try:
+            profiles.append(character_profile(item))
+        except ValueError as error:
+            return jsonify({'error': f'Character {number}: {error}'}), 400
+    
+    # Draw every spawn point at once
+    compiled = world_map()
+    if compiled.points:
+        spawns = compiled.point_array[np.random.randint(len(compiled.point_array), size=len(items))]
+    else:
+        spawns = np.full((len(items), 2), 100.0)
+    
+    rows = [
+        {**profile, 'x': x, 'y': y, 'target_x': x, 'target_y': y, 'map_id': compiled.id}
+        for profile, (x, y) in zip(profiles, spawns.tolist())
+    ]
+    
+    characters = [character.to_dict() for character in insert_characters(rows)]
+    get_engine(compiled.id).add_characters(characters)
+    
+    return jsonify(characters), 201
+
+@main.route('/api/characters/move', methods=['POST'])
+def move_characters():
+    """Apply many move orders at once; invalid orders are reported instead of failing the batch"""
+    items = batch_items(request.get_json(silent=True), 'orders')
+    if items is None:
+        return jsonify({'error': 'Expected a list of at most '
+                                 f"{current_app.config['BATCH_MAX_SIZE']} orders"}), 400
+    
+    compiled = world_map()
+    engine = get_engine(compiled.id)
+    rejected = []
+    orders = []
+    for item in items:
+        try:
+            order = (int(item['id']), float(item['target_x']), float(item['target_y']))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            rejected.append({'order': item, 'error': 'Malformed order'})
+            continue
+        if math.isfinite(order[1]) and math.isfinite(order[2]):
+            orders.append(order)
+        else:
+            rejected.append({'id': order[0], 'error': 'Invalid position'})
+    
+    # Validate every target against the map in one vectorized pass
+    if orders:
+        targets = np.array([order[1:] for order in orders], dtype=np.float64)
+        valid = compiled.pathfinder.valid_positions(targets[:, 0], targets[:, 1])
+        rejected.extend(
+            {'id': order[0], 'error': 'Invalid position'}
+            for order, ok in zip(orders, valid.tolist()) if not ok
+        )
+        orders = [order for order, ok in zip(orders, valid.tolist()) if ok]
+    
+    moved = engine.set_targets(orders)
+    moved_ids = {character['id'] for character in moved}
+    rejected.extend(
+        {'id': order[0], 'error': 'Character not found'}
+        for order in orders if order[0] not in moved_ids
+    )
+    
+    return jsonify({'moved': moved, 'rejected': rejected})
+
 @main.route('/api/characters/<int:character_id>/move', methods=['POST'])
 def move_character(character_id):
     """Move character to new position"""
-    data = request.get_json()
-    character = Character.query.get_or_404(character_id)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    compiled = world_map()
+    engine = get_engine(compiled.id)
+    character = engine.get_character(character_id)
+    if character is None:
+        abort(404)
     
-    target_x = data.get('target_x', character.x)
-    target_y = data.get('target_y', character.y)
+    try:
+        target_x = float(data.get('target_x', character['x']))
+        target_y = float(data.get('target_y', character['y']))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'Invalid position'}), 400
+    if not (math.isfinite(target_x) and math.isfinite(target_y)):
+        return jsonify({'error': 'Invalid position'}), 400
     
     # Check if target position is valid (on path, not colliding)
-    game_map = GameMap.query.first()
-    if game_map:
-        pathfinder = PathFinder(game_map)
-        if pathfinder.is_valid_position(target_x, target_y):
-            character.target_x = target_x
-            character.target_y = target_y
-            db.session.commit()
-            return jsonify(character.to_dict())
+    if compiled.pathfinder.is_valid_position(target_x, target_y):
+        return jsonify(engine.set_target(character_id, target_x, target_y))
     
     return jsonify({'error': 'Invalid position'}), 400
 
 @main.route('/api/characters/update', methods=['POST'])
 def update_characters():
-    """Update all character positions (called by frontend periodically)"""
-    characters = Character.query.all()
-    
-    for char in characters:
-        # Move character towards target
-        dx = char.target_x - char.x
-        dy = char.target_y - char.y
-        distance = (dx**2 + dy**2)**0.5
-        
-        if distance > char.speed:
-            char.x += (dx / distance) * char.speed
-            char.y += (dy / distance) * char.speed
-        else:
-            char.x = char.target_x
-            char.y = char.target_y
-            
-            # Set new random target when reached
-            game_map = GameMap.query.first()
-            if game_map:
-                paths = json.loads(game_map.paths)
-                if paths:
-                    new_target = random.choice(paths)
-                    char.target_x = new_target['x']
-                    char.target_y = new_target['y']
-    
-    db.session.commit()
-    return jsonify([char.to_dict() for char in characters])
+    """Return the world snapshot, optionally cut to a viewport (the simulation advances on its own clock)"""
+    try:
+        box = viewport()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    return jsonify(get_engine(world_map().id).snapshot(box))
 
-from flask import jsonify
-import threading
-import time
+@main.route('/api/stream', methods=['GET'])
+def stream_world():
+    """Stream the world as Server-Sent Events: one full snapshot, then per-tick deltas
+
+    Answers 503 when this worker already serves its limit of streams.
+    """
+    quantize = request.args.get('quantize', '0').lower() in ('1', 'true', 'yes')
+    engine = get_engine(world_map().id)
+    slots = current_app.extensions['streams']
+    if not slots.acquire():
+        response = jsonify({'error': 'Too many open streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    stream = WorldStream(engine, quantize=quantize)
+    response = Response(stream_with_context(stream.events()), mimetype='text/event-stream')
+    response.call_on_close(slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@main.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics of every live worker process"""
+    shards = current_app.extensions['shards']
+    return Response(metrics.render(shards.broker.metrics(exclude=shards.owner)), content_type=CONTENT_TYPE)
+
+@main.route('/metrics/profile', methods=['GET'])
+def get_profile():
+    """Folded stacks sampled in this worker process, for flame graph tools"""
+    profiler = current_app.extensions.get('profiler')
+    if profiler is None:
+        abort(404)
+    return Response(profiler.folded(), content_type='text/plain; charset=utf-8')
+
+def job_response(kind, params):
+    """Submit a job and answer 202 pointing at it, or 503 when too many jobs are active"""
+    try:
+        job = current_app.extensions['jobs'].submit(kind, params)
+    except JobQueueFull as error:
+        response = jsonify({'error': str(error)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+@main.route('/api/jobs', methods=['POST'])
+def start_job():
+    """Start a background job: {"kind": "generate_map", "params": {"seed": 1}}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    try:
+        return job_response(data.get('kind'), params)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+@main.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's state, progress and (once done) result"""
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
 
-# Put this line at the top or near the imports
-progress_state = {"progress": 0}
+@main.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    job = current_app.extensions['jobs'].cancel(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
 
 @main.route("/api/start-process")
 def start_process():
-    def simulate():
-        for i in range(101):
-            progress_state["progress"] = i
-            time.sleep(0.03)  # Simulate real backend task
-    threading.Thread(target=simulate).start()
-    return jsonify({"status": "started"})
+    """Start the loading job the loading screen polls /api/progress for"""
+    try:
+        job = current_app.extensions['jobs'].submit('loading')
+    except JobQueueFull:
+        return jsonify({"status": "busy"}), 503
+    return jsonify({"status": "started", "job_id": job['id']})
 
 @main.route("/api/progress")
 def get_progress():
-    return jsonify(progress=progress_state["progress"])
\ No newline at end of file
+    """Progress of a job by ?job_id=, else of the latest loading job on any worker"""
+    jobs = current_app.extensions['jobs']
+    job_id = request.args.get('job_id')
+    job = jobs.get(job_id) if job_id else jobs.store.latest('loading')
+    return jsonify(progress=int(job['progress']) if job else 0)
@@ -0,0 +1,591 @@
+# app/shards.py
+import atexit
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.metrics import metrics
+from app.utils import binary
+from app.utils.spatial import CellIndex
+
+
+class LocalStore:
+    """An SQLite file shared by the worker processes on a host"""
+
+    SCHEMA = ''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self):
+        # One connection per thread and process: sqlite3 connections must not cross either
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+class ShardBroker(LocalStore):
+    """Local stand-in for a message broker: an SQLite file shared by the worker processes on a host
+
+    Holds four things for every world (keyed by map id):
+      * a lease naming the one worker process that simulates it,
+      * the owner's latest published snapshot, read by the other workers,
+      * the workers reading those snapshots, so owners only publish while someone reads,
+      * an inbox of commands (new characters, move orders) for the owner.
+    It also records which world requests without a map_id go to, and each
+    worker's latest metrics so any worker can answer a scrape for all of them.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS workers (
+            owner TEXT PRIMARY KEY,
+            seen REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS leases (
+            map_id INTEGER PRIMARY KEY,
+            owner TEXT,
+            expires REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            map_id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            tick INTEGER NOT NULL,
+            payload BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS readers (
+            map_id INTEGER NOT NULL,
+            owner TEXT NOT NULL,
+            seen REAL NOT NULL,
+            PRIMARY KEY (map_id, owner)
+        );
+        CREATE TABLE IF NOT EXISTS commands (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            map_id INTEGER NOT NULL,
+            command TEXT NOT NULL,
+            payload TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_commands_map_id ON commands (map_id, id);
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS metrics (
+            owner TEXT PRIMARY KEY,
+            payload TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path, lease_ttl=10.0):
+        self.lease_ttl = lease_ttl
+        super().__init__(path)
+
+    # Leases
+
+    def heartbeat(self, owner, now=None):
+        """Record that a worker is alive"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO workers (owner, seen) VALUES (?, ?) '
+                'ON CONFLICT(owner) DO UPDATE SET seen = excluded.seen',
+                (owner, now),
+            )
+            conn.execute('DELETE FROM workers WHERE seen < ?', (now - 3 * self.lease_ttl,))
+            conn.execute('DELETE FROM readers WHERE seen < ?', (now - 3 * self.lease_ttl,))
+            conn.execute('DELETE FROM metrics WHERE owner NOT IN (SELECT owner FROM workers)')
+
+    def acquire(self, map_id, owner, now=None):
+        """Try to become (or stay) the owner of a world; return whether this worker owns it
+
+        A free world is only taken while this worker holds no more than its
+        fair share of the leased worlds, so worlds spread across the live
+        workers instead of piling onto whichever one was asked first.
+        """
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT owner, expires FROM leases WHERE map_id = ?', (map_id,)
+            ).fetchone()
+            if row is not None and row[0] is not None and row[1] > now and row[0] != owner:
+                return False
+
+            if row is None or row[0] != owner:
+                leased, owned = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(owner = ?), 0) FROM leases '
+                    'WHERE owner IS NOT NULL AND expires > ?',
+                    (owner, now),
+                ).fetchone()
+                workers = conn.execute(
+                    'SELECT COUNT(*) FROM workers WHERE seen > ? AND owner != ?',
+                    (now - self.lease_ttl, owner),
+                ).fetchone()[0] + 1
+                if owned >= math.ceil((leased + 1) / workers):
+                    # Leave it for a less loaded worker, but remember someone wants it
+                    conn.execute(
+                        'INSERT OR IGNORE INTO leases (map_id, owner, expires) VALUES (?, NULL, 0)',
+                        (map_id,),
+                    )
+                    return False
+
+            conn.execute(
+                'INSERT INTO leases (map_id, owner, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT(map_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires',
+                (map_id, owner, now + self.lease_ttl),
+            )
+            return True
+
+    def renew(self, map_ids, owner, now=None):
+        """Extend this worker's leases; return the map ids it still owns"""
+        now = time.time() if now is None else now
+        map_ids = list(map_ids)
+        if not map_ids:
+            return set()
+        marks = ','.join('?' * len(map_ids))
+        with self._transaction() as conn:
+            conn.execute(
+                f'UPDATE leases SET expires = ? WHERE owner = ? AND expires > ? AND map_id IN ({marks})',
+                (now + self.lease_ttl, owner, now, *map_ids),
+            )
+            rows = conn.execute(
+                f'SELECT map_id FROM leases WHERE owner = ? AND expires > ? AND map_id IN ({marks})',
+                (owner, now, *map_ids),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def release(self, map_id, owner):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE leases SET owner = NULL, expires = 0 WHERE map_id = ? AND owner = ?',
+                (map_id, owner),
+            )
+
+    def orphans(self, now=None):
+        """Map ids of worlds that were asked for but have no live owner"""
+        now = time.time() if now is None else now
+        rows = self._connect().execute(
+            'SELECT map_id FROM leases WHERE owner IS NULL OR expires <= ?', (now,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def leases(self, now=None):
+        """Every known world with its owner (None when unowned)"""
+        now = time.time() if now is None else now
+        rows = self._connect().execute(
+            'SELECT map_id, owner, expires FROM leases ORDER BY map_id'
+        ).fetchall()
+        return [
+            {'map_id': map_id, 'owner': owner if expires > now else None}
+            for map_id, owner, expires in rows
+        ]
+
+    def default_map(self):
+        """Id of the world requests without a map_id use, or None"""
+        row = self._connect().execute(
+            "SELECT value FROM settings WHERE key = 'default_map'"
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    def set_default_map(self, map_id):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES ('default_map', ?) "
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (str(map_id),),
+            )
+
+    # Snapshots
+
+    def publish(self, map_id, owner, version, tick, payload):
+        """Store a world's snapshot: payload is an encode_columns() snapshot of its characters"""
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO snapshots (map_id, owner, version, tick, payload) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(map_id) DO UPDATE SET owner = excluded.owner, version = excluded.version, '
+                'tick = excluded.tick, payload = excluded.payload',
+                (map_id, owner, version, tick, payload),
+            )
+
+    def version(self, map_id):
+        """(owner, version) of the latest snapshot, or None"""
+        row = self._connect().execute(
+            'SELECT owner, version FROM snapshots WHERE map_id = ?', (map_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def latest(self, map_id):
+        """(owner, version, tick, characters) of the latest snapshot, or None"""
+        row = self._connect().execute(
+            'SELECT owner, version, tick, payload FROM snapshots WHERE map_id = ?', (map_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        owner, version, tick, payload = row
+        return owner, version, tick, binary.decode_characters(payload)[1]
+
+    def watch(self, map_id, owner, now=None):
+        """Record that a worker reads a world's snapshots"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO readers (map_id, owner, seen) VALUES (?, ?, ?) '
+                'ON CONFLICT(map_id, owner) DO UPDATE SET seen = excluded.seen',
+                (map_id, owner, now),
+            )
+
+    def watched(self, map_id, now=None):
+        """Whether any worker read a world's snapshots within the lease TTL"""
+        now = time.time() if now is None else now
+        row = self._connect().execute(
+            'SELECT 1 FROM readers WHERE map_id = ? AND seen > ? LIMIT 1', (map_id, now - self.lease_ttl)
+        ).fetchone()
+        return row is not None
+
+    # Metrics
+
+    def publish_metrics(self, owner, dump):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO metrics (owner, payload) VALUES (?, ?) '
+                'ON CONFLICT(owner) DO UPDATE SET payload = excluded.payload',
+                (owner, json.dumps(dump, separators=(',', ':'))),
+            )
+
+    def metrics(self, exclude=None, now=None):
+        """Latest metrics dumps of the live workers other than exclude"""
+        now = time.time() if now is None else now
+        rows = self._connect().execute(
+            'SELECT metrics.payload FROM metrics JOIN workers ON workers.owner = metrics.owner '
+            'WHERE workers.seen > ? AND metrics.owner IS NOT ?',
+            (now - self.lease_ttl, exclude),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    # Commands
+
+    def send(self, map_id, command, payload):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO commands (map_id, command, payload) VALUES (?, ?, ?)',
+                (map_id, command, json.dumps(payload, separators=(',', ':'))),
+            )
+
+    def receive(self, map_id):
+        """Take every queued command for a world, oldest first"""
+        # Looked up first without a write lock: most passes find nothing
+        queued = self._connect().execute(
+            'SELECT 1 FROM commands WHERE map_id = ? LIMIT 1', (map_id,)
+        ).fetchone()
+        if queued is None:
+            return []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'SELECT id, command, payload FROM commands WHERE map_id = ? ORDER BY id', (map_id,)
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    'DELETE FROM commands WHERE map_id = ? AND id <= ?', (map_id, rows[-1][0])
+                )
+        return [(command, json.loads(payload)) for _, command, payload in rows]
+
+
+class RemoteEngine:
+    """Read-only view of a world simulated by another worker, with commands forwarded to it
+
+    Offers the parts of SimulationEngine the routes and WorldStream use.
+    Versions are (owner, version) pairs, so a change of owner is never
+    mistaken for an unchanged world. Owners only publish worlds someone
+    reads, so every read also renews this worker's place among the readers.
+    """
+
+    view_cell_size = 128
+
+    def __init__(self, broker, map_id, owner=None, poll_interval=0.1, first_wait=1.0):
+        from app.simulation import generations
+
+        self.broker = broker
+        self.map_id = map_id
+        self.owner = owner
+        self.generation = next(generations)
+        self.poll_interval = poll_interval
+        self.first_wait = first_wait  # seconds the first read waits for the owner's first snapshot
+        self._next_watch = 0.0
+        self._waited = False
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _watch(self):
+        now = time.monotonic()
+        if now >= self._next_watch:
+            self._next_watch = now + self.broker.lease_ttl / 3
+            self.broker.watch(self.map_id, self.owner)
+
+    def _latest(self):
+        self._watch()
+        # Only a new version is worth reading and decoding the whole snapshot for
+        current = self.broker.version(self.map_id)
+        if current is None and not self._waited:
+            # Nobody read this world before: give the owner a moment to publish it
+            self._waited = True
+            current = self.wait_for_change(None, self.first_wait)
+        with self._lock:
+            if self._state is not None and current is not None and self._state['version'] == current:
+                return self._state
+        latest = self.broker.latest(self.map_id) if current is not None else None
+        if latest is None:
+            return {'version': None, 'tick': 0, 'characters': [], 'index': {}, 'cells': None}
+        owner, version, tick, characters = latest
+        with self._lock:
+            if self._state is None or self._state['version'] != (owner, version):
+                self._state = {
+                    'version': (owner, version),
+                    'tick': tick,
+                    'characters': characters,
+                    'index': {char['id']: char for char in characters},
+                    'cells': None,  # viewport index, built on first use
+                }
+            return self._state
+
+    @property
+    def tick(self):
+        return self._latest()['tick']
+
+    @property
+    def version(self):
+        return self._latest()['version']
+
+    def snapshot(self, box=None):
+        state = self._latest()
+        characters = state['characters']
+        if box is not None:
+            rows = self._cells(state).in_box(*box)
+            characters = [characters[row] for row in rows.tolist()]
+        return [dict(char) for char in characters]
+
+    def _cells(self, state):
+        with self._lock:
+            if state['cells'] is None:
+                characters = state['characters']
+                state['cells'] = CellIndex(
+                    [char['x'] for char in characters], [char['y'] for char in characters],
+                    self.view_cell_size,
+                )
+            return state['cells']
+
+    def get_character(self, character_id):
+        char = self._latest()['index'].get(character_id)
+        return dict(char) if char is not None else None
+
+    def positions(self):
+        state = self._latest()
+        characters = state['characters']
+        columns = {
+            key: np.array([char[key] for char in characters], dtype=np.float64)
+            for key in ('x', 'y', 'target_x', 'target_y')
+        }
+        return {
+            'tick': state['tick'],
+            'version': state['version'],
+            'ids': np.array([char['id'] for char in characters], dtype=np.int64),
+            **columns,
+        }
+
+    def wait_for_change(self, version, timeout=None):
+        """Poll the broker until the published version moves past the given one"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._watch()
+            current = self.broker.version(self.map_id)
+            if current != version:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return current
+            time.sleep(self.poll_interval)
+
+    def add_character(self, character, plan_route=True):
+        self.add_characters([character.to_dict()], plan_route)
+
+    def add_characters(self, states, plan_route=True):
+        self.broker.send(self.map_id, 'add', states)
+
+    def set_target(self, character_id, target_x, target_y):
+        moved = self.set_targets([(character_id, target_x, target_y)])
+        return moved[0] if moved else None
+
+    def set_targets(self, orders):
+        """Forward move orders to the owner; return the characters as they will be once applied"""
+        index = self._latest()['index']
+        orders = [order for order in orders if order[0] in index]
+        if orders:
+            self.broker.send(self.map_id, 'move', [list(order) for order in orders])
+        return [
+            {**index[character_id], 'target_x': target_x, 'target_y': target_y}
+            for character_id, target_x, target_y in orders
+        ]
+
+
+class ShardRegistry:
+    """The worlds this worker process simulates, pinned to it by leases in the broker
+
+    engine(map_id) returns the local SimulationEngine when this worker owns
+    (or can claim) the world, and a RemoteEngine view otherwise. A background
+    thread renews leases, stops worlds whose lease was lost, and claims
+    worlds whose owner died.
+    """
+
+    def __init__(self, app, broker, engine_options=None):
+        self.app = app
+        self.broker = broker
+        self.engine_options = engine_options or {}
+        self.engines = {}
+        self.remotes = {}
+        self._refused = set()  # worlds another worker holds, not asked for again until maintain()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def owner(self):
+        # Leases belong to processes, so a forked worker gets its own identity
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def engine(self, map_id):
+        with self._lock:
+            self._ensure_started()
+            engine = self.engines.get(map_id)
+            if engine is not None and engine.running:
+                return engine
+            if engine is None and map_id not in self._refused:
+                if self.broker.acquire(map_id, self.owner):
+                    engine = self._register(map_id)
+                else:
+                    # Asking again is a write transaction; wait for the next maintain() pass
+                    self._refused.add(map_id)
+            if engine is None:
+                return self._remote(map_id)
+        return self._start_engine(map_id, engine)
+
+    def _register(self, map_id):
+        """Create the engine for a world this worker just leased; maintain() renews it from now on"""
+        from app.simulation import SimulationEngine
+
+        engine = SimulationEngine(
+            self.app, map_id=map_id, broker=self.broker, owner=self.owner, **self.engine_options
+        )
+        self.engines[map_id] = engine
+        self.remotes.pop(map_id, None)
+        return engine
+
+    def _remote(self, map_id):
+        with self._lock:
+            remote = self.remotes.get(map_id)
+            if remote is None:
+                remote = self.remotes[map_id] = RemoteEngine(self.broker, map_id, self.owner)
+            return remote
+
+    def _start_engine(self, map_id, engine):
+        """Load and start a registered engine, outside the registry lock
+
+        Loading a large world takes a while, and maintain() must be able to
+        renew the lease meanwhile. Concurrent callers wait on the engine's
+        own lock until the first one has loaded it.
+        """
+        try:
+            engine.start()
+        except Exception:
+            with self._lock:
+                if self.engines.get(map_id) is engine:
+                    del self.engines[map_id]
+                    self.broker.release(map_id, self.owner)
+            raise
+        with self._lock:
+            if self.engines.get(map_id) is engine:
+                return engine
+        # The lease was lost while the world loaded: the new owner's state wins
+        engine.stop(persist=False)
+        return self._remote(map_id)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        if self._pid != os.getpid():
+            # Threads and engines do not survive a fork
+            self.engines = {}
+            self.remotes = {}
+            self._refused = set()
+            self._stop = threading.Event()
+            atexit.register(self.shutdown)
+        self._pid = os.getpid()
+        self.broker.heartbeat(self.owner)
+        self._thread = threading.Thread(target=self._run, name='shards', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = self.broker.lease_ttl / 3
+        while not self._stop.wait(interval):
+            try:
+                self.maintain()
+            except Exception:
+                self.app.logger.exception('Failed to maintain world leases')
+
+    def maintain(self):
+        """Renew leases, drop worlds this worker no longer owns, and adopt orphaned ones"""
+        owner = self.owner
+        self.broker.heartbeat(owner)
+        self.broker.publish_metrics(owner, metrics.dump())
+        adopted = []
+        with self._lock:
+            self._refused.clear()
+            owned = self.broker.renew(self.engines.keys(), owner)
+            for map_id in list(self.engines.keys() - owned):
+                # Another worker holds the lease now: its state wins
+                self.engines.pop(map_id).stop(persist=False)
+            for map_id in self.broker.orphans():
+                if map_id not in self.engines and self.broker.acquire(map_id, owner):
+                    adopted.append((map_id, self._register(map_id)))
+        for map_id, engine in adopted:
+            # Loaded on their own threads so this one keeps renewing leases
+            threading.Thread(
+                target=self._adopt, args=(map_id, engine), name=f'adopt-{map_id}', daemon=True
+            ).start()
+
+    def _adopt(self, map_id, engine):
+        try:
+            self._start_engine(map_id, engine)
+        except Exception:
+            self.app.logger.exception('Failed to start world %s', map_id)
+
+    def shutdown(self):
+        """Stop every local world, flushing its state, and hand its lease back"""
+        self._stop.set()
+        with self._lock:
+            for map_id, engine in list(self.engines.items()):
+                engine.stop()
+                self.broker.release(map_id, self.owner)
+            self.engines = {}
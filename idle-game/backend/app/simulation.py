@@ -0,0 +1,545 @@
+# app/simulation.py
+import atexit
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+
+from app.map_cache import map_cache
+from app.metrics import SIZE_BUCKETS, metrics
+from app.persistence import WriteBehind
+from app.utils import binary
+from app.utils.catchup import fast_forward
+from app.utils.crowd import separate
+from app.utils.movement import CharacterStore, advance, points_to_array
+from app.utils.spatial import CellIndex
+
+TICK_SECONDS = metrics.histogram('tick_duration_seconds', 'Time to advance a world by one tick')
+TICK_CHARACTERS = metrics.histogram(
+    'tick_characters', 'Characters updated per tick', buckets=SIZE_BUCKETS
+)
+TICKS_DROPPED = metrics.counter(
+    'ticks_dropped_total', 'Ticks skipped because a world fell too far behind'
+)
+
+# Distinguishes the engines (local or remote) a world has had in this process
+generations = itertools.count(1)
+
+
+class SimulationEngine:
+    """Fixed-timestep simulation of one world (map) that owns its character state in memory
+
+    With a broker (see app.shards) the engine also publishes snapshots for
+    other worker processes and applies the commands they forward.
+    """
+
+    view_cell_size = 128  # pixels per cell of the viewport index
+
+    def __init__(self, app, tick_rate=10, persist_interval=5.0, max_catchup_ticks=5,
+                 max_staleness=30.0, map_id=None, broker=None, owner=None,
+                 publish_interval=0.2, crowd_radius=15.0, route_budget=0.05):
+        self.app = app
+        self.generation = next(generations)
+        self.route_budget = route_budget  # seconds per tick spent routing characters loaded unrouted
+        self.crowd_radius = crowd_radius
+        self.map_id = map_id
+        self.broker = broker
+        self.owner = owner
+        self.publish_interval = publish_interval  # seconds between exchanges with the broker
+        self._published_version = None
+        self._profile_sections = (None, 0, None)  # (store, rows, binary.profile_sections) last published
+        self.tick_rate = tick_rate
+        self.tick_interval = 1.0 / tick_rate
+        self.max_catchup_ticks = max_catchup_ticks
+        self.writer = WriteBehind(persist_interval, max_staleness)
+
+        self.tick = 0
+        self.version = 0  # bumped on every change streaming clients should see
+        self.store = CharacterStore()
+        self.profiles = {}  # character id -> static fields (name, role, color, ...)
+        self.path_points = points_to_array([])
+        self.pathfinder = None
+        self.blocked = None  # walkability grid that crowd separation must not push into
+        self.routes = {}  # character id -> remaining route waypoints
+        self._unrouted = {}  # character id -> fast-forwarded leg (x, y, travelled) or None, awaiting a route
+        self._view_index = None  # (version, CellIndex) answering viewport queries
+        self.rng = np.random.default_rng()
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._exchanger = None  # thread running exchange() when there is a broker
+        self._exit_hook = False
+        self._discarded = False  # stopped without persisting: its state must never be written
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Load world state from the database and start the tick thread"""
+        with self._lock:
+            if self.running:
+                return
+            with self.app.app_context():
+                self.load_world()
+            self._discarded = False
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f'simulation-{self.map_id}', daemon=True
+            )
+            self._thread.start()
+            if self.broker is not None:
+                self._exchanger = threading.Thread(
+                    target=self._exchange_loop, name=f'exchange-{self.map_id}', daemon=True
+                )
+                self._exchanger.start()
+            if not self._exit_hook:
+                # Flush pending state when the worker shuts down gracefully
+                atexit.register(self.stop)
+                self._exit_hook = True
+
+    def stop(self, persist=True):
+        """Stop the tick thread and persist any pending state
+
+        persist=False discards the state instead: another worker owns the
+        world now, so neither this call nor the exit hook may write it back.
+        """
+        self._stop.set()
+        for thread in (self._thread, self._exchanger):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+        self._thread = self._exchanger = None
+        if not persist:
+            with self._lock:
+                self._discarded = True
+                self.store.take_dirty()
+        else:
+            with self.app.app_context():
+                self.persist()
+
+    def load_world(self):
+        """Read the map and its characters into memory"""
+        from app.models import Character
+
+        if self.map_id is None:
+            compiled = map_cache.current()
+            characters = Character.query.all()
+        else:
+            compiled = map_cache.get(self.map_id)
+            characters = Character.query.filter_by(map_id=self.map_id).all()
+        with self._lock:
+            self.load_map(compiled)
+            self.store = CharacterStore()
+            self.profiles = {}
+            last_updates = {}
+            for char in characters:
+                self.add_character(char, plan_route=False)
+                last_updates[char.id] = char.last_update
+            caught_up = self.catch_up(last_updates)
+            # Routes are planned by the tick thread (plan_pending_routes), not here:
+            # a cold route per character makes a large world take seconds to load
+            for char_id in last_updates.keys() - caught_up:
+                self._defer_route(self.store.index[char_id], char_id)
+
+    def catch_up(self, last_updates, now=None):
+        """Jump characters forward by the wall-clock time since they were last updated
+
+        Uses the closed-form fast-forward in app.utils.catchup, so a character
+        that has been away for hours costs about the same as one tick.
+        Each moved character waits on its current leg until
+        plan_pending_routes routes the rest of it. Returns the ids of the
+        characters that were moved.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            store = self.store
+            rows, ticks = [], []
+            for char_id, last_update in last_updates.items():
+                if last_update is None or char_id not in store:
+                    continue
+                elapsed = (now - last_update).total_seconds() * self.tick_rate
+                if elapsed >= 1:
+                    rows.append(store.index[char_id])
+                    ticks.append(elapsed)
+            if not rows:
+                return set()
+
+            rows = np.array(rows, dtype=np.int64)
+            result = fast_forward(
+                store.x[rows], store.y[rows], store.target_x[rows], store.target_y[rows],
+                store.speed[rows], np.array(ticks), self.path_points, self.rng
+            )
+            store.x[rows], store.y[rows] = result['x'], result['y']
+            store.target_x[rows], store.target_y[rows] = result['target_x'], result['target_y']
+            store.dirty[rows] = True
+
+            ids = store.ids
+            for i, row in enumerate(rows.tolist()):
+                leg = (float(result['leg_x'][i]), float(result['leg_y'][i]), float(result['travelled'][i]))
+                self._defer_route(row, int(ids[row]), leg)
+            self._bump()
+            return {int(char_id) for char_id in ids[rows]}
+
+    def _defer_route(self, row, char_id, leg=None):
+        """Hold a character where it is until plan_pending_routes gives it a route
+
+        leg is (x, y, travelled) from fast_forward: the route then starts at
+        (x, y) and the character resumes travelled pixels along it.
+        """
+        self.store.set_waypoint(row, self.store.x[row], self.store.y[row])
+        self.routes.pop(char_id, None)
+        self._unrouted[char_id] = leg
+
+    def plan_pending_routes(self, budget=None):
+        """Route characters held by _defer_route, for about budget seconds (all of them when None)
+
+        Characters heading for the same goal cell are planned in one batch,
+        so they share a flow field. Returns how many were routed.
+        """
+        with self._lock:
+            store = self.store
+            groups = {}
+            for char_id, leg in list(self._unrouted.items()):
+                row = store.index.get(char_id)
+                if row is None:
+                    del self._unrouted[char_id]
+                    continue
+                start = (leg[0], leg[1]) if leg is not None else (store.x[row], store.y[row])
+                query = (*start, store.target_x[row], store.target_y[row])
+                goal = self.pathfinder.to_cell(query[2], query[3]) if self.pathfinder is not None else None
+                groups.setdefault(goal, []).append((row, char_id, leg, query))
+
+            deadline = None if budget is None else time.perf_counter() + budget
+            planned = 0
+            for members in groups.values():
+                queries = [query for _, _, _, query in members]
+                if self.pathfinder is not None:
+                    routes = self.pathfinder.find_routes(queries)
+                else:
+                    routes = [None] * len(queries)
+                for (row, char_id, leg, _), route in zip(members, routes):
+                    if leg is None:
+                        self._apply_route(row, char_id, route)
+                    else:
+                        self._resume_leg(row, char_id, *leg, route)
+                planned += len(members)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+            if planned:
+                self._bump()
+            return planned
+
+    def _resume_leg(self, row, char_id, leg_x, leg_y, travelled, route):
+        """Place a character the given distance along its routed leg and queue the rest"""
+        store = self.store
+        self._unrouted.pop(char_id, None)
+        if not route:
+            # Straight-line leg: fast_forward already placed the character on it
+            self._plan_route(row, char_id)
+            return
+
+        x, y = leg_x, leg_y
+        for i, (next_x, next_y) in enumerate(route):
+            length = ((next_x - x) ** 2 + (next_y - y) ** 2) ** 0.5
+            if travelled < length:
+                fraction = travelled / length
+                store.x[row] = x + (next_x - x) * fraction
+                store.y[row] = y + (next_y - y) * fraction
+                store.set_waypoint(row, next_x, next_y)
+                self.routes[char_id] = deque(route[i + 1:])
+                return
+            travelled -= length
+            x, y = next_x, next_y
+
+        store.x[row], store.y[row] = x, y
+        store.set_waypoint(row, x, y)
+        self.routes.pop(char_id, None)
+
+    def load_map(self, compiled):
+        """Use a compiled map's path points as targets and its PathFinder for routing"""
+        with self._lock:
+            if compiled is None:
+                self.path_points = points_to_array([])
+                self.pathfinder = None
+                self.blocked = None
+            else:
+                self.path_points = compiled.point_array
+                self.pathfinder = compiled.pathfinder
+                self.blocked = np.asarray(compiled.pathfinder.grid, dtype=np.uint8)
+            self.routes = {}
+            self._unrouted = {}
+
+    def add_character(self, character, plan_route=True):
+        """Start simulating a newly created character"""
+        self.add_characters([character.to_dict()], plan_route)
+
+    def add_characters(self, states, plan_route=True):
+        """Start simulating several characters, given as to_dict()-style dicts"""
+        with self._lock:
+            # Commands forwarded by other workers may repeat characters loaded from the database
+            states = [state for state in states if state['id'] not in self.store]
+            for state in states:
+                row = self.store.add(
+                    state['id'],
+                    *(self._coerce(state[key], 100.0) for key in ('x', 'y', 'target_x', 'target_y')),
+                    self._coerce(state.get('speed'), 2.0),
+                )
+                self.profiles[state['id']] = {
+                    key: value for key, value in state.items() if key not in CharacterStore.FIELDS
+                }
+                if plan_route:
+                    self._plan_route(row, state['id'])
+            if states:
+                self._bump()
+
+    def set_target(self, character_id, target_x, target_y):
+        """Give a character a new movement target"""
+        moved = self.set_targets([(character_id, target_x, target_y)])
+        return moved[0] if moved else None
+
+    def set_targets(self, orders):
+        """Apply (id, target_x, target_y) move orders; return the moved characters
+
+        Orders for characters that are not being simulated are skipped.
+        """
+        moved = []
+        with self._lock:
+            for character_id, target_x, target_y in orders:
+                if character_id not in self.store:
+                    continue
+                self.store.set_target(character_id, target_x, target_y)
+                self._plan_route(self.store.index[character_id], character_id)
+                moved.append(self.get_character(character_id))
+            if moved:
+                self._bump()
+        return moved
+
+    def get_character(self, character_id):
+        with self._lock:
+            if character_id not in self.store:
+                return None
+            return {**self.profiles[character_id], **self.store.get(character_id)}
+
+    def visible_rows(self, box):
+        """Store rows of the characters inside a (min_x, min_y, max_x, max_y) box
+
+        Answered from a cell index of positions built at most once per world
+        version (so once per tick), shared by every viewport query in between.
+        """
+        with self._lock:
+            if self._view_index is None or self._view_index[0] != self.version:
+                index = CellIndex(self.store.x.copy(), self.store.y.copy(), self.view_cell_size)
+                self._view_index = (self.version, index)
+            return self._view_index[1].in_box(*box)
+
+    def snapshot(self, box=None):
+        """Return a copy of every character's current state, or only those inside box"""
+        with self._lock:
+            store = self.store
+            rows = slice(None) if box is None else self.visible_rows(box)
+            columns = zip(
+                store.ids[rows].tolist(),
+                store.x[rows].tolist(),
+                store.y[rows].tolist(),
+                store.target_x[rows].tolist(),
+                store.target_y[rows].tolist(),
+                store.speed[rows].tolist(),
+            )
+            return [
+                {**self.profiles[char_id], 'x': x, 'y': y, 'target_x': tx, 'target_y': ty, 'speed': speed}
+                for char_id, x, y, tx, ty, speed in columns
+            ]
+
+    def step(self):
+        """Advance every character by one tick"""
+        with self._lock, TICK_SECONDS.time():
+            TICK_CHARACTERS.observe(len(self.store))
+            if self._unrouted:
+                self.plan_pending_routes(self.route_budget)
+            reached, arrived = advance(self.store, self.path_points, self.rng)
+            if self.pathfinder is not None and reached.any():
+                self._follow_routes(np.flatnonzero(reached), arrived)
+            if self.crowd_radius:
+                separate(
+                    self.store, self.crowd_radius, blocked=self.blocked,
+                    cell_size=self.pathfinder.grid_size if self.pathfinder is not None else 20,
+                )
+            self.tick += 1
+            self._bump()
+
+    def positions(self):
+        """Return copies of the position and target columns with the current version"""
+        with self._lock:
+            store = self.store
+            return {
+                'tick': self.tick,
+                'version': self.version,
+                'ids': store.ids.copy(),
+                'x': store.x.copy(),
+                'y': store.y.copy(),
+                'target_x': store.target_x.copy(),
+                'target_y': store.target_y.copy(),
+            }
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the world version moves past the given one; return the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def _bump(self):
+        self.version += 1
+        self.writer.mark_pending()
+        self._changed.notify_all()
+
+    def _follow_routes(self, rows, arrived):
+        """Plan routes for new targets and move others on to their next waypoint"""
+        retargeted = len(self.path_points) > 0
+        ids = self.store.ids
+        for row in rows.tolist():
+            char_id = int(ids[row])
+            if arrived[row] and retargeted:
+                self._plan_route(row, char_id)
+                continue
+            if char_id in self._unrouted:
+                continue  # waiting where it is for plan_pending_routes
+            route = self.routes.get(char_id)
+            if route:
+                self.store.set_waypoint(row, *route.popleft())
+            else:
+                self.routes.pop(char_id, None)
+                self.store.set_waypoint(row, self.store.target_x[row], self.store.target_y[row])
+
+    def _plan_route(self, row, char_id):
+        """Route a character to its target, falling back to a straight line"""
+        store = self.store
+        route = None
+        if self.pathfinder is not None:
+            route = self.pathfinder.find_route(
+                store.x[row], store.y[row], store.target_x[row], store.target_y[row]
+            )
+        self._apply_route(row, char_id, route)
+
+    def _apply_route(self, row, char_id, route):
+        """Send a character along a planned route, or straight at its target without one"""
+        store = self.store
+        self._unrouted.pop(char_id, None)
+        if route:
+            store.set_waypoint(row, *route[0])
+            self.routes[char_id] = deque(route[1:])
+        else:
+            store.set_waypoint(row, store.target_x[row], store.target_y[row])
+            self.routes.pop(char_id, None)
+
+    def persist(self):
+        """Write every changed character back to the database in one bulk update"""
+        from app.models import Character, db
+
+        with self._lock:
+            if self._discarded:
+                return None
+            dirty = self.store.take_dirty()
+            if not len(dirty):
+                return self.writer.flush([], db.session, Character)
+            store = self.store
+            now = datetime.utcnow()
+            columns = zip(
+                store.ids[dirty].tolist(),
+                store.x[dirty].tolist(),
+                store.y[dirty].tolist(),
+                store.target_x[dirty].tolist(),
+                store.target_y[dirty].tolist(),
+            )
+            rows = [
+                {'id': char_id, 'x': x, 'y': y, 'target_x': tx, 'target_y': ty, 'last_update': now}
+                for char_id, x, y, tx, ty in columns
+            ]
+
+        try:
+            return self.writer.flush(rows, db.session, Character)
+        except Exception:
+            # Keep the rows dirty so the next flush retries them
+            with self._lock:
+                for row in rows:
+                    index = self.store.index.get(row['id'])
+                    if index is not None:
+                        self.store.dirty[index] = True
+            raise
+
+    def _run(self):
+        next_tick = time.monotonic()
+        with self.app.app_context():
+            while not self._stop.is_set():
+                now = time.monotonic()
+                ticks = 0
+                while now >= next_tick and ticks < self.max_catchup_ticks:
+                    self.step()
+                    next_tick += self.tick_interval
+                    ticks += 1
+                if now >= next_tick:
+                    # Too far behind: drop the backlog instead of spiralling
+                    TICKS_DROPPED.inc(amount=int((now - next_tick) // self.tick_interval) + 1)
+                    next_tick = now + self.tick_interval
+
+                if self.writer.due(now):
+                    try:
+                        self.persist()
+                    except Exception:
+                        current_app.logger.exception('Failed to persist simulation state')
+
+                self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+    def _exchange_loop(self):
+        # Off the tick thread: encoding a large world for the broker takes far longer than a tick
+        with self.app.app_context():
+            while not self._stop.wait(self.publish_interval):
+                try:
+                    self.exchange()
+                except Exception:
+                    current_app.logger.exception('Failed to exchange world state with the broker')
+
+    def exchange(self):
+        """Apply commands other workers forwarded and publish a snapshot while any worker reads it"""
+        for command, payload in self.broker.receive(self.map_id):
+            if command == 'add':
+                self.add_characters(payload)
+            elif command == 'move':
+                self.set_targets([tuple(order) for order in payload])
+
+        if self.version == self._published_version or not self.broker.watched(self.map_id):
+            return
+        with self._lock:
+            store = self.store
+            version, tick, ids = self.version, self.tick, store.ids.copy()
+            positions = np.stack([store.x, store.y, store.target_x, store.target_y, store.speed], axis=1)
+            cached_store, cached_rows, profiles = self._profile_sections
+            if cached_store is not store or cached_rows != len(ids):
+                # Profiles never change, so they are only encoded again when characters join
+                profiles = binary.profile_sections([self.profiles[char_id] for char_id in ids.tolist()])
+                self._profile_sections = (store, len(ids), profiles)
+        payload = binary.encode_columns(ids, positions, profiles, tick, dtype='<f8')
+        self.broker.publish(self.map_id, self.owner, version, tick, payload)
+        self._published_version = version
+
+    @staticmethod
+    def _coerce(value, default):
+        return float(value) if value is not None else default
+
+
+def get_engine(map_id=None):
+    """Return the engine for a world (the current map by default)
+
+    This is the running local engine when this worker owns the world, and a
+    RemoteEngine view of the owner's published state otherwise.
+    """
+    if map_id is None:
+        compiled = map_cache.current()
+        if compiled is None:
+            raise LookupError('No map has been generated yet')
+        map_id = compiled.id
+    return current_app.extensions['shards'].engine(map_id)
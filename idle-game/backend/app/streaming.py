@@ -0,0 +1,150 @@
+# app/streaming.py
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def format_event(event, data):
+    """Encode one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class FrameCache:
+    """Shares encoded deltas between clients of a world that saw the same versions"""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._frames.get(key)
+
+    def put(self, key, frame):
+        with self._lock:
+            self._frames[key] = frame
+            while len(self._frames) > self.maxsize:
+                self._frames.popitem(last=False)
+
+
+frame_cache = FrameCache()
+
+
+class StreamSlots:
+    """Caps the streams one worker serves at once
+
+    Each open stream holds a worker thread for as long as its client stays
+    connected, so unbounded streams would leave none for the REST API.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot; False when limit streams are already open"""
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active = max(0, self.active - 1)
+
+
+class WorldStream:
+    """Full world state once, then only the positions that changed each tick"""
+
+    def __init__(self, engine, quantize=False, keepalive=15.0):
+        self.engine = engine
+        self.quantize = quantize
+        self.keepalive = keepalive
+        self.last = None
+
+    def events(self):
+        """Yield SSE messages until the client disconnects"""
+        yield self.full_event()
+        while True:
+            version = self.engine.wait_for_change(self.last['version'], timeout=self.keepalive)
+            if version == self.last['version']:
+                yield ': keepalive\n\n'
+                continue
+            yield from self.delta_events()
+
+    def full_event(self):
+        state = self.engine.positions()
+        snapshot = self.engine.snapshot()
+        if self.quantize:
+            for char in snapshot:
+                for key in ('x', 'y', 'target_x', 'target_y'):
+                    char[key] = round(char[key])
+        self.last = self._encode_state(state)
+        return format_event('full', {'tick': state['tick'], 'characters': snapshot})
+
+    def delta_events(self):
+        state = self._encode_state(self.engine.positions())
+        last = self.last
+        ids, last_ids = state['ids'], last['ids']
+
+        if len(ids) < len(last_ids) or not np.array_equal(ids[:len(last_ids)], last_ids):
+            # Characters were removed or reordered: resynchronise
+            yield self.full_event()
+            return
+
+        # Versions are per engine, and a world's engine can be replaced (a new generation)
+        key = (
+            self.engine.map_id, self.engine.generation, last['version'], state['version'], self.quantize
+        )
+        frame = frame_cache.get(key)
+        if frame is None:
+            frame = self._encode_delta(last, state)
+            frame_cache.put(key, frame)
+        self.last = state
+        if frame:
+            yield frame
+
+    def _encode_state(self, state):
+        if self.quantize:
+            state = dict(state)
+            for key in ('x', 'y', 'target_x', 'target_y'):
+                state[key] = np.rint(state[key]).astype(np.int32)
+        return state
+
+    def _encode_delta(self, last, state):
+        count = len(last['ids'])
+        frame = ''
+
+        if len(state['ids']) > count:
+            added = [self.engine.get_character(int(char_id)) for char_id in state['ids'][count:]]
+            added = [char for char in added if char is not None]
+            if self.quantize:
+                for char in added:
+                    for key in ('x', 'y', 'target_x', 'target_y'):
+                        char[key] = round(char[key])
+            frame += format_event('added', added)
+
+        moved = (state['x'][:count] != last['x']) | (state['y'][:count] != last['y'])
+        retargeted = (
+            (state['target_x'][:count] != last['target_x'])
+            | (state['target_y'][:count] != last['target_y'])
+        )
+        if not moved.any() and not retargeted.any():
+            return frame
+
+        delta = {'tick': state['tick']}
+        rows = np.flatnonzero(moved)
+        delta.update(ids=state['ids'][rows].tolist(), x=state['x'][rows].tolist(), y=state['y'][rows].tolist())
+        if retargeted.any():
+            rows = np.flatnonzero(retargeted)
+            delta['targets'] = {
+                'ids': state['ids'][rows].tolist(),
+                'x': state['target_x'][rows].tolist(),
+                'y': state['target_y'][rows].tolist(),
+            }
+        return frame + format_event('delta', delta)
@@ -0,0 +1,204 @@
+# app/utils/binary.py
+"""Compact binary snapshot format for map and character payloads.
+
+A snapshot is a small header followed by tagged sections, all little-endian:
+
+    header   magic (4s) 'IDLE', version (u16), section count (u16)
+    section  tag (4s), dtype (u8), columns (u8), reserved (u16), byte length (u32),
+             then the payload padded to a multiple of 4 bytes
+
+Every payload starts 4-byte aligned, so the browser can wrap it in a typed array
+without copying. dtype is one of the DTYPES codes below; a section with N rows
+and C columns is stored row-major. Float64 sections are only 4-byte aligned,
+so they are reserved for snapshots exchanged between workers (see app.shards).
+"""
+import struct
+
+import numpy as np
+
+MIME_TYPE = 'application/x-idle-snapshot'
+MAGIC = b'IDLE'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHH')
+SECTION = struct.Struct('<4sBBHI')
+
+DTYPES = {
+    1: np.dtype('<u1'),
+    2: np.dtype('<u2'),
+    3: np.dtype('<u4'),
+    4: np.dtype('<f4'),
+    5: np.dtype('<f8'),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+DEFAULT_COLORS = {
+    'buildings': '#8B4513',
+    'trees': '#228B22',
+    'lines': '#FFD700',
+}
+
+
+class SnapshotWriter:
+    """Accumulates tagged array sections and packs them into one buffer"""
+
+    def __init__(self):
+        self.sections = []
+
+    def add(self, tag, values, dtype, columns=1):
+        array = np.ascontiguousarray(values, dtype=dtype)
+        self.sections.append((tag, array, columns))
+
+    def add_coords(self, tag, values, columns):
+        """Store coordinates as uint16 when they are whole and in range, else float32"""
+        array = np.asarray(values, dtype=np.float64).reshape(-1)
+        if (
+            array.size == 0
+            or (array.min() >= 0 and array.max() <= 0xFFFF and np.all(array == np.floor(array)))
+        ):
+            self.add(tag, array, '<u2', columns)
+        else:
+            self.add(tag, array, '<f4', columns)
+
+    def add_bytes(self, tag, data):
+        self.add(tag, np.frombuffer(data, dtype=np.uint8), '<u1')
+
+    def to_bytes(self):
+        parts = [HEADER.pack(MAGIC, VERSION, len(self.sections))]
+        for tag, array, columns in self.sections:
+            payload = array.tobytes()
+            parts.append(SECTION.pack(tag, DTYPE_CODES[array.dtype], columns, 0, len(payload)))
+            parts.append(payload)
+            padding = -len(payload) % 4
+            if padding:
+                parts.append(b'\0' * padding)
+        return b''.join(parts)
+
+
+def read_snapshot(data):
+    """Decode a snapshot into {tag: array}, with multi-column sections reshaped to (N, C)"""
+    magic, version, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not an idle-game snapshot')
+
+    offset = HEADER.size
+    sections = {}
+    for _ in range(count):
+        tag, code, columns, _, length = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        array = np.frombuffer(data, dtype=DTYPES[code], count=length // DTYPES[code].itemsize, offset=offset)
+        sections[tag.decode('ascii')] = array.reshape(-1, columns) if columns > 1 else array
+        offset += length + (-length % 4)
+    return sections
+
+
+def _color_value(color, default):
+    """'#rrggbb' as an integer, falling back to default for anything else"""
+    for value in (color, default):
+        if isinstance(value, str) and len(value) == 7 and value.startswith('#'):
+            try:
+                return int.from_bytes(bytes.fromhex(value[1:]), 'big')
+            except ValueError:
+                pass
+    raise ValueError(f'Invalid color: {default}')
+
+
+def encode_map(map_dict):
+    """Pack a map dict (as returned by to_dict) into a binary snapshot"""
+    writer = SnapshotWriter()
+    writer.add(b'META', [map_dict['id'] or 0, map_dict['width'], map_dict['height']], '<u4', 3)
+
+    buildings = map_dict.get('buildings') or []
+    trees = map_dict.get('trees') or []
+    paths = map_dict.get('paths') or {}
+    lines = paths.get('lines', []) if isinstance(paths, dict) else []
+    points = paths.get('points', []) if isinstance(paths, dict) else []
+
+    palette = []
+    palette_index = {}
+
+    def color_indices(items, default):
+        indices = []
+        for item in items:
+            value = _color_value(item.get('color'), default)
+            if value not in palette_index:
+                palette_index[value] = len(palette)
+                palette.append(value)
+            indices.append(palette_index[value])
+        return indices
+
+    building_colors = color_indices(buildings, DEFAULT_COLORS['buildings'])
+    tree_colors = color_indices(trees, DEFAULT_COLORS['trees'])
+    line_colors = color_indices(lines, DEFAULT_COLORS['lines'])
+    if len(palette) > 256:
+        raise ValueError('Map uses more than 256 distinct colors')
+
+    writer.add(b'PALT', palette, '<u4')
+    writer.add_coords(b'BLDG', [(b['x'], b['y'], b['width'], b['height']) for b in buildings], 4)
+    writer.add(b'BLDC', building_colors, '<u1')
+    writer.add_coords(b'TREE', [(t['x'], t['y'], t['size']) for t in trees], 3)
+    writer.add(b'TREC', tree_colors, '<u1')
+    writer.add_coords(b'LINE', [(ln['x1'], ln['y1'], ln['x2'], ln['y2']) for ln in lines], 4)
+    writer.add(b'LINC', line_colors, '<u1')
+    writer.add(b'PNTS', [(p['x'], p['y']) for p in points], '<f4', 2)
+    return writer.to_bytes()
+
+
+def encode_characters(characters, tick=0):
+    """Pack a list of character dicts (as returned by to_dict) into a binary snapshot"""
+    positions = [(c['x'], c['y'], c['target_x'], c['target_y'], c['speed']) for c in characters]
+    return encode_columns([c['id'] for c in characters], positions, characters, tick)
+
+
+def encode_columns(ids, positions, profiles, tick=0, dtype='<f4'):
+    """encode_characters for state already held in columns
+
+    positions is an (N, 5) array of x, y, target_x, target_y and speed, and
+    profiles the dicts holding each character's map_id, color, name and role,
+    or their profile_sections() for callers that encode the same roster often.
+    dtype '<f8' keeps positions exact, for snapshots exchanged between workers.
+    """
+    writer = SnapshotWriter()
+    writer.add(b'TICK', [tick], '<u4')
+    writer.add(b'CIDS', ids, '<u4')
+    writer.add(b'CPOS', np.asarray(positions, dtype=np.float64).reshape(-1, 5), dtype, 5)
+    sections = profiles if isinstance(profiles, dict) else profile_sections(profiles)
+    for tag, values in sections.items():
+        writer.add(tag, values, values.dtype)
+    return writer.to_bytes()
+
+
+def profile_sections(profiles):
+    """The sections of encode_columns that only depend on the characters' static fields"""
+    # Names and roles as NUL-separated UTF-8: name0, role0, name1, role1, ...
+    # The API refuses NUL in them; rows stored before that have it dropped here
+    strings = '\0'.join(
+        f"{p['name']}".replace('\0', '') + '\0' + f"{p['role']}".replace('\0', '') for p in profiles
+    )
+    return {
+        b'CMAP': np.array([p.get('map_id') or 0 for p in profiles], dtype='<u4'),
+        b'CCOL': np.array([_color_value(p.get('color'), '#3498db') for p in profiles], dtype='<u4'),
+        b'CSTR': np.frombuffer(strings.encode('utf-8'), dtype=np.uint8),
+    }
+
+
+def decode_characters(data):
+    """Unpack an encode_characters snapshot into (tick, list of character dicts)"""
+    sections = read_snapshot(data)
+    count = len(sections['CIDS'])
+    strings = sections['CSTR'].tobytes().decode('utf-8').split('\0') if count else []
+    columns = zip(
+        sections['CIDS'].tolist(),
+        sections['CPOS'].reshape(-1, 5).tolist(),
+        sections['CMAP'].tolist(),
+        sections['CCOL'].tolist(),
+    )
+    characters = [
+        {
+            'id': char_id, 'name': strings[2 * i], 'role': strings[2 * i + 1],
+            'x': x, 'y': y, 'target_x': target_x, 'target_y': target_y, 'speed': speed,
+            'color': f'#{color:06x}', 'map_id': map_id or None,
+        }
+        for i, (char_id, (x, y, target_x, target_y, speed), map_id, color) in enumerate(columns)
+    ]
+    return int(sections['TICK'][0]), characters
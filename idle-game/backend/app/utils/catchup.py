@@ -0,0 +1,133 @@
+# app/utils/catchup.py
+import numpy as np
+
+# Characters with more than this many average legs left are placed by sampling
+# the long-run distribution instead of walking each remaining leg.
+MIXING_LEGS = 8
+
+
+def leg_ticks(distance, speed):
+    """Ticks the movement kernel spends on a leg: it snaps to the target on the last one"""
+    return np.maximum(1, np.ceil(distance / speed))
+
+
+def fast_forward(x, y, target_x, target_y, speed, ticks, path_points, rng=None):
+    """Jump characters forward by a number of ticks without simulating each one
+
+    A character first finishes its current leg. After that it keeps walking
+    to uniformly random path points, which is a renewal process. If only a
+    few legs fit in the remaining time, they are drawn and walked one by one
+    (vectorised across characters). Otherwise the character is placed by the
+    process's stationary law: the leg in progress is chosen with probability
+    proportional to its duration, and the time into it is uniform.
+
+    All inputs are 1-D arrays of equal length (ticks may be fractional) and
+    path_points is an (N, 2) array. Returns a dict of arrays: the new x, y,
+    target_x and target_y, plus leg_x/leg_y (where the current leg started)
+    and travelled (pixels covered along it), for callers that re-route
+    the leg.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    target_x = np.array(target_x, dtype=np.float64)
+    target_y = np.array(target_y, dtype=np.float64)
+    speed = np.asarray(speed, dtype=np.float64)
+    remaining = np.floor(np.asarray(ticks, dtype=np.float64))
+
+    leg_x, leg_y = x.copy(), y.copy()
+    travelled = np.zeros_like(x)
+
+    # Finish (or progress along) the current leg
+    distance = np.hypot(target_x - x, target_y - y)
+    first = np.where(distance > 0, leg_ticks(distance, speed), 0)
+    within = remaining < first
+    travelled[within] = remaining[within] * speed[within]
+
+    done = ~within
+    remaining = np.where(done, remaining - first, 0)
+    if not len(path_points):
+        # Nothing to walk to afterwards: characters wait at their target
+        leg_x[done], leg_y[done] = target_x[done], target_y[done]
+        return _result(leg_x, leg_y, target_x, target_y, travelled)
+
+    mean_ticks = _mean_leg_ticks(path_points, speed, rng)
+    walk = done & (remaining < MIXING_LEGS * mean_ticks)
+    settle = done & ~walk
+
+    # Few legs left: draw and walk them explicitly
+    leg_x[walk], leg_y[walk] = target_x[walk], target_y[walk]
+    active = np.flatnonzero(walk)
+    while len(active):
+        choice = rng.integers(0, len(path_points), size=len(active))
+        next_x, next_y = path_points[choice, 0], path_points[choice, 1]
+        start_x, start_y = target_x[active], target_y[active]
+        duration = leg_ticks(np.hypot(next_x - start_x, next_y - start_y), speed[active])
+
+        leg_x[active], leg_y[active] = start_x, start_y
+        target_x[active], target_y[active] = next_x, next_y
+        ends_here = remaining[active] < duration
+        travelled[active[ends_here]] = remaining[active[ends_here]] * speed[active[ends_here]]
+        remaining[active] -= np.where(ends_here, 0, duration)
+        active = active[~ends_here]
+
+    # Many legs left: sample the stationary state directly
+    rows = np.flatnonzero(settle)
+    if len(rows):
+        start, end, duration = _sample_biased_legs(path_points, speed[rows], rng)
+        offset = np.floor(rng.random(len(rows)) * duration)
+        leg_x[rows], leg_y[rows] = path_points[start, 0], path_points[start, 1]
+        target_x[rows], target_y[rows] = path_points[end, 0], path_points[end, 1]
+        travelled[rows] = offset * speed[rows]
+
+    return _result(leg_x, leg_y, target_x, target_y, travelled)
+
+
+def _result(leg_x, leg_y, target_x, target_y, travelled):
+    dx = target_x - leg_x
+    dy = target_y - leg_y
+    length = np.hypot(dx, dy)
+    fraction = np.divide(
+        np.minimum(travelled, length), length, out=np.ones_like(length), where=length > 0
+    )
+    return {
+        'x': leg_x + dx * fraction,
+        'y': leg_y + dy * fraction,
+        'target_x': target_x,
+        'target_y': target_y,
+        'leg_x': leg_x,
+        'leg_y': leg_y,
+        'travelled': np.minimum(travelled, length),
+    }
+
+
+def _mean_leg_ticks(path_points, speed, rng, samples=4096):
+    """Average ticks per random leg, estimated from sampled point pairs"""
+    start = rng.integers(0, len(path_points), size=samples)
+    end = rng.integers(0, len(path_points), size=samples)
+    distance = np.hypot(*(path_points[end] - path_points[start]).T)
+    slowest = max(float(np.min(speed)), 1e-9) if len(speed) else 1.0
+    return float(np.mean(leg_ticks(distance, slowest)))
+
+
+def _sample_biased_legs(path_points, speed, rng):
+    """Draw (start, end) point pairs with probability proportional to their duration"""
+    count = len(speed)
+    start = np.empty(count, dtype=np.int64)
+    end = np.empty(count, dtype=np.int64)
+    duration = np.empty(count, dtype=np.float64)
+
+    span = path_points.max(axis=0) - path_points.min(axis=0)
+    longest = leg_ticks(np.hypot(*span), speed)
+
+    pending = np.arange(count)
+    while len(pending):
+        a = rng.integers(0, len(path_points), size=len(pending))
+        b = rng.integers(0, len(path_points), size=len(pending))
+        ticks = leg_ticks(np.hypot(*(path_points[b] - path_points[a]).T), speed[pending])
+        accept = rng.random(len(pending)) * longest[pending] < ticks
+        rows = pending[accept]
+        start[rows], end[rows], duration[rows] = a[accept], b[accept], ticks[accept]
+        pending = pending[~accept]
+
+    return start, end, duration
@@ -0,0 +1,165 @@
+# app/utils/chunks.py
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+from app.utils.generator import MapGenerator
+
+# Main paths run along every 4th grid row/column starting at 2 (see
+# MapGenerator.generate_main_paths). Chunk sizes are a multiple of this many
+# cells so the lattice continues seamlessly from one chunk to the next.
+PATH_LATTICE = 4
+# Obstacles stay this many cells away from chunk edges, so every lattice row
+# and column reaches the border with a run long enough to become a path.
+BORDER_CELLS = 5
+
+
+class ChunkGenerator(MapGenerator):
+    """Generates one square chunk of a large world from a world seed and chunk coordinates"""
+
+    def __init__(self, seed, chunk_x, chunk_y, chunk_size=640):
+        self.chunk_x = chunk_x
+        self.chunk_y = chunk_y
+        self.origin_x = chunk_x * chunk_size
+        self.origin_y = chunk_y * chunk_size
+        rng = random.Random(f"{seed}:{chunk_x}:{chunk_y}")
+        super().__init__(chunk_size, chunk_size, rng=rng)
+        self.seed = seed
+        self.margin = BORDER_CELLS * self.grid_size
+
+        cells = chunk_size // self.grid_size
+        if chunk_size % self.grid_size or cells % PATH_LATTICE:
+            raise ValueError(
+                f"chunk_size must be a multiple of {self.grid_size * PATH_LATTICE}"
+            )
+
+    def generate_chunk(self):
+        """Generate the chunk's objects and paths in world coordinates"""
+        buildings = self.generate_buildings()
+        trees = self.generate_trees(buildings)
+        grid = self.create_grid(buildings, trees)
+
+        lines = self.generate_paths(buildings, trees)["lines"] + self.seam_lines(grid)
+        lines = [self.offset_line(line) for line in lines]
+        points = [
+            point for point in self.generate_path_points(lines) if self.contains(point)
+        ]
+
+        return {
+            "chunk_x": self.chunk_x,
+            "chunk_y": self.chunk_y,
+            "x": self.origin_x,
+            "y": self.origin_y,
+            "width": self.width,
+            "height": self.height,
+            "buildings": [self.offset(b, ("x",), ("y",)) for b in buildings],
+            "trees": [self.offset(t, ("x",), ("y",)) for t in trees],
+            "paths": {"lines": lines, "points": points},
+        }
+
+    def seam_lines(self, grid):
+        """Join lattice paths that leave the east and south edges to the next chunk"""
+        half = self.grid_size // 2
+        grid_width = len(grid[0])
+        grid_height = len(grid)
+        lines = []
+
+        for y in range(2, grid_height - 2, PATH_LATTICE):
+            if grid[y][grid_width - 1] == 0:
+                start_x = (grid_width - 1) * self.grid_size + half
+                center_y = y * self.grid_size + half
+                lines.append(self.path_line(start_x, center_y, start_x + self.grid_size, center_y))
+
+        for x in range(2, grid_width - 2, PATH_LATTICE):
+            if grid[grid_height - 1][x] == 0:
+                center_x = x * self.grid_size + half
+                start_y = (grid_height - 1) * self.grid_size + half
+                lines.append(self.path_line(center_x, start_y, center_x, start_y + self.grid_size))
+
+        return lines
+
+    @staticmethod
+    def path_line(x1, y1, x2, y2):
+        return {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "color": "#FFD700"}
+
+    def contains(self, point):
+        return (
+            self.origin_x <= point["x"] < self.origin_x + self.width
+            and self.origin_y <= point["y"] < self.origin_y + self.height
+        )
+
+    def offset(self, item, x_keys, y_keys):
+        shifted = dict(item)
+        for key in x_keys:
+            shifted[key] += self.origin_x
+        for key in y_keys:
+            shifted[key] += self.origin_y
+        return shifted
+
+    def offset_line(self, line):
+        return self.offset(line, ("x1", "x2"), ("y1", "y2"))
+
+
+class ChunkedWorld:
+    """Lazily generated, evictable chunks of an unbounded world
+
+    Only viewports keep chunks alive. Characters are simulated on bounded
+    GameMaps and never walk this world, so their positions do not touch
+    chunks.
+    """
+
+    def __init__(self, seed, chunk_size=640, ttl=60.0, max_chunks=1024):
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.max_chunks = max_chunks
+        self._chunks = OrderedDict()  # (chunk_x, chunk_y) -> [chunk, last access time]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def chunk_coords(self, x, y):
+        return math.floor(x / self.chunk_size), math.floor(y / self.chunk_size)
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """Return a chunk, generating it on first access"""
+        key = (chunk_x, chunk_y)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._chunks.move_to_end(key)
+                return entry[0]
+
+        # Generation is deterministic, so a race only wastes work
+        chunk = ChunkGenerator(self.seed, chunk_x, chunk_y, self.chunk_size).generate_chunk()
+        with self._lock:
+            entry = self._chunks.setdefault(key, [chunk, now])
+            self._chunks.move_to_end(key)
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+            return entry[0]
+
+    def chunks_in_view(self, x, y, width, height):
+        """Return every chunk overlapping the given rectangle"""
+        min_x, min_y = self.chunk_coords(x, y)
+        max_x, max_y = self.chunk_coords(x + max(width, 1) - 1, y + max(height, 1) - 1)
+        return [
+            self.get_chunk(chunk_x, chunk_y)
+            for chunk_y in range(min_y, max_y + 1)
+            for chunk_x in range(min_x, max_x + 1)
+        ]
+
+    def evict(self, now=None):
+        """Drop chunks no request has viewed within the TTL"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            stale = [key for key, (_, accessed) in self._chunks.items() if now - accessed > self.ttl]
+            for key in stale:
+                del self._chunks[key]
+        return len(stale)
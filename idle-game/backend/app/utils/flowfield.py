@@ -0,0 +1,165 @@
+# app/utils/flowfield.py
+import heapq
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SQRT2 = math.sqrt(2)
+NEIGHBOURS = [
+    (1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+    (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2),
+]
+
+
+class FlowField:
+    """Integration and direction fields leading every grid cell to one goal cell
+
+    Built with one Dijkstra pass outward from the goal, under the same
+    movement rules as PathFinder.search: 8-connected moves, no corner
+    cutting, a blocked goal may be entered, and a blocked start may be
+    left but never passed through. After that, any character's next step
+    toward the goal is a single array lookup.
+    """
+
+    def __init__(self, grid, goal):
+        self.blocked = np.asarray(grid, dtype=bool)
+        self.height, self.width = self.blocked.shape
+        self.goal = goal
+        self.cost = None  # integration field: cost to reach the goal from each cell
+        self.next_x = self.next_y = None  # direction field: the next cell toward the goal
+        self._integrate()
+
+    def _integrate(self):
+        # Plain lists over flat cell indices: much faster than numpy scalar access here
+        blocked = self.blocked.ravel().tolist()
+        width, height = self.width, self.height
+        cost = [math.inf] * (width * height)
+        parent = [-1] * (width * height)
+        goal = self.goal[1] * width + self.goal[0]
+
+        cost[goal] = 0.0
+        open_heap = [(0.0, goal)]
+        while open_heap:
+            current_cost, current = heapq.heappop(open_heap)
+            if current_cost > cost[current]:
+                continue
+            if blocked[current] and current != goal:
+                # Only reachable as a start cell: nothing may route through it
+                continue
+
+            cy, cx = divmod(current, width)
+            for dx, dy, step in NEIGHBOURS:
+                nx, ny = cx + dx, cy + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                if dx and dy and (blocked[cy * width + nx] or blocked[ny * width + cx]):
+                    continue
+                neighbour = ny * width + nx
+                new_cost = current_cost + step
+                if new_cost < cost[neighbour]:
+                    cost[neighbour] = new_cost
+                    parent[neighbour] = current
+                    heapq.heappush(open_heap, (new_cost, neighbour))
+
+        self.cost = np.array(cost, dtype=np.float32).reshape(height, width)
+        parent = np.array(parent, dtype=np.int32).reshape(height, width)
+        self.next_x = np.where(parent >= 0, parent % width, -1).astype(np.int32)
+        self.next_y = np.where(parent >= 0, parent // width, -1).astype(np.int32)
+
+    def reachable(self, cell):
+        return bool(np.isfinite(self.cost[cell[1], cell[0]]))
+
+    def next_step(self, cell):
+        """The neighbouring cell to move to from cell, or None at the goal or when unreachable"""
+        x = int(self.next_x[cell[1], cell[0]])
+        if x < 0:
+            return None
+        return x, int(self.next_y[cell[1], cell[0]])
+
+    def route(self, start):
+        """Every cell from start to the goal, or None if the goal cannot be reached"""
+        if start == self.goal:
+            return [start]
+        if not self.reachable(start):
+            return None
+        cells = [start]
+        current = start
+        while current != self.goal:
+            current = self.next_step(current)
+            cells.append(current)
+        return cells
+
+
+class FlowFieldCache:
+    """LRU cache of flow fields for destinations that are requested often
+
+    Request counts are kept for every goal and halved every sample_size
+    requests, so they track recent popularity. A goal gets a flow field
+    once it reaches min_requests. When the cache is full, the new goal must
+    also be more popular than the field it would evict. Rarely used goals
+    stay with A*, and the cache goes to the destinations crowds actually
+    share.
+    """
+
+    def __init__(self, maxsize=256, min_requests=4, sample_size=8192):
+        self.maxsize = maxsize
+        self.min_requests = min_requests
+        self.sample_size = sample_size
+        self.builds = 0
+        self._fields = OrderedDict()
+        self._requests = {}
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._fields)
+
+    def field(self, map_key, grid, goal, requests=1):
+        """Return the flow field toward goal, building it if the goal is popular, else None
+
+        requests is how many routes toward goal the caller is about to plan;
+        a batch of them counts as that many requests.
+        """
+        key = (map_key, goal)
+        with self._lock:
+            count = self._count(key, requests)
+            field = self._fields.get(key)
+            if field is not None:
+                self._fields.move_to_end(key)
+                return field
+            if count < self.min_requests:
+                return None
+            if len(self._fields) >= self.maxsize:
+                victim = next(iter(self._fields))
+                if self._requests.get(victim, 0) >= count:
+                    return None
+
+        # Build outside the lock; a concurrent duplicate only wastes work
+        field = FlowField(grid, goal)
+        with self._lock:
+            self.builds += 1
+            self._fields[key] = field
+            while len(self._fields) > self.maxsize:
+                self._fields.popitem(last=False)
+        return field
+
+    def _count(self, key, requests=1):
+        count = self._requests.get(key, 0) + requests
+        self._requests[key] = count
+        self._seen += requests
+        if self._seen >= self.sample_size:
+            # Age every count so yesterday's crowds do not pin today's cache
+            self._requests = {k: c // 2 for k, c in self._requests.items() if c > 1}
+            self._seen = 0
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._fields.clear()
+            self._requests.clear()
+            self._seen = 0
+
+
+flow_cache = FlowFieldCache()
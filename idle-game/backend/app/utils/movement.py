@@ -0,0 +1,168 @@
+# app/utils/movement.py
+import numpy as np
+
+
+class CharacterStore:
+    """Struct-of-arrays storage for simulated character positions"""
+
+    FIELDS = ('x', 'y', 'target_x', 'target_y', 'speed')
+    # The point a character is currently walking to: the next route waypoint,
+    # or the target itself when it has no route.
+    ARRAYS = FIELDS + ('waypoint_x', 'waypoint_y')
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.index = {}  # character id -> row
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._dirty = np.zeros(capacity, dtype=bool)
+        self._arrays = {field: np.zeros(capacity, dtype=np.float64) for field in self.ARRAYS}
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, character_id):
+        return character_id in self.index
+
+    @property
+    def ids(self):
+        return self._ids[:self.count]
+
+    @property
+    def dirty(self):
+        return self._dirty[:self.count]
+
+    @property
+    def x(self):
+        return self._arrays['x'][:self.count]
+
+    @property
+    def y(self):
+        return self._arrays['y'][:self.count]
+
+    @property
+    def target_x(self):
+        return self._arrays['target_x'][:self.count]
+
+    @property
+    def target_y(self):
+        return self._arrays['target_y'][:self.count]
+
+    @property
+    def speed(self):
+        return self._arrays['speed'][:self.count]
+
+    @property
+    def waypoint_x(self):
+        return self._arrays['waypoint_x'][:self.count]
+
+    @property
+    def waypoint_y(self):
+        return self._arrays['waypoint_y'][:self.count]
+
+    def add(self, character_id, x, y, target_x, target_y, speed):
+        """Append a character, growing the arrays when full"""
+        if character_id in self.index:
+            row = self.index[character_id]
+        else:
+            if self.count == len(self._ids):
+                self._grow(max(64, self.count * 2))
+            row = self.count
+            self.count += 1
+            self.index[character_id] = row
+            self._ids[row] = character_id
+
+        values = (x, y, target_x, target_y, speed, target_x, target_y)
+        for field, value in zip(self.ARRAYS, values):
+            self._arrays[field][row] = value
+        self._dirty[row] = False
+        return row
+
+    def remove(self, character_id):
+        """Drop a character by moving the last row into its slot"""
+        row = self.index.pop(character_id)
+        last = self.count - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._dirty[row] = self._dirty[last]
+            for array in self._arrays.values():
+                array[row] = array[last]
+            self.index[moved_id] = row
+        self.count = last
+
+    def get(self, character_id):
+        """Return one character's fields as plain Python floats"""
+        row = self.index[character_id]
+        return {field: float(self._arrays[field][row]) for field in self.FIELDS}
+
+    def set_target(self, character_id, target_x, target_y, waypoint=None):
+        """Set a new target, walking straight to it unless a first waypoint is given"""
+        row = self.index[character_id]
+        self._arrays['target_x'][row] = target_x
+        self._arrays['target_y'][row] = target_y
+        self.set_waypoint(row, *(waypoint or (target_x, target_y)))
+        self._dirty[row] = True
+
+    def set_waypoint(self, row, x, y):
+        self._arrays['waypoint_x'][row] = x
+        self._arrays['waypoint_y'][row] = y
+
+    def take_dirty(self):
+        """Return rows of changed characters and clear their dirty flags"""
+        rows = np.flatnonzero(self.dirty)
+        self.dirty[rows] = False
+        return rows
+
+    def _grow(self, capacity):
+        self._ids = np.resize(self._ids, capacity)
+        self._dirty = np.resize(self._dirty, capacity)
+        for field in self.ARRAYS:
+            self._arrays[field] = np.resize(self._arrays[field], capacity)
+
+
+def points_to_array(points):
+    """Convert a list of {'x', 'y'} dicts into an (N, 2) float array"""
+    if not points:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.array([(p['x'], p['y']) for p in points], dtype=np.float64)
+
+
+def advance(store, path_points=None, rng=None):
+    """Move every character in the store one step towards its waypoint
+
+    Characters that reach their waypoint this tick are snapped onto it. Those
+    whose waypoint was their final target have arrived and, if path_points is
+    a non-empty (N, 2) array, are given a new random target from it.
+    Returns the boolean masks (reached, arrived); rows that reached an
+    intermediate waypoint are left for the caller to route onwards.
+    """
+    x, y = store.x, store.y
+    target_x, target_y = store.target_x, store.target_y
+    waypoint_x, waypoint_y = store.waypoint_x, store.waypoint_y
+    speed = store.speed
+
+    dx = waypoint_x - x
+    dy = waypoint_y - y
+    distance = np.hypot(dx, dy)
+
+    reached = distance <= speed
+    moving = ~reached
+    scale = np.divide(speed, distance, out=np.zeros_like(distance), where=moving)
+
+    x += dx * scale
+    y += dy * scale
+    x[reached] = waypoint_x[reached]
+    y[reached] = waypoint_y[reached]
+    arrived = reached & (waypoint_x == target_x) & (waypoint_y == target_y)
+
+    changed = distance > 0
+    if path_points is not None and len(path_points) and arrived.any():
+        rng = rng if rng is not None else np.random.default_rng()
+        rows = np.flatnonzero(arrived)
+        choice = rng.integers(0, len(path_points), size=len(rows))
+        target_x[rows] = waypoint_x[rows] = path_points[choice, 0]
+        target_y[rows] = waypoint_y[rows] = path_points[choice, 1]
+        changed |= arrived
+
+    store.dirty[changed] = True
+    return reached, arrived
@@ -1,71 +1,343 @@
 # app/utils/pathfinding.py
+import heapq
 import math
-import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.metrics import SIZE_BUCKETS, metrics
+from app.utils.flowfield import NEIGHBOURS, SQRT2, flow_cache
+from app.utils.generator import MapGenerator, unpack_grid
+from app.utils.spatial import CellIndex, PointIndex, SpatialGrid
+
+ROUTE_SECONDS = metrics.histogram(
+    'route_seconds', 'Time to plan a route, by where the route came from', ('source',)
+)
+POSITION_CHECK_SIZE = metrics.histogram(
+    'position_check_batch_size', 'Positions validated per valid_positions call', buckets=SIZE_BUCKETS
+)
+
+
+class RouteCache:
+    """Thread-safe LRU cache of planned routes keyed on (map, start cell, goal cell)"""
+
+    MISSING = object()
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._routes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def get(self, key):
+        with self._lock:
+            route = self._routes.get(key, self.MISSING)
+            if route is self.MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._routes.move_to_end(key)
+            return route
+
+    def put(self, key, route):
+        with self._lock:
+            self._routes[key] = route
+            self._routes.move_to_end(key)
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_cache = RouteCache()
+
 
 class PathFinder:
-    def __init__(self, game_map):
+    def __init__(self, game_map, cell_size=32):
         self.game_map = game_map
-        self.buildings = json.loads(game_map.buildings) if game_map.buildings else []
-        self.trees = json.loads(game_map.trees) if game_map.trees else []
-        self.paths = json.loads(game_map.paths) if game_map.paths else {'points': []}
-    
+        geometry = game_map.geometry()
+        self.buildings = geometry['buildings']
+        self.trees = geometry['trees']
+        self.paths = geometry['paths']
+        self.build_index(cell_size)
+        self.build_grid()
+
+    def build_index(self, cell_size=32):
+        """Build spatial indexes over path points, buildings and trees"""
+        self.point_index = PointIndex(self.paths.get('points') or [], cell_size)
+        self.point_cells = CellIndex(self.point_index.xs, self.point_index.ys, cell_size)
+        self.building_boxes = np.array(
+            [[b['x'], b['y'], b['x'] + b['width'], b['y'] + b['height']] for b in self.buildings],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        self.tree_circles = np.array(
+            [[t['x'], t['y'], t['size']] for t in self.trees], dtype=np.float64
+        ).reshape(-1, 3)
+
+        self.building_index = SpatialGrid(cell_size)
+        for i, building in enumerate(self.buildings):
+            self.building_index.insert(
+                i,
+                building['x'], building['y'],
+                building['x'] + building['width'], building['y'] + building['height']
+            )
+
+        self.tree_index = SpatialGrid(cell_size)
+        for i, tree in enumerate(self.trees):
+            self.tree_index.insert(
+                i,
+                tree['x'] - tree['size'], tree['y'] - tree['size'],
+                tree['x'] + tree['size'], tree['y'] + tree['size']
+            )
+
+    def build_grid(self):
+        """Load the map's stored walkability grid, rebuilding it for maps saved without one"""
+        width = getattr(self.game_map, 'width', None) or 800
+        height = getattr(self.game_map, 'height', None) or 600
+        generator = MapGenerator(width, height)
+        self.grid_size = generator.grid_size
+        grid = unpack_grid(getattr(self.game_map, 'grid', None), width, height, self.grid_size)
+        if grid is None:
+            grid = generator.create_grid(self.buildings, self.trees)
+        self.grid = grid
+        self.grid_height, self.grid_width = grid.shape
+        # Nested lists index faster than numpy scalars in the A* inner loop
+        self.grid_rows = grid.tolist()
+        self.map_key = (getattr(self.game_map, 'id', None), getattr(self.game_map, 'created_at', None))
+
     def is_valid_position(self, x, y):
         """Check if position is valid (on path and not colliding)"""
         # Check if position is on a path point
         if not self.is_on_path(x, y):
             return False
-        
+
         # Check collision with buildings
         if self.collides_with_buildings(x, y):
             return False
-        
+
         # Check collision with trees
         if self.collides_with_trees(x, y):
             return False
-        
+
         return True
-    
+
+    def valid_positions(self, xs, ys, tolerance=30, character_radius=15, block=4096):
+        """Vectorized is_valid_position: return a boolean array for many positions at once"""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        POSITION_CHECK_SIZE.observe(len(xs))
+        valid = np.isfinite(xs) & np.isfinite(ys)
+
+        if len(self.point_cells):
+            reach = math.ceil(tolerance / self.point_cells.cell_size)
+            queries, points = self.point_cells.candidate_pairs(xs, ys, reach)
+            near = (
+                (self.point_cells.xs[points] - xs[queries]) ** 2
+                + (self.point_cells.ys[points] - ys[queries]) ** 2
+            ) <= tolerance * tolerance
+            on_path = np.zeros(len(xs), dtype=bool)
+            on_path[queries[near]] = True
+            valid &= on_path
+
+        # Few obstacles per map, so test each block of positions against all of them
+        boxes, circles = self.building_boxes, self.tree_circles
+        for start in range(0, len(xs), block):
+            x = xs[start:start + block, None]
+            y = ys[start:start + block, None]
+            hits_building = (
+                (x - character_radius < boxes[:, 2]) & (x + character_radius > boxes[:, 0])
+                & (y - character_radius < boxes[:, 3]) & (y + character_radius > boxes[:, 1])
+            ).any(axis=1)
+            hits_tree = (
+                np.hypot(x - circles[:, 0], y - circles[:, 1]) < circles[:, 2] + character_radius
+            ).any(axis=1)
+            valid[start:start + block] &= ~(hits_building | hits_tree)
+
+        return valid
+
     def is_on_path(self, x, y, tolerance=30):
         """Check if position is near a path point"""
         if not self.paths.get('points'):
             return True  # If no paths defined, allow movement anywhere
-        
-        for point in self.paths['points']:
-            distance = math.sqrt((x - point['x'])**2 + (y - point['y'])**2)
-            if distance <= tolerance:
-                return True
-        return False
-    
+
+        return self.point_index.any_within(x, y, tolerance)
+
     def collides_with_buildings(self, x, y, character_radius=15):
         """Check if character collides with any building"""
-        for building in self.buildings:
+        candidates = self.building_index.query_box(
+            x - character_radius, y - character_radius,
+            x + character_radius, y + character_radius
+        )
+        for i in candidates:
+            building = self.buildings[i]
             if (x - character_radius < building['x'] + building['width'] and
                 x + character_radius > building['x'] and
                 y - character_radius < building['y'] + building['height'] and
                 y + character_radius > building['y']):
                 return True
         return False
-    
+
     def collides_with_trees(self, x, y, character_radius=15):
         """Check if character collides with any tree"""
-        for tree in self.trees:
+        candidates = self.tree_index.query_box(
+            x - character_radius, y - character_radius,
+            x + character_radius, y + character_radius
+        )
+        for i in candidates:
+            tree = self.trees[i]
             distance = math.sqrt((x - tree['x'])**2 + (y - tree['y'])**2)
             if distance < tree['size'] + character_radius:
                 return True
         return False
-    
+
     def find_nearest_path_point(self, x, y):
         """Find the nearest valid path point"""
         if not self.paths.get('points'):
             return {'x': x, 'y': y}
-        
-        nearest_point = self.paths['points'][0]
-        min_distance = float('inf')
-        
-        for point in self.paths['points']:
-            distance = math.sqrt((x - point['x'])**2 + (y - point['y'])**2)
-            if distance < min_distance:
-                min_distance = distance
-                nearest_point = point
-        
-        return nearest_point
\ No newline at end of file
+
+        index, _ = self.point_index.nearest(x, y)
+        return self.paths['points'][index]
+
+    def to_cell(self, x, y):
+        return int(x // self.grid_size), int(y // self.grid_size)
+
+    def cell_center(self, cell):
+        half = self.grid_size // 2
+        return cell[0] * self.grid_size + half, cell[1] * self.grid_size + half
+
+    def in_grid(self, cell):
+        return 0 <= cell[0] < self.grid_width and 0 <= cell[1] < self.grid_height
+
+    def find_route(self, start_x, start_y, goal_x, goal_y):
+        """Plan a walkable route and return it as a list of (x, y) waypoints
+
+        The last waypoint is always the exact goal. Returns None when either
+        end lies outside the grid or no walkable route exists. Goals many
+        characters head for are served from a shared flow field instead of
+        a search per start cell.
+        """
+        return self.find_routes([(start_x, start_y, goal_x, goal_y)])[0]
+
+    def find_routes(self, queries):
+        """find_route for a list of (start_x, start_y, goal_x, goal_y), returning a list of routes
+
+        Queries are grouped by goal cell, and each group's cache misses count
+        toward the goal's flow field together, so a crowd loaded at once
+        shares one field per destination instead of each starting with A*.
+        """
+        routes = [None] * len(queries)
+        groups = {}
+        for i, (start_x, start_y, goal_x, goal_y) in enumerate(queries):
+            start = self.to_cell(start_x, start_y)
+            goal = self.to_cell(goal_x, goal_y)
+            if self.in_grid(start) and self.in_grid(goal):
+                groups.setdefault(goal, []).append((i, start))
+
+        for goal, members in groups.items():
+            misses = []
+            for i, start in members:
+                started = time.perf_counter()
+                cells = route_cache.get((self.map_key, start, goal))
+                if cells is RouteCache.MISSING:
+                    misses.append((i, start))
+                    continue
+                ROUTE_SECONDS.observe(time.perf_counter() - started, 'cache')
+                routes[i] = self._waypoints(cells, queries[i])
+
+            field = None
+            if misses:
+                started = time.perf_counter()
+                field = flow_cache.field(self.map_key, self.grid, goal, requests=len(misses))
+            for i, start in misses:
+                if field is not None:
+                    cells = field.route(start)
+                    cells = self._compress(cells) if cells else None
+                    source = 'flow'
+                else:
+                    cells = self.search(start, goal)
+                    source = 'astar'
+                route_cache.put((self.map_key, start, goal), cells)
+                ROUTE_SECONDS.observe(time.perf_counter() - started, source)
+                routes[i] = self._waypoints(cells, queries[i])
+                started = time.perf_counter()
+        return routes
+
+    def _waypoints(self, cells, query):
+        if cells is None:
+            return None
+        return [self.cell_center(cell) for cell in cells[1:-1]] + [(query[2], query[3])]
+
+    def search(self, start, goal):
+        """A* over the walkability grid; returns the turning-point cells of the route"""
+        if start == goal:
+            return [start]
+
+        grid = self.grid_rows
+        open_heap = [(self._heuristic(start, goal), 0.0, start)]
+        came_from = {start: None}
+        cost_so_far = {start: 0.0}
+
+        while open_heap:
+            _, cost, current = heapq.heappop(open_heap)
+            if current == goal:
+                return self._compress(self._reconstruct(came_from, goal))
+            if cost > cost_so_far[current]:
+                continue
+
+            cx, cy = current
+            for dx, dy, step in NEIGHBOURS:
+                nx, ny = cx + dx, cy + dy
+                if not (0 <= nx < self.grid_width and 0 <= ny < self.grid_height):
+                    continue
+                if grid[ny][nx] and (nx, ny) != goal:
+                    continue
+                # Do not cut corners past blocked cells
+                if dx and dy and (grid[cy][nx] or grid[ny][cx]):
+                    continue
+
+                new_cost = cost + step
+                neighbour = (nx, ny)
+                if new_cost < cost_so_far.get(neighbour, float('inf')):
+                    cost_so_far[neighbour] = new_cost
+                    came_from[neighbour] = current
+                    priority = new_cost + self._heuristic(neighbour, goal)
+                    heapq.heappush(open_heap, (priority, new_cost, neighbour))
+
+        return None
+
+    @staticmethod
+    def _heuristic(cell, goal):
+        """Octile distance between two cells"""
+        dx = abs(cell[0] - goal[0])
+        dy = abs(cell[1] - goal[1])
+        return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)
+
+    @staticmethod
+    def _reconstruct(came_from, goal):
+        cells = []
+        current = goal
+        while current is not None:
+            cells.append(current)
+            current = came_from[current]
+        cells.reverse()
+        return cells
+
+    @staticmethod
+    def _compress(cells):
+        """Keep only the cells where the route changes direction"""
+        if len(cells) <= 2:
+            return cells
+        compressed = [cells[0]]
+        for prev, current, nxt in zip(cells, cells[1:], cells[2:]):
+            if (current[0] - prev[0], current[1] - prev[1]) != (nxt[0] - current[0], nxt[1] - current[1]):
+                compressed.append(current)
+        compressed.append(cells[-1])
+        return compressed
@@ -0,0 +1,235 @@
+# app/utils/spatial.py
+import math
+from collections import defaultdict
+
+import numpy as np
+
+
+class SpatialGrid:
+    """Uniform grid hash mapping bounding boxes to the cells they overlap"""
+
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+    def cell(self, value):
+        return int(math.floor(value / self.cell_size))
+
+    def insert(self, item, min_x, min_y, max_x=None, max_y=None):
+        """Register item in every cell covered by the given box"""
+        max_x = min_x if max_x is None else max_x
+        max_y = min_y if max_y is None else max_y
+        for cy in range(self.cell(min_y), self.cell(max_y) + 1):
+            for cx in range(self.cell(min_x), self.cell(max_x) + 1):
+                self.cells[(cx, cy)].append(item)
+
+    def query_box(self, min_x, min_y, max_x, max_y):
+        """Return the set of items whose cells intersect the given box"""
+        found = set()
+        for cy in range(self.cell(min_y), self.cell(max_y) + 1):
+            for cx in range(self.cell(min_x), self.cell(max_x) + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+
+class PointIndex(SpatialGrid):
+    """Grid hash over points with radius and nearest-neighbour queries"""
+
+    def __init__(self, points, cell_size=32):
+        super().__init__(cell_size)
+        self.xs = []
+        self.ys = []
+        for i, point in enumerate(points):
+            x, y = point['x'], point['y']
+            self.xs.append(x)
+            self.ys.append(y)
+            self.cells[(self.cell(x), self.cell(y))].append(i)
+
+        if self.cells:
+            cell_xs = [cx for cx, _ in self.cells]
+            cell_ys = [cy for _, cy in self.cells]
+            self.bounds = (min(cell_xs), min(cell_ys), max(cell_xs), max(cell_ys))
+        else:
+            self.bounds = None
+
+    def __len__(self):
+        return len(self.xs)
+
+    def query_radius(self, x, y, radius):
+        """Return indices of all points within radius of (x, y)"""
+        limit = radius * radius
+        return [
+            i for i in self.query_box(x - radius, y - radius, x + radius, y + radius)
+            if (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2 <= limit
+        ]
+
+    def any_within(self, x, y, radius):
+        """Check whether at least one point lies within radius of (x, y)"""
+        limit = radius * radius
+        for cy in range(self.cell(y - radius), self.cell(y + radius) + 1):
+            for cx in range(self.cell(x - radius), self.cell(x + radius) + 1):
+                for i in self.cells.get((cx, cy), ()):
+                    if (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2 <= limit:
+                        return True
+        return False
+
+    def nearest(self, x, y):
+        """Return (index, distance) of the closest point, or (None, inf) if empty"""
+        if self.bounds is None:
+            return None, float('inf')
+
+        min_cx, min_cy, max_cx, max_cy = self.bounds
+        origin_x, origin_y = self.cell(x), self.cell(y)
+        max_ring = max(
+            abs(origin_x - min_cx), abs(origin_x - max_cx),
+            abs(origin_y - min_cy), abs(origin_y - max_cy),
+        )
+
+        best, best_sq = None, float('inf')
+        for ring in range(max_ring + 1):
+            # Every cell in this ring is at least (ring - 1) cells away
+            if best is not None and (ring - 1) * self.cell_size > math.sqrt(best_sq):
+                break
+            for cx, cy in self._ring(origin_x, origin_y, ring):
+                for i in self.cells.get((cx, cy), ()):
+                    distance_sq = (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2
+                    if distance_sq < best_sq or (distance_sq == best_sq and i < best):
+                        best, best_sq = i, distance_sq
+
+        return best, math.sqrt(best_sq)
+
+    @staticmethod
+    def _ring(cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+
+class CellIndex:
+    """Cell-sorted point arrays for vectorized neighbour queries over many query points"""
+
+    OFFSET = 1 << 20  # cell coordinates are shifted to be non-negative
+
+    def __init__(self, xs, ys, cell_size=32):
+        self.cell_size = cell_size
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        keys = self.keys_for(self.xs, self.ys)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        if len(self.xs):
+            self.bounds = (self.xs.min(), self.ys.min(), self.xs.max(), self.ys.max())
+        else:
+            self.bounds = None
+
+    def __len__(self):
+        return len(self.xs)
+
+    def cells(self, xs, ys):
+        return (
+            np.floor(np.asarray(xs, dtype=np.float64) / self.cell_size).astype(np.int64),
+            np.floor(np.asarray(ys, dtype=np.float64) / self.cell_size).astype(np.int64),
+        )
+
+    def cell_keys(self, cell_x, cell_y):
+        return (cell_x + self.OFFSET) * (2 * self.OFFSET) + (cell_y + self.OFFSET)
+
+    def keys_for(self, xs, ys):
+        return self.cell_keys(*self.cells(xs, ys))
+
+    def candidate_pairs(self, qx, qy, reach=1):
+        """Return (query index, point index) for every point in the cells within reach of each query"""
+        cell_x, cell_y = self.cells(qx, qy)
+        query_parts, point_parts = [], []
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                keys = self.cell_keys(cell_x + dx, cell_y + dy)
+                queries, points = self._expand(keys)
+                query_parts.append(queries)
+                point_parts.append(points)
+        if not query_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(query_parts), np.concatenate(point_parts)
+
+    def self_pairs(self, reach=1):
+        """Return each unordered pair of indexed points in the same or nearby cells exactly once
+
+        Works per occupied cell rather than per point: neighbouring cells are
+        looked up with sorted searches over the distinct cell keys, and only
+        the forward half of the neighbourhood is visited.
+        """
+        cell_keys, starts, counts = np.unique(self.keys, return_index=True, return_counts=True)
+        cell_of = np.repeat(np.arange(len(cell_keys)), counts)
+        positions = np.arange(len(self.keys))
+
+        # Same cell: every later point in the cell
+        ends = (starts + counts)[cell_of]
+        first_parts = [np.repeat(positions, ends - positions - 1)]
+        second_parts = [self._ranges(positions + 1, ends - positions - 1)]
+
+        # Neighbouring cells, forward half only; cell keys are linear in (cx, cy)
+        for dx in range(0, reach + 1):
+            for dy in range(-reach, reach + 1):
+                if dx == 0 and dy <= 0:
+                    continue
+                wanted = cell_keys + dx * (2 * self.OFFSET) + dy
+                found = np.searchsorted(cell_keys, wanted)
+                found = np.minimum(found, len(cell_keys) - 1)
+                hit = cell_keys[found] == wanted
+                lo = np.where(hit, starts[found], 0)[cell_of]
+                count = np.where(hit, counts[found], 0)[cell_of]
+                first_parts.append(np.repeat(positions, count))
+                second_parts.append(self._ranges(lo, count))
+
+        first = np.concatenate(first_parts)
+        second = np.concatenate(second_parts)
+        return self.order[first], self.order[second]
+
+    @staticmethod
+    def _ranges(starts, counts):
+        """Concatenate arange(start, start + count) for every (start, count)"""
+        total = int(counts.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+    def cells_in_box(self, min_x, min_y, max_x, max_y):
+        """Return indices of points whose cells overlap the box (a superset of the points inside it)"""
+        min_cx, min_cy = self.cells(min_x, min_y)
+        max_cx, max_cy = self.cells(max_x, max_y)
+        parts = []
+        for cx in range(int(min_cx), int(max_cx) + 1):
+            lo = np.searchsorted(self.keys, self.cell_keys(cx, min_cy), side='left')
+            hi = np.searchsorted(self.keys, self.cell_keys(cx, max_cy), side='right')
+            parts.append(self.order[lo:hi])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def in_box(self, min_x, min_y, max_x, max_y):
+        """Return the sorted indices of points inside the box, edges included"""
+        if self.bounds is None:
+            return np.empty(0, dtype=np.int64)
+        # Clamp to the points' extent so a huge box costs no more than the whole index
+        min_x, min_y = max(min_x, self.bounds[0]), max(min_y, self.bounds[1])
+        max_x, max_y = min(max_x, self.bounds[2]), min(max_y, self.bounds[3])
+        if min_x > max_x or min_y > max_y:
+            return np.empty(0, dtype=np.int64)
+        candidates = self.cells_in_box(min_x, min_y, max_x, max_y)
+        x, y = self.xs[candidates], self.ys[candidates]
+        inside = (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+        return np.sort(candidates[inside])
+
+    def _expand(self, keys):
+        lo = np.searchsorted(self.keys, keys, side='left')
+        hi = np.searchsorted(self.keys, keys, side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        queries = np.repeat(np.arange(len(keys)), counts)
+        return queries, self.order[self._ranges(lo, counts)]
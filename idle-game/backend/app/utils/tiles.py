@@ -0,0 +1,251 @@
+# app/utils/tiles.py
+import hashlib
+import math
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from app.metrics import metrics
+
+TILE_RENDER_SECONDS = metrics.histogram(
+    'tile_render_seconds', 'Time to rasterize and encode one map tile', ('zoom',)
+)
+TILE_REQUESTS = metrics.counter(
+    'tile_requests_total', 'Map tiles served, by whether they were already rendered', ('result',)
+)
+
+TILE_SIZE = 256
+MIN_ZOOM = 0
+MAX_ZOOM = 3
+NATIVE_ZOOM = 2  # one tile pixel per map pixel; each zoom level doubles the scale
+
+# Drawing rules of the client's map renderer (Map.jsx)
+BUILDING_BORDER = '#654321'
+TREE_BORDER = '#006400'
+PATH_WIDTH = 8
+DEFAULT_COLORS = {'buildings': '#8B4513', 'trees': '#228B22', 'lines': '#FFD700'}
+
+
+def parse_color(color, default):
+    """'#rrggbb' as an opaque RGBA tuple, falling back to default"""
+    for value in (color, default):
+        if isinstance(value, str) and len(value) == 7 and value.startswith('#'):
+            try:
+                return tuple(bytes.fromhex(value[1:])) + (255,)
+            except ValueError:
+                pass
+    raise ValueError(f'Invalid color: {default}')
+
+
+def encode_png(pixels):
+    """Encode an (height, width, 4) uint8 RGBA array as a PNG
+
+    Rows use the Up filter, which turns the long vertical runs of flat map
+    shapes into zeros for zlib.
+    """
+    height, width, channels = pixels.shape
+    rows = pixels.reshape(height, width * channels)
+    raw = np.empty((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 0] = 2  # Up
+    raw[0, 1:] = rows[0]
+    raw[1:, 1:] = rows[1:] - rows[:-1]
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', header)
+        + chunk(b'IDAT', zlib.compress(raw.tobytes(), 9))
+        + chunk(b'IEND', b'')
+    )
+
+
+class MapLayer:
+    """The static part of a map (buildings, trees, path lines) rendered into PNG tiles
+
+    Tiles are TILE_SIZE pixels square, addressed by (zoom, x, y) from the
+    map's top-left corner. A tile is rendered the first time it is asked
+    for, with supersample x supersample samples per pixel, and its PNG is
+    kept. Rendering only visits the shapes overlapping the tile.
+    """
+
+    def __init__(self, width, height, buildings, trees, lines, supersample=2, maxsize=4096):
+        self.width = width
+        self.height = height
+        self.supersample = supersample
+        self.maxsize = maxsize
+
+        self.buildings = np.array(
+            [[b['x'], b['y'], b['width'], b['height']] for b in buildings], dtype=np.float64
+        ).reshape(-1, 4)
+        self.trees = np.array([[t['x'], t['y'], t['size']] for t in trees], dtype=np.float64).reshape(-1, 3)
+        self.lines = np.array(
+            [[ln['x1'], ln['y1'], ln['x2'], ln['y2']] for ln in lines], dtype=np.float64
+        ).reshape(-1, 4)
+        self.building_colors = [parse_color(b.get('color'), DEFAULT_COLORS['buildings']) for b in buildings]
+        self.tree_colors = [parse_color(t.get('color'), DEFAULT_COLORS['trees']) for t in trees]
+        self.line_colors = [parse_color(ln.get('color'), DEFAULT_COLORS['lines']) for ln in lines]
+
+        # Bounding boxes including strokes, to pick the shapes a tile overlaps
+        half = PATH_WIDTH / 2
+        self.building_boxes = np.concatenate(
+            [self.buildings[:, :2] - 1, self.buildings[:, :2] + self.buildings[:, 2:] + 1], axis=1
+        )
+        self.tree_boxes = np.concatenate(
+            [self.trees[:, :2] - self.trees[:, 2:] - 1, self.trees[:, :2] + self.trees[:, 2:] + 1], axis=1
+        )
+        self.line_boxes = np.concatenate(
+            [np.minimum(self.lines[:, :2], self.lines[:, 2:]) - half,
+             np.maximum(self.lines[:, :2], self.lines[:, 2:]) + half], axis=1
+        )
+
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scale(zoom):
+        return 2.0 ** (zoom - NATIVE_ZOOM)
+
+    def grid_size(self, zoom):
+        """(columns, rows) of tiles covering the map at a zoom level"""
+        span = TILE_SIZE / self.scale(zoom)
+        return max(1, math.ceil(self.width / span)), max(1, math.ceil(self.height / span))
+
+    def has_tile(self, zoom, x, y):
+        if not MIN_ZOOM <= zoom <= MAX_ZOOM:
+            return False
+        columns, rows = self.grid_size(zoom)
+        return 0 <= x < columns and 0 <= y < rows
+
+    def tile(self, zoom, x, y):
+        """(png, etag) of a tile, rendering it on first use; None outside the map"""
+        if not self.has_tile(zoom, x, y):
+            return None
+        key = (zoom, x, y)
+        with self._lock:
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+        if cached is not None:
+            TILE_REQUESTS.inc('hit')
+            return cached
+
+        TILE_REQUESTS.inc('miss')
+        with TILE_RENDER_SECONDS.time(str(zoom)):
+            png = encode_png(self.render(zoom, x, y))
+        cached = (png, hashlib.sha256(png).hexdigest()[:32])
+        with self._lock:
+            self._tiles[key] = cached
+            while len(self._tiles) > self.maxsize:
+                self._tiles.popitem(last=False)
+        return cached
+
+    def render(self, zoom, x, y):
+        """Rasterize one tile as a (TILE_SIZE, TILE_SIZE, 4) uint8 RGBA array"""
+        samples = TILE_SIZE * self.supersample
+        scale = self.scale(zoom) * self.supersample  # samples per map pixel
+        span = TILE_SIZE / self.scale(zoom)
+        canvas = _Canvas(samples, scale, x * span, y * span)
+        box = (x * span, y * span, (x + 1) * span, (y + 1) * span)
+
+        # Same order as the client: buildings, then trees, then paths on top
+        building_border = parse_color(BUILDING_BORDER, None)
+        tree_border = parse_color(TREE_BORDER, None)
+        for i in _overlapping(self.building_boxes, box):
+            bx, by, bw, bh = self.buildings[i]
+            canvas.fill_rect(bx - 1, by - 1, bx + bw + 1, by + bh + 1, building_border)
+            canvas.fill_rect(bx + 1, by + 1, bx + bw - 1, by + bh - 1, self.building_colors[i])
+        for i in _overlapping(self.tree_boxes, box):
+            canvas.fill_triangle(*self.trees[i], self.tree_colors[i], tree_border)
+        for i in _overlapping(self.line_boxes, box):
+            canvas.stroke_line(*self.lines[i], PATH_WIDTH, self.line_colors[i])
+
+        return canvas.resolve(self.supersample)
+
+
+def _overlapping(boxes, box):
+    min_x, min_y, max_x, max_y = box
+    return np.flatnonzero(
+        (boxes[:, 0] < max_x) & (boxes[:, 2] > min_x) & (boxes[:, 1] < max_y) & (boxes[:, 3] > min_y)
+    ).tolist()
+
+
+class _Canvas:
+    """Square RGBA sample buffer over a window of map coordinates"""
+
+    def __init__(self, size, scale, origin_x, origin_y):
+        self.size = size
+        self.scale = scale
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.pixels = np.zeros((size, size, 4), dtype=np.uint8)
+
+    def _span(self, low, high, origin):
+        """Sample indices whose centres lie in [low, high)"""
+        start = math.ceil((low - origin) * self.scale - 0.5)
+        stop = math.ceil((high - origin) * self.scale - 0.5)
+        return max(0, start), min(self.size, stop)
+
+    def _centres(self, start, stop, origin):
+        return origin + (np.arange(start, stop) + 0.5) / self.scale
+
+    def fill_rect(self, x0, y0, x1, y1, color):
+        cols = self._span(x0, x1, self.origin_x)
+        rows = self._span(y0, y1, self.origin_y)
+        if cols[0] < cols[1] and rows[0] < rows[1]:
+            self.pixels[rows[0]:rows[1], cols[0]:cols[1]] = color
+
+    def fill_triangle(self, x, y, size, color, border):
+        """The client's tree: apex above the centre, base below it, with a 1 px outline"""
+        cols = self._span(x - size - 1, x + size + 1, self.origin_x)
+        rows = self._span(y - size - 1, y + size + 1, self.origin_y)
+        if cols[0] >= cols[1] or rows[0] >= rows[1]:
+            return
+        px = self._centres(*cols, self.origin_x)[None, :]
+        py = self._centres(*rows, self.origin_y)[:, None]
+
+        # Signed distance inside each edge; the slanted edges have slope 2
+        slant = math.sqrt(5)
+        inside = np.minimum(
+            np.minimum((2 * (px - (x - size)) - (y + size - py)) / slant,
+                       (2 * ((x + size) - px) - (y + size - py)) / slant),
+            (y + size) - py,
+        )
+        region = self.pixels[rows[0]:rows[1], cols[0]:cols[1]]
+        region[inside > 0.5] = color
+        region[np.abs(inside) <= 0.5] = border
+
+    def stroke_line(self, x1, y1, x2, y2, width, color):
+        """A segment with butt caps, as a canvas stroke draws it"""
+        half = width / 2
+        cols = self._span(min(x1, x2) - half, max(x1, x2) + half, self.origin_x)
+        rows = self._span(min(y1, y2) - half, max(y1, y2) + half, self.origin_y)
+        length = math.hypot(x2 - x1, y2 - y1)
+        if cols[0] >= cols[1] or rows[0] >= rows[1] or length == 0:
+            return
+        ux, uy = (x2 - x1) / length, (y2 - y1) / length
+        px = self._centres(*cols, self.origin_x)[None, :] - x1
+        py = self._centres(*rows, self.origin_y)[:, None] - y1
+        along = px * ux + py * uy
+        across = np.abs(py * ux - px * uy)
+        mask = (along >= 0) & (along <= length) & (across <= half)
+        self.pixels[rows[0]:rows[1], cols[0]:cols[1]][mask] = color
+
+    def resolve(self, factor):
+        """Average factor x factor blocks of samples into pixels"""
+        if factor == 1:
+            return self.pixels
+        size = self.size // factor
+        blocks = self.pixels.reshape(size, factor, size, factor, 4).astype(np.float32)
+        alpha = blocks[..., 3:]
+        # Average colour weighted by coverage, so edges do not darken towards transparent black
+        coverage = alpha.sum(axis=(1, 3))
+        color = (blocks[..., :3] * alpha).sum(axis=(1, 3))
+        color = np.divide(color, coverage, out=np.zeros_like(color), where=coverage > 0)
+        opacity = coverage / (factor * factor)
+        return np.rint(np.concatenate([color, opacity], axis=2)).astype(np.uint8)
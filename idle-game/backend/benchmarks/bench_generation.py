@@ -0,0 +1,74 @@
+# benchmarks/bench_generation.py - map generation time across map sizes
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.generator import MapGenerator  # noqa: E402
+
+MAP_SIZES = ((800, 600), (1600, 1200), (3200, 2400), (8000, 6000))
+# The quadratic reference is only run where it finishes in reasonable time
+REFERENCE_LIMIT = 20_000
+
+
+def quadratic_dedup(points):
+    """The nested-loop deduplication generate_path_points used to run"""
+    unique_points = []
+    for point in points:
+        is_duplicate = False
+        for existing in unique_points:
+            if (
+                abs(point["x"] - existing["x"]) < 10
+                and abs(point["y"] - existing["y"]) < 10
+            ):
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            unique_points.append(point)
+    return unique_points
+
+
+def raw_points(generator, lines):
+    """Candidate points before deduplication, as generate_path_points builds them"""
+    original = generator.deduplicate_points
+    generator.deduplicate_points = lambda points, min_distance=10: points
+    try:
+        return generator.generate_path_points(lines)
+    finally:
+        generator.deduplicate_points = original
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def main():
+    random.seed(0)
+    print(f"{'map size':>11}  {'candidates':>10}  {'kept':>7}  {'dedup':>10}  "
+          f"{'quadratic':>10}  {'generate_map':>12}")
+    for width, height in MAP_SIZES:
+        generator = MapGenerator(width, height)
+        buildings = generator.generate_buildings()
+        trees = generator.generate_trees(buildings)
+        lines = generator.generate_paths(buildings, trees)["lines"]
+        candidates = raw_points(generator, lines)
+
+        kept, dedup_time = timed(lambda: generator.deduplicate_points(candidates))
+        if len(candidates) <= REFERENCE_LIMIT:
+            reference, reference_time = timed(lambda: quadratic_dedup(candidates))
+            assert reference == kept, "grid deduplication diverged from the reference"
+            reference_label = f"{reference_time * 1000:>7.1f} ms"
+        else:
+            reference_label = f"{'skipped':>10}"
+
+        _, generate_time = timed(generator.generate_map)
+        print(f"{width:>5}x{height:<5}  {len(candidates):>10}  {len(kept):>7}  "
+              f"{dedup_time * 1000:>7.1f} ms  {reference_label}  {generate_time * 1000:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
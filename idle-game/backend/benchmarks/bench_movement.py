@@ -0,0 +1,79 @@
+# benchmarks/bench_movement.py - per-object update loop vs. vectorized kernel
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Character  # noqa: E402
+from app.utils.movement import CharacterStore, advance, points_to_array  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+TICKS = 20
+
+
+def make_points(count=400, width=800, height=600):
+    rng = random.Random(0)
+    return [{'x': rng.randint(0, width), 'y': rng.randint(0, height)} for _ in range(count)]
+
+
+def object_loop(characters, points):
+    """The movement loop update_characters used to run on ORM objects"""
+    for char in characters:
+        dx = char.target_x - char.x
+        dy = char.target_y - char.y
+        distance = (dx**2 + dy**2)**0.5
+
+        if distance > char.speed:
+            char.x += (dx / distance) * char.speed
+            char.y += (dy / distance) * char.speed
+        else:
+            char.x = char.target_x
+            char.y = char.target_y
+            new_target = random.choice(points)
+            char.target_x = new_target['x']
+            char.target_y = new_target['y']
+
+
+def bench(size, points):
+    start_points = [random.choice(points) for _ in range(size)]
+    target_points = [random.choice(points) for _ in range(size)]
+
+    characters = [
+        Character(name=f'c{i}', role='Worker', x=s['x'], y=s['y'],
+                  target_x=t['x'], target_y=t['y'], speed=2.0)
+        for i, (s, t) in enumerate(zip(start_points, target_points))
+    ]
+    started = time.perf_counter()
+    for _ in range(TICKS):
+        object_loop(characters, points)
+    loop_time = (time.perf_counter() - started) / TICKS
+
+    store = CharacterStore(capacity=size)
+    for i, (s, t) in enumerate(zip(start_points, target_points)):
+        store.add(i, s['x'], s['y'], t['x'], t['y'], 2.0)
+    point_array = points_to_array(points)
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    for _ in range(TICKS):
+        advance(store, point_array, rng)
+    kernel_time = (time.perf_counter() - started) / TICKS
+
+    return loop_time, kernel_time
+
+
+def main():
+    random.seed(0)
+    points = make_points()
+    print(f"{'characters':>10}  {'object loop':>12}  {'kernel':>10}  {'speedup':>8}")
+    for size in SIZES:
+        loop_time, kernel_time = bench(size, points)
+        print(f"{size:>10}  {loop_time * 1000:>9.2f} ms  {kernel_time * 1000:>7.3f} ms  "
+              f"{loop_time / kernel_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
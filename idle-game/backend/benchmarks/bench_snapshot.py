@@ -0,0 +1,76 @@
+# benchmarks/bench_snapshot.py - JSON vs. binary snapshot size and encode time
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.binary import encode_characters, encode_map  # noqa: E402
+from app.utils.generator import MapGenerator  # noqa: E402
+
+CHARACTER_COUNTS = (1_000, 10_000, 100_000)
+MAP_SIZES = ((800, 600), (1600, 1200), (3200, 2400))
+
+
+def timed(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def make_map(width, height):
+    generator = MapGenerator(width, height)
+    buildings = generator.generate_buildings()
+    trees = generator.generate_trees(buildings)
+    paths = generator.generate_paths(buildings, trees)
+    return {'id': 1, 'width': width, 'height': height,
+            'buildings': buildings, 'trees': trees, 'paths': paths}
+
+
+def make_characters(count):
+    rng = random.Random(0)
+    return [
+        {
+            'id': i + 1,
+            'name': f'Character{i}',
+            'role': rng.choice(['Worker', 'Farmer', 'Miner']),
+            'x': rng.uniform(0, 800),
+            'y': rng.uniform(0, 600),
+            'target_x': rng.uniform(0, 800),
+            'target_y': rng.uniform(0, 600),
+            'speed': 2.0,
+            'color': f'#{rng.randint(0, 0xFFFFFF):06x}',
+            'map_id': 1,
+        }
+        for i in range(count)
+    ]
+
+
+def report(label, payload, encode_json, encode_binary):
+    json_body, json_time = timed(lambda: encode_json(payload).encode('utf-8'))
+    binary_body, binary_time = timed(lambda: encode_binary(payload))
+    print(f"{label:<18} "
+          f"{len(json_body) / 1024:>9.1f} KB {len(gzip.compress(json_body)) / 1024:>8.1f} KB "
+          f"{json_time * 1000:>8.2f} ms   "
+          f"{len(binary_body) / 1024:>9.1f} KB {len(gzip.compress(binary_body)) / 1024:>8.1f} KB "
+          f"{binary_time * 1000:>8.2f} ms")
+
+
+def main():
+    random.seed(0)
+    print(f"{'payload':<18} {'json':>12} {'gzipped':>11} {'encode':>11}   "
+          f"{'binary':>12} {'gzipped':>11} {'encode':>11}")
+    for width, height in MAP_SIZES:
+        report(f'map {width}x{height}', make_map(width, height), json.dumps, encode_map)
+    for count in CHARACTER_COUNTS:
+        report(f'{count} characters', make_characters(count), json.dumps, encode_characters)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+# benchmarks/harness.py - reproducible benchmark suite with latency percentiles and JSON results
+#
+#   python benchmarks/harness.py --output results.json
+#   python benchmarks/harness.py --quick --compare results.json
+#
+# Runs in-process against SQLite, so no MySQL server or running backend is needed.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Point the app at throwaway stores before config is imported
+WORKDIR = tempfile.mkdtemp(prefix='idle-bench-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+os.environ['SHARD_BROKER_PATH'] = os.path.join(WORKDIR, 'shards.db')
+os.environ['JOBS_STORE_PATH'] = os.path.join(WORKDIR, 'jobs.db')
+os.environ['MAP_POOL_SIZE'] = '0'
+
+from app import create_app, db  # noqa: E402
+from app.map_cache import map_cache  # noqa: E402
+from app.models import GameMap  # noqa: E402
+from app.simulation import SimulationEngine  # noqa: E402
+from app.utils.flowfield import flow_cache  # noqa: E402
+from app.utils.generator import MapGenerator, pack_grid  # noqa: E402
+from app.utils.pathfinding import route_cache  # noqa: E402
+
+MAP_SIZES = ((800, 600), (1600, 1200), (3200, 2400))
+TICK_SIZES = (1_000, 10_000)
+# Metrics where a higher number is better; for the rest lower is better
+HIGHER_IS_BETTER = ('throughput',)
+
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles (ms) and throughput (ops/s) for a list of durations in seconds"""
+    samples = np.asarray(samples, dtype=np.float64)
+    elapsed = float(samples.sum()) if elapsed is None else elapsed
+    p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1000
+    return {
+        'count': int(len(samples)),
+        'throughput': len(samples) / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': float(samples.mean() * 1000),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(samples.max() * 1000),
+    }
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def seed_map(app, seed, width=800, height=600):
+    """Store a reproducible map with buildings, trees and paths, and return it compiled
+
+    generate_map can fall back to an empty map, so the pieces are generated
+    directly for a stable workload.
+    """
+    generator = MapGenerator(width, height, seed=seed)
+    buildings = generator.generate_buildings()
+    trees = generator.generate_trees(buildings)
+    grid = generator.create_grid(buildings, trees)
+    paths = generator.generate_paths(buildings, trees, grid)
+    with app.app_context():
+        game_map = GameMap.create({
+            'width': width, 'height': height, 'seed': seed,
+            'buildings': buildings, 'trees': trees, 'paths': paths, 'grid': pack_grid(grid),
+        })
+        db.session.commit()
+        app.extensions['shards'].broker.set_default_map(game_map.id)
+        return map_cache.set_current(game_map)
+
+
+def bench_generation(quick):
+    results = {}
+    for width, height in MAP_SIZES[:2] if quick else MAP_SIZES:
+        seeds = iter(range(1000))
+        results[f'generate_map/{width}x{height}'] = measure(
+            lambda: MapGenerator(width, height, seed=next(seeds)).generate_map(), 3 if quick else 10
+        )
+    return results
+
+
+def bench_pathfinder(compiled, quick):
+    pathfinder = compiled.pathfinder
+    rng = random.Random(0)
+    count = 200 if quick else 1000
+    points = [(rng.uniform(0, compiled.width), rng.uniform(0, compiled.height)) for _ in range(count)]
+    goals = compiled.points[:40] or [{'x': 10, 'y': 10}]
+    queries = iter(points * 2)
+
+    results = {
+        'pathfinder/is_valid_position': measure(
+            lambda: pathfinder.is_valid_position(*next(queries)), count
+        ),
+        'pathfinder/nearest_path_point': measure(
+            lambda: pathfinder.find_nearest_path_point(*next(queries)), count
+        ),
+    }
+
+    xs = np.array([p[0] for p in points * 10])
+    ys = np.array([p[1] for p in points * 10])
+    results[f'pathfinder/valid_positions[{len(xs)}]'] = measure(
+        lambda: pathfinder.valid_positions(xs, ys), 20
+    )
+
+    route_cache.clear()
+    flow_cache.clear()
+    routes = iter([(x, y, goal['x'], goal['y']) for (x, y), goal in zip(points, goals * count)])
+    results['pathfinder/find_route_cold'] = measure(
+        lambda: pathfinder.find_route(*next(routes)), count
+    )
+    routes = iter([(x, y, goal['x'], goal['y']) for (x, y), goal in zip(points, goals * count)])
+    results['pathfinder/find_route_warm'] = measure(
+        lambda: pathfinder.find_route(*next(routes)), count
+    )
+    return results
+
+
+def bench_tick(app, compiled, quick):
+    results = {}
+    rng = np.random.default_rng(0)
+    for size in TICK_SIZES[:1] if quick else TICK_SIZES:
+        engine = SimulationEngine(app, map_id=compiled.id)
+        engine.load_map(compiled)
+        spawn = compiled.point_array[rng.integers(len(compiled.point_array), size=size)]
+        engine.add_characters([
+            {'id': i, 'name': f'b{i}', 'role': 'Worker', 'color': '#3498db', 'map_id': compiled.id,
+             'x': x, 'y': y, 'target_x': x, 'target_y': y, 'speed': 2.0}
+            for i, (x, y) in enumerate(spawn.tolist())
+        ], plan_route=False)
+        for _ in range(5):
+            engine.step()  # warm the route and flow-field caches
+        results[f'tick/{size}'] = measure(engine.step, 20 if quick else 100)
+    return results
+
+
+def bench_endpoints(app, compiled, clients, duration):
+    """Simulated polling clients, each on its own thread and test client"""
+    app.test_client().post('/api/characters/batch', json=[{'name': f'c{i}'} for i in range(200)])
+    valid = [p for p in compiled.points if compiled.pathfinder.is_valid_position(p['x'], p['y'])]
+    etag = app.test_client().get('/api/map', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    character_ids = [char['id'] for char in app.test_client().get('/api/characters').get_json()]
+
+    def move(client, rng):
+        point = rng.choice(valid)
+        return client.post(f'/api/characters/{rng.choice(character_ids)}/move',
+                           json={'target_x': point['x'], 'target_y': point['y']})
+
+    requests = {
+        'GET /api/characters': lambda client, rng: client.get('/api/characters'),
+        'GET /api/characters (viewport)': lambda client, rng: client.get('/api/characters', query_string={
+            'x': rng.uniform(0, compiled.width - 400), 'y': rng.uniform(0, compiled.height - 300),
+            'width': 400, 'height': 300, 'margin': 50,
+        }),
+        'GET /api/map': lambda client, rng: client.get('/api/map', headers={'Accept-Encoding': 'gzip'}),
+        'GET /api/map (304)': lambda client, rng: client.get(
+            '/api/map', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}
+        ),
+        'POST /api/characters/<id>/move': move,
+    }
+    # Polling clients mostly read; a few issue move orders
+    weights = (0.25, 0.25, 0.1, 0.3, 0.1)
+    samples = {name: [] for name in requests}
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client_loop(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        names = list(requests)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            response = requests[name](client, rng)
+            samples[name].append(time.perf_counter() - started)
+            if response.status_code not in (200, 304):
+                errors.append((name, response.status_code))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {
+        f'endpoint/{name}': summarize(values, elapsed) for name, values in samples.items() if values
+    }
+    every = [value for values in samples.values() for value in values]
+    results[f'endpoint/all[{clients} clients]'] = summarize(every, elapsed)
+    results[f'endpoint/all[{clients} clients]']['errors'] = len(errors)
+    return results
+
+
+def check_endpoints(app, compiled):
+    """The functional checks of tests/test_backend.py, as pass/fail results for the report"""
+    client = app.test_client()
+    checks = {}
+    checks['map'] = client.get('/api/map').status_code == 200
+    created = client.post('/api/characters', json={'name': 'Check', 'role': 'Tester'})
+    checks['create character'] = created.status_code == 200
+    character = created.get_json()
+
+    point = next(
+        p for p in compiled.points if compiled.pathfinder.is_valid_position(p['x'], p['y'])
+    )
+    moved = client.post(f"/api/characters/{character['id']}/move",
+                        json={'target_x': point['x'], 'target_y': point['y']})
+    checks['move to a path point'] = moved.status_code == 200
+
+    if compiled.buildings:
+        building = compiled.buildings[0]
+        blocked = client.post(f"/api/characters/{character['id']}/move", json={
+            'target_x': building['x'] + building['width'] // 2,
+            'target_y': building['y'] + building['height'] // 2,
+        })
+        checks['move into a building is refused'] = blocked.status_code == 400
+
+    checks['update'] = client.post('/api/characters/update').status_code == 200
+    return checks
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print metrics that moved by more than threshold; return the regressions"""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'throughput'):
+            old, new = before.get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if abs(change) > threshold:
+                label = 'REGRESSION' if worse > 0 else 'improved'
+                print(f'  {label:>10}  {name} {metric}: {old:.3f} -> {new:.3f} ({change:+.0%})')
+                if worse > 0:
+                    regressions.append((name, metric))
+    return regressions
+
+
+def print_table(results):
+    print(f"{'benchmark':<48} {'count':>7} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:<48} {stats['count']:>7} {stats['throughput']:>10.1f} "
+              f"{stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the backend benchmark suite')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative change reported as a regression (default 0.2)')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes and fewer repeats')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent polling clients')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of endpoint load')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.logger.setLevel('WARNING')
+    with app.app_context():
+        db.create_all()
+    compiled = seed_map(app, seed=1)
+
+    results = {}
+    results.update(bench_generation(args.quick))
+    results.update(bench_pathfinder(compiled, args.quick))
+    results.update(bench_tick(app, compiled, args.quick))
+    checks = check_endpoints(app, compiled)
+    results.update(bench_endpoints(
+        app, compiled, args.clients, args.duration / 2 if args.quick else args.duration
+    ))
+    app.extensions['shards'].shutdown()
+
+    print_table(results)
+    for name, passed in checks.items():
+        print(f"  {'pass' if passed else 'FAIL'}  {name}")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'quick': args.quick,
+            'clients': args.clients,
+        },
+        'checks': checks,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = not all(checks.values())
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline['meta'].get('commit')}:")
+        failed |= bool(compare(results, baseline['results'], args.threshold))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 # backend/config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,13 +14,68 @@ class Config:
     MYSQL_PORT = os.environ.get('MYSQL_PORT') or '3306'
     MYSQL_DB = os.environ.get('MYSQL_DB') or 'idle_game'
 
-    SQLALCHEMY_DATABASE_URI = (
+    # DATABASE_URL overrides the MySQL settings (e.g. sqlite:///idle.db for local runs)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or (
         f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
+    # Server-side simulation: ticks per second, seconds between write-behind DB flushes,
+    # and the longest a changed position may wait to be written (e.g. while retrying)
+    SIMULATION_TICK_RATE = float(os.environ.get('SIMULATION_TICK_RATE', 10))
+    SIMULATION_PERSIST_INTERVAL = float(os.environ.get('SIMULATION_PERSIST_INTERVAL', 5))
+    SIMULATION_MAX_STALENESS = float(os.environ.get('SIMULATION_MAX_STALENESS', 30))
+    # Radius in pixels characters keep from each other (0 lets them overlap)
+    SIMULATION_CROWD_RADIUS = float(os.environ.get('SIMULATION_CROWD_RADIUS', 15))
+
+    # Pre-generated maps kept ready for /api/map/new, and the processes generating them
+    MAP_POOL_SIZE = int(os.environ.get('MAP_POOL_SIZE', 2))
+    MAP_POOL_WORKERS = int(os.environ.get('MAP_POOL_WORKERS', 1))
+    # Largest map area (px²) /api/map/new generates within the request; larger ones run as a job
+    MAP_INLINE_MAX_AREA = int(os.environ.get('MAP_INLINE_MAX_AREA', 1600 * 1200))
+
+    # Maps compiled and warmed before gunicorn forks its workers (0 disables the preload),
+    # and the highest zoom level of map tiles rendered for them (-1 renders none)
+    MAP_PRELOAD_COUNT = int(os.environ.get('MAP_PRELOAD_COUNT', 4))
+    MAP_PRELOAD_TILE_ZOOM = int(os.environ.get('MAP_PRELOAD_TILE_ZOOM', 2))
+
+    # Chunked world: seed, chunk edge in pixels (multiple of 80) and idle seconds before eviction
+    WORLD_SEED = int(os.environ.get('WORLD_SEED', 0))
+    WORLD_CHUNK_SIZE = int(os.environ.get('WORLD_CHUNK_SIZE', 640))
+    WORLD_CHUNK_TTL = float(os.environ.get('WORLD_CHUNK_TTL', 60))
+    WORLD_MAX_CHUNKS = int(os.environ.get('WORLD_MAX_CHUNKS', 1024))
+
+    # Multiple worlds across worker processes: the SQLite file standing in for a broker,
+    # seconds a worker keeps a world without renewing its lease, and seconds between
+    # the snapshots an owner publishes while other workers read them (and checks for their commands)
+    SHARD_BROKER_PATH = os.environ.get(
+        'SHARD_BROKER_PATH', os.path.join(tempfile.gettempdir(), 'idle-game-shards.db')
+    )
+    SHARD_LEASE_TTL = float(os.environ.get('SHARD_LEASE_TTL', 10))
+    SHARD_PUBLISH_INTERVAL = float(os.environ.get('SHARD_PUBLISH_INTERVAL', 0.2))
+
+    # Background jobs: the SQLite file holding their records and progress, job processes
+    # per web worker, most jobs queued or running at once, and seconds without progress
+    # after which a job counts as lost
+    JOBS_STORE_PATH = os.environ.get(
+        'JOBS_STORE_PATH', os.path.join(tempfile.gettempdir(), 'idle-game-jobs.db')
+    )
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 1))
+    JOBS_MAX_ACTIVE = int(os.environ.get('JOBS_MAX_ACTIVE', 16))
+    JOBS_TIMEOUT = float(os.environ.get('JOBS_TIMEOUT', 300))
+
+    # Server-Sent Event streams one worker serves at once; each holds a worker thread
+    # (gunicorn.conf.py gives every worker GUNICORN_THREADS of them)
+    STREAM_MAX_PER_WORKER = int(os.environ.get('STREAM_MAX_PER_WORKER', 8))
+
+    # Seconds between stack samples of the profiler served at /metrics/profile (0 disables it)
+    METRICS_PROFILE_INTERVAL = float(os.environ.get('METRICS_PROFILE_INTERVAL', 0))
+
+    # Largest number of characters or move orders accepted by one batch request
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 1000))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_ECHO = True
@@ -0,0 +1,22 @@
+# backend/gunicorn.conf.py
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# Load the app once in the master so the maps it preloads are shared by every worker,
+# including the ones started later to replace a recycled worker
+preload_app = True
+
+
+def on_starting(server):
+    if server.cfg.preload_app:
+        from app.preload import preload
+        preload(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    # Each worker keeps its own pool of pre-generated maps; fill it before the first request
+    server.app.wsgi().extensions['map_pool'].start()
@@ -0,0 +1,60 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Point the app at throwaway stores before config is imported
+WORKDIR = tempfile.mkdtemp(prefix='idle-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ['SHARD_BROKER_PATH'] = os.path.join(WORKDIR, 'shards.db')
+os.environ['JOBS_STORE_PATH'] = os.path.join(WORKDIR, 'jobs.db')
+os.environ['MAP_POOL_SIZE'] = '0'
+
+from app import create_app, db  # noqa: E402
+from app.routes import save_map  # noqa: E402
+from app.utils.generator import MapGenerator, pack_grid  # noqa: E402
+
+
+def generate(width=800, height=600, seed=1):
+    """A reproducible map dict with buildings, trees and paths
+
+    generate_map can fall back to an empty map, so the pieces are generated
+    directly, as the benchmark harness does.
+    """
+    generator = MapGenerator(width, height, seed=seed)
+    buildings = generator.generate_buildings()
+    trees = generator.generate_trees(buildings)
+    grid = generator.create_grid(buildings, trees)
+    return {
+        'width': width, 'height': height, 'seed': seed,
+        'buildings': buildings, 'trees': trees,
+        'paths': generator.generate_paths(buildings, trees, grid),
+        'grid': pack_grid(grid),
+    }
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    yield app
+    app.extensions['shards'].shutdown()
+    app.extensions['jobs'].shutdown()
+
+
+@pytest.fixture(scope='session')
+def world(app):
+    """The default world's compiled map"""
+    with app.app_context():
+        return save_map(generate())
+
+
+@pytest.fixture
+def client(app, world):
+    return app.test_client()
@@ -0,0 +1,78 @@
+# tests/test_backend.py - Backend API tests
+import pytest
+
+
+@pytest.fixture
+def characters(client):
+    """Create test characters"""
+    test_characters = [
+        {"name": "TestWorker", "role": "Worker", "color": "#3498db"},
+        {"name": "TestFarmer", "role": "Farmer", "color": "#2ecc71"},
+        {"name": "TestMiner", "role": "Miner", "color": "#e74c3c"}
+    ]
+    return [client.post('/api/characters', json=data).get_json() for data in test_characters]
+
+
+def path_point(world):
+    return next(p for p in world.points if world.pathfinder.is_valid_position(p['x'], p['y']))
+
+
+def test_map_generation(client):
+    """Test map generation API"""
+    response = client.get('/api/map')
+
+    assert response.status_code == 200
+    map_data = response.get_json()
+    assert (map_data['width'], map_data['height']) == (800, 600)
+    assert map_data['buildings']
+    assert map_data['trees']
+    assert map_data['paths']['points']
+
+
+def test_character_creation(client, world):
+    """Test character creation API"""
+    response = client.post('/api/characters', json={"name": "TestWorker", "role": "Worker", "color": "#3498db"})
+
+    assert response.status_code == 200
+    character = response.get_json()
+    assert (character['name'], character['role'], character['color']) == ("TestWorker", "Worker", "#3498db")
+    # Characters spawn on a path point
+    assert {'x': character['x'], 'y': character['y']} in world.points
+
+
+def test_character_movement(client, world, characters):
+    """Test character movement API"""
+    point = path_point(world)
+    for character in characters:
+        response = client.post(f"/api/characters/{character['id']}/move",
+                               json={"target_x": point['x'], "target_y": point['y']})
+
+        assert response.status_code == 200
+        updated_char = response.get_json()
+        assert (updated_char['target_x'], updated_char['target_y']) == (point['x'], point['y'])
+
+
+def test_collision_detection(client, world, characters):
+    """Test collision detection system: moving into a building is refused"""
+    building = world.buildings[0]
+    response = client.post(f"/api/characters/{characters[0]['id']}/move", json={
+        "target_x": building['x'] + building['width'] // 2,
+        "target_y": building['y'] + building['height'] // 2,
+    })
+
+    assert response.status_code == 400
+
+
+def test_character_updates(client, characters):
+    """Test character position updates"""
+    response = client.post('/api/characters/update')
+
+    assert response.status_code == 200
+    ids = {character['id'] for character in response.get_json()}
+    assert {character['id'] for character in characters} <= ids
+
+
+def test_move_unknown_character(client):
+    response = client.post('/api/characters/999999/move', json={"target_x": 1, "target_y": 1})
+
+    assert response.status_code == 404
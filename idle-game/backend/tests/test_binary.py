@@ -0,0 +1,102 @@
+# tests/test_binary.py
+import numpy as np
+import pytest
+
+from app.utils import binary
+
+MAP = {
+    'id': 7,
+    'width': 800,
+    'height': 600,
+    'buildings': [
+        {'x': 10, 'y': 20, 'width': 30, 'height': 40, 'color': '#8B4513'},
+        {'x': 100, 'y': 200, 'width': 50, 'height': 60, 'color': '#A0522D'},
+    ],
+    'trees': [{'x': 300, 'y': 310, 'size': 12, 'color': None}],
+    'paths': {
+        'lines': [{'x1': 2, 'y1': 2, 'x2': 2, 'y2': 400, 'color': '#FFD700'}],
+        'points': [{'x': 2.5, 'y': 10.25}, {'x': 2, 'y': 30}],
+    },
+}
+
+
+def test_map_round_trip():
+    sections = binary.read_snapshot(binary.encode_map(MAP))
+
+    assert sections['META'].tolist() == [[7, 800, 600]]
+    assert sections['BLDG'].tolist() == [[10, 20, 30, 40], [100, 200, 50, 60]]
+    assert sections['TREE'].tolist() == [[300, 310, 12]]
+    assert sections['LINE'].tolist() == [[2, 2, 2, 400]]
+    assert sections['PNTS'].tolist() == [[2.5, 10.25], [2, 30]]
+    palette = sections['PALT'].tolist()
+    assert [palette[i] for i in sections['BLDC']] == [0x8B4513, 0xA0522D]
+    # Missing colors fall back to the client's defaults
+    assert [palette[i] for i in sections['TREC']] == [0x228B22]
+
+
+def test_whole_coordinates_use_uint16():
+    sections = binary.read_snapshot(binary.encode_map(MAP))
+
+    assert sections['BLDG'].dtype == np.dtype('<u2')
+    assert sections['PNTS'].dtype == np.dtype('<f4')
+
+
+def test_fractional_coordinates_use_float32():
+    fractional = {**MAP, 'buildings': [{'x': 0.5, 'y': 1, 'width': 2, 'height': 3}]}
+    sections = binary.read_snapshot(binary.encode_map(fractional))
+
+    assert sections['BLDG'].dtype == np.dtype('<f4')
+    assert sections['BLDG'].tolist() == [[0.5, 1, 2, 3]]
+
+
+def test_sections_are_aligned():
+    data = binary.encode_map(MAP)
+    offset = binary.HEADER.size
+    for _ in range(binary.HEADER.unpack_from(data)[2]):
+        length = binary.SECTION.unpack_from(data, offset)[4]
+        offset += binary.SECTION.size
+        assert offset % 4 == 0
+        offset += length + (-length % 4)
+    assert offset == len(data)
+
+
+def test_characters_round_trip():
+    characters = [
+        {'id': 1, 'name': 'Ann', 'role': 'Worker', 'x': 1.5, 'y': 2, 'target_x': 3, 'target_y': 4,
+         'speed': 2, 'map_id': 7, 'color': '#ff0000'},
+        {'id': 2, 'name': 'Bö', 'role': 'Miner', 'x': 5, 'y': 6, 'target_x': 7, 'target_y': 8,
+         'speed': 1.5, 'map_id': None, 'color': None},
+    ]
+    sections = binary.read_snapshot(binary.encode_characters(characters, tick=42))
+
+    assert sections['TICK'].tolist() == [42]
+    assert sections['CIDS'].tolist() == [1, 2]
+    assert sections['CPOS'].tolist() == [[1.5, 2, 3, 4, 2], [5, 6, 7, 8, 1.5]]
+    assert sections['CMAP'].tolist() == [7, 0]
+    assert sections['CCOL'].tolist() == [0xFF0000, 0x3498DB]
+    assert sections['CSTR'].tobytes().decode('utf-8').split('\0') == ['Ann', 'Worker', 'Bö', 'Miner']
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        binary.read_snapshot(b'JUNK' + bytes(4))
+
+
+def test_too_many_colors():
+    colorful = {**MAP, 'trees': [{'x': 1, 'y': 1, 'size': 1, 'color': f'#{i:06x}'} for i in range(300)]}
+    with pytest.raises(ValueError):
+        binary.encode_map(colorful)
+
+
+def test_bad_colors_and_nul_in_stored_characters_are_tolerated():
+    characters = [
+        {'id': 1, 'name': 'A\0b', 'role': 'Worker', 'x': 1, 'y': 2, 'target_x': 3, 'target_y': 4,
+         'speed': 2, 'map_id': 7, 'color': 'blue'},
+        {'id': 2, 'name': 'C', 'role': 5, 'x': 5, 'y': 6, 'target_x': 7, 'target_y': 8,
+         'speed': 1.5, 'map_id': 7, 'color': '#0x1234'},
+    ]
+    tick, decoded = binary.decode_characters(binary.encode_characters(characters))
+
+    assert [(c['name'], c['role'], c['color']) for c in decoded] == [
+        ('Ab', 'Worker', '#3498db'), ('C', '5', '#3498db'),
+    ]
@@ -0,0 +1,66 @@
+# tests/test_catchup.py
+import numpy as np
+
+from app.utils.catchup import fast_forward, leg_ticks
+
+POINTS = np.array([[0.0, 0.0], [100.0, 0.0], [100.0, 100.0], [0.0, 100.0]])
+
+
+def forward(ticks, x=0.0, y=0.0, target_x=100.0, target_y=0.0, speed=2.0, points=POINTS, seed=0):
+    one = np.ones(1)
+    return fast_forward(
+        x * one, y * one, target_x * one, target_y * one, speed * one, ticks * one,
+        points, np.random.default_rng(seed),
+    )
+
+
+def test_leg_ticks_round_up():
+    assert leg_ticks(np.array([0.0, 1.0, 10.0, 11.0]), 2.0).tolist() == [1, 1, 5, 6]
+
+
+def test_moves_along_the_current_leg():
+    result = forward(10)
+
+    assert (result['x'][0], result['y'][0]) == (20.0, 0.0)
+    assert (result['target_x'][0], result['target_y'][0]) == (100.0, 0.0)
+    assert result['travelled'][0] == 20.0
+
+
+def test_waits_at_the_target_without_path_points():
+    result = forward(1000, points=np.empty((0, 2)))
+
+    assert (result['x'][0], result['y'][0]) == (100.0, 0.0)
+
+
+def test_short_gaps_walk_the_next_legs():
+    result = forward(60)
+
+    # The first leg takes 50 ticks; the next one starts from its target
+    assert (result['leg_x'][0], result['leg_y'][0]) == (100.0, 0.0)
+    assert [result['target_x'][0], result['target_y'][0]] in POINTS.tolist()
+
+
+def test_long_gaps_land_on_a_leg_between_path_points():
+    count = 2000
+    ones = np.ones(count)
+    result = fast_forward(
+        0 * ones, 0 * ones, 100 * ones, 0 * ones, 2 * ones, 1e6 * ones, POINTS, np.random.default_rng(1),
+    )
+
+    starts = np.stack([result['leg_x'], result['leg_y']], axis=1)
+    ends = np.stack([result['target_x'], result['target_y']], axis=1)
+    assert all(point in POINTS.tolist() for point in starts.tolist() + ends.tolist())
+    length = np.hypot(*(ends - starts).T)
+    assert np.all(result['travelled'] <= length)
+    # Positions lie on the segment from the leg's start to its target
+    cross = (ends - starts)[:, 0] * (result['y'] - starts[:, 1]) - (ends - starts)[:, 1] * (result['x'] - starts[:, 0])
+    assert np.allclose(cross, 0)
+    # Long legs (the diagonals) are over-represented in proportion to their duration
+    diagonal = np.isclose(length, np.hypot(100, 100))
+    assert diagonal.mean() > 0.25
+
+
+def test_is_reproducible_with_a_seed():
+    first, second = forward(1e6, seed=5), forward(1e6, seed=5)
+
+    assert all(np.array_equal(first[key], second[key]) for key in first)
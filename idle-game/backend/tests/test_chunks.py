@@ -0,0 +1,55 @@
+# tests/test_chunks.py
+import pytest
+
+from app.utils.chunks import ChunkGenerator, ChunkedWorld
+
+
+def line_ends(chunk):
+    ends = set()
+    for line in chunk['paths']['lines']:
+        ends.add((line['x1'], line['y1']))
+        ends.add((line['x2'], line['y2']))
+    return ends
+
+
+def test_chunks_are_reproducible_from_the_world_seed():
+    first = ChunkGenerator(7, 3, -2).generate_chunk()
+    assert ChunkGenerator(7, 3, -2).generate_chunk() == first
+    assert ChunkGenerator(8, 3, -2).generate_chunk() != first
+
+
+@pytest.mark.parametrize('chunk_x, chunk_y', [(0, 0), (-1, 2), (5, -3)])
+def test_paths_line_up_across_chunk_borders(chunk_x, chunk_y):
+    world = ChunkedWorld(seed=11, chunk_size=640)
+    chunk = world.get_chunk(chunk_x, chunk_y)
+    east = line_ends(world.get_chunk(chunk_x + 1, chunk_y))
+    south = line_ends(world.get_chunk(chunk_x, chunk_y + 1))
+    right, bottom = chunk['x'] + chunk['width'], chunk['y'] + chunk['height']
+    # Seam lines cross the border into the neighbouring chunk's first cell
+    seams = [
+        line for line in chunk['paths']['lines']
+        if max(line['x1'], line['x2']) > right or max(line['y1'], line['y2']) > bottom
+    ]
+
+    assert seams
+    for line in seams:
+        end = (line['x2'], line['y2'])
+        assert end in (east if line['x2'] > right else south)
+
+
+def test_chunk_size_must_fit_the_path_lattice():
+    with pytest.raises(ValueError):
+        ChunkGenerator(0, 0, 0, chunk_size=600)
+
+
+def test_chunks_in_view_and_eviction():
+    world = ChunkedWorld(seed=1, chunk_size=640, ttl=60, max_chunks=3)
+    chunks = world.chunks_in_view(-10, 0, 660, 640)
+    assert [(c['chunk_x'], c['chunk_y']) for c in chunks] == [(-1, 0), (0, 0), (1, 0)]
+
+    world.get_chunk(5, 5)
+    assert len(world) == 3  # the least recently used chunk made room
+
+    assert world.evict() == 0
+    assert world.evict(now=float('inf')) == 3
+    assert len(world) == 0
@@ -0,0 +1,85 @@
+# tests/test_crowd.py
+import numpy as np
+
+from app.utils.crowd import clear_lines, overlapping_pairs, separate
+from app.utils.movement import CharacterStore
+
+
+def crowd(positions):
+    store = CharacterStore()
+    for character_id, (x, y) in enumerate(positions, start=1):
+        store.add(character_id, x, y, x, y, 2.0)
+    return store
+
+
+def test_pairs_match_brute_force():
+    rng = np.random.default_rng(5)
+    x, y = rng.uniform(0, 400, 500), rng.uniform(0, 400, 500)
+    first, second, _, _, distance = overlapping_pairs(x, y, radius=15)
+
+    found = {tuple(sorted(pair)) for pair in zip(first.tolist(), second.tolist())}
+    close = np.hypot(x[:, None] - x, y[:, None] - y) < 30
+    expected = {(i, j) for i, j in zip(*np.nonzero(np.triu(close, k=1)))}
+    assert found == expected
+    assert len(found) == len(first)  # each pair exactly once
+    assert (distance < 30).all()
+
+
+def test_overlapping_characters_move_apart():
+    store = crowd([(100, 100), (110, 100), (300, 300)])
+    rows = separate(store, radius=15, strength=0.5)
+
+    assert sorted(rows.tolist()) == [0, 1]
+    # Each takes half of strength * overlap (20 px), along the line between them
+    assert store.x.tolist() == [95, 115, 300]
+    assert store.y.tolist() == [100, 100, 300]
+    assert store.take_dirty().tolist() == [0, 1]
+
+
+def test_pushes_are_capped():
+    store = crowd([(100, 100)] * 2 + [(100.5, 100)] * 10)
+    separate(store, radius=15, strength=0.5)
+
+    moved = np.hypot(store.x - np.r_[[100] * 2, [100.5] * 10], store.y - 100)
+    assert (moved <= 7.5 + 1e-9).all()
+
+
+def test_coincident_characters_split_deterministically():
+    first, second = crowd([(100, 100), (100, 100)]), crowd([(100, 100), (100, 100)])
+    separate(first)
+    separate(second)
+
+    assert np.hypot(first.x[0] - first.x[1], first.y[0] - first.y[1]) > 0
+    assert first.x.tolist() == second.x.tolist() and first.y.tolist() == second.y.tolist()
+
+
+def test_pushes_into_blocked_cells_are_dropped():
+    blocked = np.zeros((10, 10), dtype=np.uint8)
+    blocked[:, 4] = 1  # a wall covering x 80-100
+    store = crowd([(75, 50), (85, 50)])
+    store.set_target(1, 10, 50)
+    store.set_target(2, 10, 50)
+
+    rows = separate(store, radius=15, blocked=blocked, cell_size=20)
+
+    # The first steps away from the wall; the second would be pushed deeper
+    # into it, off a clear line to its waypoint, so it stays put
+    assert rows.tolist() == [0]
+    assert store.x[0] < 75 and store.x[1] == 85
+
+
+def test_clear_lines():
+    blocked = np.zeros((5, 5), dtype=np.uint8)
+    blocked[2, 2] = 1
+    x0, y0 = np.array([10.0, 10.0, 10.0]), np.array([10.0, 50.0, 10.0])
+    x1, y1 = np.array([90.0, 90.0, 50.0]), np.array([10.0, 50.0, 50.0])
+
+    # Open row, through the blocked cell, and ending on it (allowed)
+    assert clear_lines(blocked, 20, x0, y0, x1, y1).tolist() == [True, False, True]
+    assert clear_lines(blocked, 20, np.array([10.0]), np.array([10.0]),
+                       np.array([-30.0]), np.array([10.0])).tolist() == [False]
+
+
+def test_single_characters_and_zero_radius_do_nothing():
+    assert not len(separate(crowd([(1, 1)])))
+    assert not len(separate(crowd([(1, 1), (1, 1)]), radius=0))
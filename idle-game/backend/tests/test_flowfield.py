@@ -0,0 +1,106 @@
+# tests/test_flowfield.py
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.utils.flowfield import SQRT2, FlowField, FlowFieldCache
+from app.utils.generator import pack_grid
+from app.utils.pathfinding import PathFinder
+
+
+class GridMap:
+    """Stands in for a GameMap row: a stored walkability grid and no geometry"""
+
+    seed = 1
+    created_at = datetime(2024, 1, 1)
+
+    def __init__(self, grid, map_id):
+        self.id = map_id
+        self.height, self.width = (size * 20 for size in grid.shape)
+        self.grid = pack_grid(grid)
+
+    def geometry(self):
+        return {'buildings': [], 'trees': [], 'paths': {'lines': [], 'points': []}}
+
+
+def cost(cells):
+    """Length of a route given as turning-point cells, in cell widths"""
+    total = 0.0
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        dx, dy = abs(x2 - x1), abs(y2 - y1)
+        total += min(dx, dy) * SQRT2 + abs(dx - dy)
+    return total
+
+
+def maze():
+    """A reproducible 30x20 grid with scattered obstacles"""
+    rng = np.random.default_rng(3)
+    grid = (rng.random((20, 30)) < 0.2).astype(np.uint8)
+    grid[9:12, 14:17] = 0  # room around the goal
+    return grid
+
+
+def test_flow_routes_cost_the_same_as_astar():
+    grid = maze()
+    pathfinder = PathFinder(GridMap(grid, map_id='flow-maze'))
+    goal = (15, 10)
+    field = FlowField(grid, goal)
+
+    checked = 0
+    for y in range(20):
+        for x in range(30):
+            if grid[y, x]:
+                continue
+            searched = pathfinder.search((x, y), goal)
+            flowed = field.route((x, y))
+            assert (searched is None) == (flowed is None) == (not field.reachable((x, y)))
+            if flowed is not None:
+                assert cost(flowed) == pytest.approx(cost(searched), abs=1e-4)
+                assert cost(flowed) == pytest.approx(float(field.cost[y, x]), abs=1e-4)
+                checked += 1
+    assert checked > 300
+
+
+def test_blocked_goals_may_be_entered_and_blocked_starts_left():
+    grid = np.zeros((5, 5), dtype=np.uint8)
+    grid[2, :] = 1
+    field = FlowField(grid, (2, 2))
+
+    assert field.route((2, 0)) == [(2, 0), (2, 1), (2, 2)]
+    assert field.next_step((2, 2)) is None
+    # A start inside the wall can step out, but nothing routes through the wall
+    assert FlowField(grid, (0, 4)).route((0, 2)) == [(0, 2), (0, 3), (0, 4)]
+    assert not FlowField(grid, (0, 4)).reachable((0, 0))
+
+
+def test_fields_are_built_only_for_popular_goals():
+    cache = FlowFieldCache(min_requests=3)
+    grid = np.zeros((4, 4), dtype=np.uint8)
+
+    assert cache.field('map', grid, (0, 0)) is None
+    assert cache.field('map', grid, (0, 0)) is None
+    field = cache.field('map', grid, (0, 0))
+    assert field is not None and cache.builds == 1
+    assert cache.field('map', grid, (0, 0)) is field
+    # A batch of requests counts as that many
+    assert cache.field('map', grid, (3, 3), requests=3) is not None
+
+
+def test_full_caches_only_admit_more_popular_goals():
+    cache = FlowFieldCache(maxsize=1, min_requests=1)
+    grid = np.zeros((4, 4), dtype=np.uint8)
+    cache.field('map', grid, (0, 0), requests=5)
+
+    assert cache.field('map', grid, (1, 1), requests=2) is None
+    assert cache.field('map', grid, (1, 1), requests=4) is not None
+    assert len(cache) == 1
+
+
+def test_request_counts_age():
+    cache = FlowFieldCache(min_requests=4, sample_size=4)
+    grid = np.zeros((4, 4), dtype=np.uint8)
+    cache.field('map', grid, (0, 0), requests=3)
+    cache.field('map', grid, (1, 1))  # the fourth request halves every count
+
+    assert cache.field('map', grid, (0, 0)) is None
@@ -0,0 +1,121 @@
+# tests/test_jobs.py
+import time
+
+import pytest
+
+from app.jobs import THREAD_KINDS, JobCancelled, JobContext, JobQueueFull, JobRunner, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.db'), timeout=60)
+
+
+def wait_for(runner, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = runner.get(job_id)
+        if job['state'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_job_life_cycle(store):
+    job = store.create('loading', {}, now=100)
+    assert (job['state'], job['progress']) == ('queued', 0)
+
+    assert store.start(job['id'], 'worker', now=101)
+    assert not store.start(job['id'], 'other', now=101)
+    assert not store.report(job['id'], 40, 'Loading', now=102)
+    assert store.get(job['id'])['progress'] == 40
+
+    store.finish(job['id'], 'done', result={'map_id': 3}, now=103)
+    job = store.get(job['id'])
+    assert (job['state'], job['progress'], job['result'], job['message']) == ('done', 100, {'map_id': 3}, 'Loading')
+    assert store.latest('loading')['id'] == job['id']
+
+
+def test_cancel_queued_and_running_jobs(store):
+    queued = store.create('loading', {})
+    assert store.cancel(queued['id'])['state'] == 'cancelled'
+    assert not store.start(queued['id'], 'worker')
+
+    running = store.create('loading', {})
+    store.start(running['id'], 'worker')
+    assert store.cancel(running['id'])['state'] == 'running'
+    with pytest.raises(JobCancelled):
+        JobContext(store, running['id']).progress(50)
+
+    assert store.cancel('missing') is None
+
+
+def test_queue_limit_and_timeout(store):
+    first = store.create('loading', {}, max_active=2, now=100)
+    store.create('loading', {}, max_active=2, now=100)
+    with pytest.raises(JobQueueFull):
+        store.create('loading', {}, max_active=2, now=100)
+
+    # Jobs that went quiet for the timeout stop counting
+    assert store.create('loading', {}, max_active=2, now=161)['state'] == 'queued'
+    assert (store.get(first['id'])['state'], store.get(first['id'])['error']) == ('failed', 'Timed out')
+
+
+def test_thread_kinds_are_not_capped(store):
+    store.create('generate_map', {}, max_active=1, uncapped=THREAD_KINDS)
+    with pytest.raises(JobQueueFull):
+        store.create('generate_map', {}, max_active=1, uncapped=THREAD_KINDS)
+
+    # Loading jobs neither hit the cap nor count toward it
+    store.create('loading', {}, max_active=1, uncapped=THREAD_KINDS)
+    store.cancel(store.latest('generate_map')['id'])
+    store.create('generate_map', {}, max_active=1, uncapped=THREAD_KINDS)
+
+
+def test_progress_reports_are_throttled(store):
+    job = store.create('loading', {})
+    store.start(job['id'], 'worker')
+    context = JobContext(store, job['id'], min_interval=60)
+
+    context.progress(10)
+    context.progress(20)
+    assert store.get(job['id'])['progress'] == 10
+    context.progress(30, 'New step')
+    assert store.get(job['id'])['progress'] == 30
+    context.progress(100)
+    assert store.get(job['id'])['progress'] == 100
+
+
+def test_submit_validates_kind_and_params(store):
+    runner = JobRunner(store)
+
+    with pytest.raises(ValueError):
+        runner.submit('unknown')
+    with pytest.raises(ValueError):
+        runner.submit('loading', {'colour': 'red'})
+    assert store.latest('loading') is None
+
+
+def test_loading_jobs_run_on_threads(store):
+    runner = JobRunner(store)
+    try:
+        done = wait_for(runner, runner.submit('loading', {'steps': 2, 'delay': 0})['id'])
+        assert (done['state'], done['progress']) == ('done', 100)
+        assert runner._executor is None  # no job process was started
+
+        running = runner.submit('loading', {'steps': 100, 'delay': 0.05})
+        time.sleep(0.2)
+        runner.cancel(running['id'])
+        assert wait_for(runner, running['id'])['state'] == 'cancelled'
+    finally:
+        runner.shutdown()
+
+
+def test_jobs_run_in_job_processes(app, store):
+    runner = JobRunner(store)
+    try:
+        failed = wait_for(runner, runner.submit('generate_map', {'width': 10})['id'])
+        assert failed['state'] == 'failed'
+        assert 'between' in failed['error']
+    finally:
+        runner.shutdown()
@@ -0,0 +1,50 @@
+# tests/test_map_cache.py
+from datetime import datetime
+
+from app.map_cache import MapCache
+
+
+class StoredMap:
+    """Stands in for a GameMap row with no geometry"""
+
+    width, height, seed, grid = 800, 600, 1, None
+
+    def __init__(self, map_id, created_at=datetime(2024, 1, 1)):
+        self.id = map_id
+        self.created_at = created_at
+
+    def geometry(self):
+        return {'buildings': [], 'trees': [], 'paths': {'lines': [], 'points': []}}
+
+
+def test_compiled_maps_are_reused():
+    cache = MapCache()
+    compiled = cache.compile(StoredMap(1))
+
+    assert cache.compile(StoredMap(1)) is compiled
+    assert cache.get(1) is compiled
+    # A map row recreated under the same id is compiled again
+    assert cache.compile(StoredMap(1, datetime(2024, 1, 2))) is not compiled
+
+
+def test_least_recently_used_maps_are_evicted():
+    cache = MapCache(maxsize=2)
+    first = cache.compile(StoredMap(1))
+    cache.compile(StoredMap(2))
+    cache.get(1)  # now more recent than map 2
+    cache.compile(StoredMap(3))
+
+    assert list(cache._maps) == [1, 3]
+    assert cache.compile(StoredMap(1)) is first
+
+
+def test_invalidate():
+    cache = MapCache()
+    cache.set_current(StoredMap(1))
+    cache.compile(StoredMap(2))
+
+    cache.invalidate(1)
+    assert list(cache._maps) == [2]
+    assert cache._current_id is None
+    cache.invalidate()
+    assert not cache._maps
@@ -0,0 +1,32 @@
+# tests/test_map_pool.py
+from concurrent.futures import Future
+
+import pytest
+
+from app.map_pool import MapPool, generate_valid_map, is_valid_map
+from app.utils.generator import MapGenerator, check_seed
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_default_size_maps_meet_the_constraints(seed):
+    assert is_valid_map(MapGenerator(800, 600, seed=seed).generate_map())
+
+
+def test_no_map_when_every_seed_fails(monkeypatch):
+    monkeypatch.setattr(MapGenerator, 'is_path_coverage_sufficient', lambda self, lines: False)
+    assert generate_valid_map(800, 600, seed=1, max_seeds=2) is None
+
+
+def test_failed_generations_are_not_pooled():
+    pool = MapPool(size=1)
+    pool._pending = 1
+    future = Future()
+    future.set_result(None)
+    pool._collect(future)
+    assert not pool._ready
+
+
+@pytest.mark.parametrize('seed', [-1, 2**63, 'abc', None])
+def test_seeds_must_fit_the_seed_column(seed):
+    with pytest.raises(ValueError):
+        check_seed(seed)
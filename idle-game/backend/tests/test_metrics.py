@@ -0,0 +1,58 @@
+# tests/test_metrics.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.metrics import DB_QUERY_SECONDS, Registry, merge
+
+
+def test_render_merges_other_processes():
+    registry, other = Registry(), Registry()
+    for target in (registry, other):
+        target.counter('requests_total', 'Requests', ('route',)).inc('map')
+        target.histogram('seconds', 'Latency', buckets=(0.1, 1)).observe(0.5)
+    registry.gauge('engines', 'Engines').set(2)
+
+    text = registry.render([other.dump()])
+
+    assert 'idle_game_requests_total{route="map"} 2' in text
+    assert 'idle_game_seconds_bucket{le="0.1"} 0' in text
+    assert 'idle_game_seconds_bucket{le="1"} 2' in text
+    assert 'idle_game_seconds_bucket{le="+Inf"} 2' in text
+    assert 'idle_game_seconds_sum 1' in text
+    assert 'idle_game_engines 2' in text
+
+
+def test_merge_skips_incompatible_metrics():
+    first, second = Registry(), Registry()
+    first.histogram('seconds', 'Latency', buckets=(1,)).observe(0.5)
+    second.histogram('seconds', 'Latency', buckets=(2,)).observe(0.5)
+
+    merged = merge([first.dump(), second.dump()])
+
+    assert merged['idle_game_seconds']['values'][()] == [1, 0, 0.5]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter('errors_total', 'Errors', ('message',)).inc('say "hi"\n')
+
+    assert 'idle_game_errors_total{message="say \\"hi\\"\\n"} 1' in registry.render()
+
+
+def selects_timed():
+    return sum(sum(value[:-1]) for labels, value in DB_QUERY_SECONDS.dump() if labels == ['SELECT'])
+
+
+def test_failed_statements_leave_no_start_times(app):
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM missing'))
+        timed = selects_timed()
+        conn.execute(text('SELECT 1'))
+
+        assert selects_timed() == timed + 1
+        assert 'query_start' not in conn.info
+    engine.dispose()
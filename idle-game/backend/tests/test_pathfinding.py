@@ -0,0 +1,112 @@
+# tests/test_pathfinding.py
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.utils.flowfield import SQRT2
+from app.utils.generator import pack_grid
+from app.utils.pathfinding import PathFinder, RouteCache, route_cache
+
+
+class GridMap:
+    """Stands in for a GameMap row: a stored walkability grid and no geometry"""
+
+    width, height, seed = 400, 300, 1
+    created_at = datetime(2024, 1, 1)
+
+    def __init__(self, grid, map_id):
+        self.id = map_id
+        self.grid = pack_grid(grid)
+
+    def geometry(self):
+        return {'buildings': [], 'trees': [], 'paths': {'lines': [], 'points': []}}
+
+
+def walled_grid():
+    """20x15 cells with a wall down column 10, open only in the bottom two rows"""
+    grid = np.zeros((15, 20), dtype=np.uint8)
+    grid[:13, 10] = 1
+    return grid
+
+
+def expand(cells):
+    """Every cell of a compressed route, checking each leg is a straight 8-way line"""
+    full = [cells[0]]
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        dx, dy = x2 - x1, y2 - y1
+        assert dx == 0 or dy == 0 or abs(dx) == abs(dy)
+        for step in range(1, max(abs(dx), abs(dy)) + 1):
+            full.append((x1 + step * np.sign(dx), y1 + step * np.sign(dy)))
+    return [(int(x), int(y)) for x, y in full]
+
+
+def cost(cells):
+    return sum(SQRT2 if a[0] != b[0] and a[1] != b[1] else 1.0 for a, b in zip(cells, cells[1:]))
+
+
+@pytest.fixture
+def pathfinder(request):
+    return PathFinder(GridMap(walled_grid(), map_id=f'astar-{request.node.name}'))
+
+
+def test_routes_go_around_obstacles_without_cutting_corners(pathfinder):
+    cells = expand(pathfinder.search((2, 2), (17, 2)))
+    grid = walled_grid()
+
+    assert cells[0] == (2, 2) and cells[-1] == (17, 2)
+    assert not any(grid[y, x] for x, y in cells)
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        if x1 != x2 and y1 != y2:
+            assert not grid[y1, x2] and not grid[y2, x1]
+    # Diagonally down to the gap, straight through it (no corner cutting past
+    # the wall's end) and diagonally back up: the shortest 8-way route
+    assert cost(cells) == pytest.approx((7 * SQRT2 + 4) + 2 + (6 * SQRT2 + 5))
+
+
+def test_route_waypoints_end_at_the_exact_goal(pathfinder):
+    route = pathfinder.find_route(50, 50, 355.5, 47.25)
+
+    assert route[-1] == (355.5, 47.25)
+    assert all(pathfinder.in_grid(pathfinder.to_cell(x, y)) for x, y in route)
+
+
+def test_no_route_off_the_grid_or_to_an_enclosed_goal():
+    grid = walled_grid()
+    grid[13:, 10] = 1
+    pathfinder = PathFinder(GridMap(grid, map_id='astar-enclosed'))
+
+    assert pathfinder.find_route(50, 50, 350, 50) is None
+    assert pathfinder.find_route(50, 50, 5000, 50) is None
+    assert pathfinder.find_route(-1, 50, 60, 50) is None
+
+
+def test_routes_are_cached_per_map_and_cells(pathfinder):
+    hits = route_cache.hits
+    first = pathfinder.find_route(50, 50, 350, 50)
+    # Another point in the same start and goal cells reuses the planned cells
+    second = pathfinder.find_route(55, 45, 345, 55)
+
+    assert route_cache.hits == hits + 1
+    assert first[:-1] == second[:-1]
+    assert second[-1] == (345, 55)
+
+
+def test_route_cache_evicts_least_recently_used():
+    cache = RouteCache(maxsize=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1]
+    cache.put('c', [3])
+
+    assert cache.get('b') is RouteCache.MISSING
+    assert cache.get('a') == [1] and cache.get('c') == [3]
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_cached_failures_are_not_misses():
+    cache = RouteCache()
+    cache.put('unreachable', None)
+
+    assert cache.get('unreachable') is None
+    assert (cache.hits, cache.misses) == (1, 0)
@@ -0,0 +1,73 @@
+# tests/test_persistence.py
+import pytest
+
+from app.persistence import WriteBehind
+
+
+class FailingSession:
+    """Stands in for a database session while the database is down"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.down = True
+
+    def execute(self, statement):
+        self.attempts += 1
+        if self.down:
+            raise ConnectionError('database is down')
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_flushes_on_interval_or_staleness():
+    writer = WriteBehind(flush_interval=5, max_staleness=30)
+    assert not writer.due()
+
+    writer.mark_pending()
+    assert not writer.due(writer._last_flush + 4)
+    assert writer.due(writer._last_flush + 5)
+
+
+def test_retries_back_off_during_an_outage(app):
+    from app.models import Character
+
+    writer = WriteBehind(flush_interval=1, max_staleness=30)
+    session = FailingSession()
+    start = writer._last_flush
+    writer.mark_pending(start)
+
+    # Tick ten times a second through a minute-long outage
+    for tick in range(600):
+        now = start + 1 + tick / 10
+        if writer.due(now):
+            with pytest.raises(ConnectionError):
+                writer.flush([{'id': 1, 'x': 0, 'y': 0, 'target_x': 0, 'target_y': 0, 'last_update': None}],
+                             session, Character, now)
+    # 1, 2, 4, 8, 16 then 30 seconds apart, even once the changes are stale
+    assert session.attempts <= 7
+
+    session.down = False
+    assert writer.due(writer._retry_at)
+
+
+def test_stop_flushes_pending_changes(app, world):
+    from app.models import Character, db
+    from app.simulation import SimulationEngine
+
+    with app.app_context():
+        character = Character(name='Saved', role='Worker', x=1, y=1, target_x=1, target_y=1, map_id=world.id)
+        db.session.add(character)
+        db.session.commit()
+        character_id = character.id
+
+    engine = SimulationEngine(app, map_id=world.id, persist_interval=3600)
+    engine.start()
+    engine.set_target(character_id, 321.0, 1.0)
+    engine.stop()
+
+    with app.app_context():
+        assert db.session.get(Character, character_id).target_x == 321.0
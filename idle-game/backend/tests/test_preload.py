@@ -0,0 +1,49 @@
+# tests/test_preload.py
+import gc
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.map_cache import ENCODINGS, map_cache
+from app.metrics import metrics
+from app.preload import preload
+
+
+@pytest.fixture
+def preload_config(app):
+    saved = {key: app.config[key] for key in ('MAP_PRELOAD_COUNT', 'MAP_PRELOAD_TILE_ZOOM')}
+    yield app.config
+    app.config.update(saved)
+    gc.unfreeze()
+
+
+def test_newest_and_default_maps_are_compiled_and_warmed(app, world, preload_config):
+    preload_config.update(MAP_PRELOAD_COUNT=1, MAP_PRELOAD_TILE_ZOOM=0)
+    map_cache.invalidate()
+    counter = metrics.counter('preload_test_total', 'Counted before the fork')
+    counter.inc()
+
+    loaded = preload(app)
+
+    assert world.id in loaded
+    compiled = map_cache.peek(world.id)
+    assert compiled is not None and compiled is not world
+    assert len(compiled._bodies) == 2 * len(ENCODINGS)
+    assert compiled._line_boxes is not None
+    assert compiled.layer._tiles  # zoom 0 rendered
+    assert counter.dump() == []  # the master's counts are not reported by every worker
+
+
+def test_preload_can_be_disabled(app, preload_config):
+    preload_config.update(MAP_PRELOAD_COUNT=0)
+    assert preload(app) == []
+
+
+def test_database_errors_do_not_stop_the_server(app, preload_config, monkeypatch):
+    preload_config.update(MAP_PRELOAD_COUNT=2)
+
+    def unavailable(map_id):
+        raise OperationalError('SELECT', {}, Exception('database is down'))
+
+    monkeypatch.setattr(map_cache, 'get', unavailable)
+    assert preload(app) == []
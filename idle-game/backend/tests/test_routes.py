@@ -0,0 +1,228 @@
+# tests/test_routes.py - conditional GETs and request validation
+import time
+
+import pytest
+
+from app.utils import binary
+
+
+@pytest.fixture
+def character(client):
+    return client.post('/api/characters', json={'name': 'Validator', 'role': 'Tester'}).get_json()
+
+
+@pytest.fixture
+def keep_default_map(app, world):
+    """Make the test's world the default one again after a test that may replace it"""
+    yield
+    app.extensions['shards'].broker.set_default_map(world.id)
+
+
+def test_map_etag_answers_304(client):
+    response = client.get('/api/map', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'gzip'
+    assert response.cache_control.no_cache
+
+    revalidated = client.get('/api/map', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == response.headers['ETag']
+
+
+def test_map_etag_differs_per_representation(client, world):
+    etags = {
+        client.get(f'/api/map?map_id={world.id}', headers=headers).headers['ETag']
+        for headers in (
+            {},
+            {'Accept-Encoding': 'gzip'},
+            {'Accept': binary.MIME_TYPE},
+            {'Accept': binary.MIME_TYPE, 'Accept-Encoding': 'gzip'},
+        )
+    }
+    assert len(etags) == 4
+
+    plain = client.get(f'/api/map?map_id={world.id}')
+    assert plain.cache_control.immutable
+    assert client.get(f'/api/map?map_id={world.id}', headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+    # A stale ETag gets the full body
+    assert client.get(f'/api/map?map_id={world.id}', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_binary_map_matches_json(client, world):
+    response = client.get(f'/api/map?map_id={world.id}', headers={'Accept': binary.MIME_TYPE})
+
+    assert response.mimetype == binary.MIME_TYPE
+    sections = binary.read_snapshot(response.data)
+    assert sections['META'].tolist() == [[world.id, world.width, world.height]]
+    assert len(sections['BLDG']) == len(world.buildings)
+
+
+def test_region_etag_and_contents(client, world):
+    url = f'/api/map/{world.id}/region?x=0&y=0&width=200&height=200'
+    response = client.get(url)
+    region = response.get_json()
+
+    assert region['viewport'] == [0, 0, 200, 200]
+    assert all(p['x'] <= 200 and p['y'] <= 200 for p in region['paths']['points'])
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/api/map/999999/region?x=0&y=0&width=1&height=1').status_code == 404
+
+
+def test_regions_of_uncached_maps_are_read_from_the_geometry_tables(app, client, world):
+    from app.map_cache import map_cache
+
+    url = f'/api/map/{world.id}/region?x=100&y=50&width=300&height=200'
+    compiled = client.get(url).get_json()
+    binary_compiled = client.get(url, headers={'Accept': binary.MIME_TYPE}).data
+
+    map_cache.invalidate(world.id)
+    try:
+        assert client.get(url).get_json() == compiled
+        assert client.get(url, headers={'Accept': binary.MIME_TYPE}).data == binary_compiled
+        assert map_cache.peek(world.id) is None
+    finally:
+        with app.app_context():
+            map_cache.get(world.id)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/map?x=nan&y=0&width=10&height=10',
+    '/api/map?x=0&y=0&width=-1&height=10',
+    '/api/characters?x=0&y=0&width=inf&height=10',
+    '/api/characters?x=a&y=0&width=10&height=10',
+    '/api/map/1/region?x=0&y=0&width=10',
+    '/api/world/chunks?x=nan',
+    '/api/world/chunks?width=inf',
+    '/api/world/chunks?width=1e9&height=1e9',
+    '/api/world/chunks?height=0',
+])
+def test_invalid_viewports(client, url):
+    assert client.get(url).status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'target_x': 'nan', 'target_y': 1},
+    {'target_x': 1, 'target_y': 'inf'},
+    {'target_x': 'left', 'target_y': 1},
+    {'target_x': None, 'target_y': 1},
+    {'target_x': 10**400, 'target_y': 1},
+    [1, 2],
+])
+def test_invalid_move_targets(client, character, body):
+    response = client.post(f"/api/characters/{character['id']}/move", json=body)
+
+    assert response.status_code == 400
+
+
+def test_batch_move_reports_bad_orders(client, character, world):
+    point = next(p for p in world.points if world.pathfinder.is_valid_position(p['x'], p['y']))
+    response = client.post('/api/characters/move', json={'orders': [
+        {'id': character['id'], 'target_x': point['x'], 'target_y': point['y']},
+        {'id': character['id'], 'target_x': 'nan'},
+        {'id': 999999, 'target_x': point['x'], 'target_y': point['y']},
+    ]})
+    result = response.get_json()
+
+    assert [c['id'] for c in result['moved']] == [character['id']]
+    assert sorted(r['error'] for r in result['rejected']) == ['Character not found', 'Malformed order']
+
+
+def test_batch_move_rejects_out_of_range_numbers(client, character, world):
+    body = (
+        '{"orders": [{"id": 1e400, "target_x": 1, "target_y": 1},'
+        f' {{"id": {character["id"]}, "target_x": 1e400, "target_y": 1}},'
+        f' {{"id": {character["id"]}, "target_x": {10**400}, "target_y": 1}}]}}'
+    )
+    response = client.post('/api/characters/move', data=body, content_type='application/json')
+    result = response.get_json()
+
+    assert response.status_code == 200
+    assert result['moved'] == []
+    assert [r['error'] for r in result['rejected']] == [
+        'Malformed order', 'Invalid position', 'Malformed order',
+    ]
+
+
+def test_batch_size_is_capped(app, client):
+    too_many = [{'name': 'x'}] * (app.config['BATCH_MAX_SIZE'] + 1)
+
+    assert client.post('/api/characters/batch', json=too_many).status_code == 400
+    assert client.post('/api/characters/move', json={'orders': 'all'}).status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'seed': 'abc'},
+    {'seed': float('inf')},
+    {'seed': 2**70},
+    {'seed': -1},
+    {'seed': 1, 'width': 10, 'height': 600},
+    {'seed': 1, 'width': 800, 'height': 100000},
+    {'seed': 1, 'width': 'wide'},
+    [1, 2],
+    'seed',
+])
+def test_invalid_new_maps(client, body):
+    assert client.post('/api/map/new', json=body).status_code == 400
+
+
+def test_large_new_maps_run_as_jobs(app, client, keep_default_map):
+    response = client.post('/api/map/new', json={'seed': 1, 'width': 2000, 'height': 2000})
+
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert response.headers['Location'] == f'/api/jobs/{job_id}'
+    assert client.get(f'/api/jobs/{job_id}').get_json()['kind'] == 'generate_map'
+
+    client.post(f'/api/jobs/{job_id}/cancel')
+    deadline = time.monotonic() + 60
+    while client.get(f'/api/jobs/{job_id}').get_json()['state'] in ('queued', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_invalid_jobs(client):
+    assert client.post('/api/jobs', json={'kind': 'unknown'}).status_code == 400
+    assert client.post('/api/jobs', json={'kind': 'loading', 'params': [1]}).status_code == 400
+    assert client.post('/api/jobs', json={'kind': 'loading', 'params': {'colour': 'red'}}).status_code == 400
+    assert client.post('/api/jobs', json=['loading']).status_code == 400
+    assert client.post('/api/jobs').status_code == 400
+    assert client.get('/api/jobs/missing').status_code == 404
+    assert client.post('/api/jobs/missing/cancel').status_code == 404
+
+
+def test_streams_are_capped_per_worker(app, client):
+    slots = app.extensions['streams']
+    taken = 0
+    while slots.acquire():
+        taken += 1
+    try:
+        response = client.get('/api/stream')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+    finally:
+        for _ in range(taken):
+            slots.release()
+
+
+@pytest.mark.parametrize('body', [
+    {'color': 'blue'},
+    {'color': 5},
+    {'color': '#12345'},
+    {'name': 'Null\0byte'},
+    {'name': 'x' * 101},
+    {'role': ['Worker']},
+])
+def test_invalid_characters(client, body):
+    assert client.post('/api/characters', json=body).status_code == 400
+    response = client.post('/api/characters/batch', json=[{'name': 'Fine'}, body])
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Character 1:')
+
+
+def test_binary_characters_after_creation(client):
+    assert client.post('/api/characters', json={'name': 'Bin', 'color': '#ABCDEF'}).status_code == 200
+    response = client.get('/api/characters', headers={'Accept': binary.MIME_TYPE})
+
+    assert response.status_code == 200
+    tick, characters = binary.decode_characters(response.data)
+    assert {'name': 'Bin', 'color': '#abcdef'}.items() <= next(c for c in characters if c['name'] == 'Bin').items()
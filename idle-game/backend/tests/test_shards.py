@@ -0,0 +1,211 @@
+# tests/test_shards.py
+import threading
+import time
+
+import pytest
+
+from app.shards import RemoteEngine, ShardBroker, ShardRegistry
+from app.utils import binary
+
+
+@pytest.fixture
+def broker(tmp_path):
+    return ShardBroker(str(tmp_path / 'shards.db'), lease_ttl=10)
+
+
+def test_lease_is_exclusive_until_it_expires(broker):
+    assert broker.acquire(1, 'a', now=100)
+    assert broker.acquire(1, 'a', now=101)  # the owner may re-acquire
+    assert not broker.acquire(1, 'b', now=105)
+    assert broker.acquire(1, 'b', now=111)  # a's lease ran out at 110
+    assert broker.leases(now=111) == [{'map_id': 1, 'owner': 'b'}]
+
+
+def test_renew_extends_only_live_leases(broker):
+    broker.acquire(1, 'a', now=100)
+    broker.acquire(2, 'a', now=100)
+
+    assert broker.renew([1], 'a', now=108) == {1}
+    assert broker.renew([1, 2], 'a', now=115) == {1}
+    assert not broker.acquire(1, 'b', now=115)
+    assert broker.acquire(2, 'b', now=115)
+
+
+def test_release_and_orphans(broker):
+    broker.acquire(1, 'a', now=100)
+    broker.acquire(2, 'a', now=100)
+    broker.release(1, 'a')
+    broker.release(2, 'b')  # not b's to release
+
+    assert broker.orphans(now=101) == [1]
+    assert sorted(broker.orphans(now=111)) == [1, 2]
+
+
+def test_free_worlds_are_shared_between_workers(broker):
+    broker.heartbeat('a', now=100)
+    broker.heartbeat('b', now=100)
+
+    assert broker.acquire(1, 'a', now=100)
+    # a already holds its share of two worlds between two workers
+    assert not broker.acquire(2, 'a', now=100)
+    assert broker.acquire(2, 'b', now=100)
+    # The world a passed on is remembered as wanted
+    assert broker.orphans(now=100) == []
+    assert broker.leases(now=100) == [{'map_id': 1, 'owner': 'a'}, {'map_id': 2, 'owner': 'b'}]
+
+
+def test_commands_are_taken_once_in_order(broker):
+    broker.send(1, 'add', [{'id': 1}])
+    broker.send(1, 'move', [[1, 2.0, 3.0]])
+    broker.send(2, 'add', [])
+
+    assert broker.receive(1) == [('add', [{'id': 1}]), ('move', [[1, 2.0, 3.0]])]
+    assert broker.receive(1) == []
+    assert broker.receive(2) == [('add', [])]
+
+
+def character(char_id, **fields):
+    return {'id': char_id, 'name': f'C{char_id}', 'role': 'Worker', 'x': 1.0, 'y': 2.0,
+            'target_x': 3.0, 'target_y': 4.0, 'speed': 2.0, 'color': '#3498db', 'map_id': 1, **fields}
+
+
+def publish(broker, version, tick, characters):
+    positions = [(c['x'], c['y'], c['target_x'], c['target_y'], c['speed']) for c in characters]
+    payload = binary.encode_columns([c['id'] for c in characters], positions, characters, tick, dtype='<f8')
+    broker.publish(1, 'a', version, tick, payload)
+
+
+def test_snapshots_keep_exact_positions(broker):
+    published = [character(5, x=1.1, y=0.3), character(6, name='Zoë', color=None, map_id=None)]
+    publish(broker, 1, 10, published)
+
+    owner, version, tick, characters = broker.latest(1)
+    assert (owner, version, tick) == ('a', 1, 10)
+    assert characters == [published[0], {**published[1], 'color': '#3498db'}]
+
+
+def test_remote_engine_decodes_each_version_once(broker, monkeypatch):
+    publish(broker, 1, 10, [character(5)])
+    remote = RemoteEngine(broker, 1, 'reader')
+    reads = []
+    latest = broker.latest
+    monkeypatch.setattr(broker, 'latest', lambda map_id: reads.append(map_id) or latest(map_id))
+
+    assert remote.version == ('a', 1)
+    assert remote.get_character(5) == character(5)
+    assert remote.snapshot((0, 0, 10, 10)) == [character(5)]
+    assert len(reads) == 1
+
+    publish(broker, 2, 11, [])
+    assert remote.tick == 11
+    assert remote.get_character(5) is None
+    assert len(reads) == 2
+
+
+def test_remote_engine_forwards_orders_for_known_characters(broker):
+    publish(broker, 1, 10, [character(5)])
+    remote = RemoteEngine(broker, 1, 'reader')
+
+    moved = remote.set_targets([(5, 7.0, 8.0), (6, 1.0, 1.0)])
+
+    assert [(c['id'], c['target_x'], c['target_y']) for c in moved] == [(5, 7.0, 8.0)]
+    assert broker.receive(1) == [('move', [[5, 7.0, 8.0]])]
+
+
+def test_worlds_are_watched_while_remote_engines_read_them(broker):
+    assert not broker.watched(1)
+    remote = RemoteEngine(broker, 1, 'reader', first_wait=0)
+
+    assert remote.snapshot() == []
+    assert broker.watched(1)
+    assert not broker.watched(1, now=time.time() + broker.lease_ttl + 1)
+    assert not broker.watched(2)
+
+
+def test_owners_publish_only_while_watched(app, world, broker):
+    from app.simulation import SimulationEngine
+
+    engine = SimulationEngine(app, map_id=world.id, broker=broker, owner='a')
+    with app.app_context():
+        engine.load_world()
+    engine.exchange()
+    assert broker.version(world.id) is None
+
+    broker.watch(world.id, 'reader')
+    engine.exchange()
+    assert broker.version(world.id) == ('a', engine.version)
+    assert len(broker.latest(world.id)[3]) == len(engine.store)
+
+
+def test_registry_asks_for_a_held_world_once_per_maintain(app, broker, monkeypatch):
+    broker.acquire(1, 'elsewhere')
+    registry = ShardRegistry(app, broker)
+    calls = []
+    acquire = broker.acquire
+    monkeypatch.setattr(broker, 'acquire', lambda *args: calls.append(args) or acquire(*args))
+    try:
+        engines = {registry.engine(1) for _ in range(20)}
+        assert len(engines) == 1
+        assert isinstance(engines.pop(), RemoteEngine)
+        assert len(calls) == 1
+
+        registry.maintain()
+        registry.engine(1)
+        assert len(calls) == 2
+    finally:
+        registry.shutdown()
+
+
+def test_leases_are_renewed_while_a_world_loads(app, world, broker, monkeypatch):
+    from app.simulation import SimulationEngine
+
+    loading, proceed = threading.Event(), threading.Event()
+    load_world = SimulationEngine.load_world
+
+    def slow_load(engine):
+        loading.set()
+        proceed.wait(5)
+        load_world(engine)
+
+    monkeypatch.setattr(SimulationEngine, 'load_world', slow_load)
+    registry = ShardRegistry(app, broker)
+    started = []
+    loader = threading.Thread(target=lambda: started.append(registry.engine(world.id)))
+    try:
+        loader.start()
+        assert loading.wait(5)
+        maintainer = threading.Thread(target=registry.maintain)
+        maintainer.start()
+        maintainer.join(2)
+        assert not maintainer.is_alive()
+        assert broker.leases() == [{'map_id': world.id, 'owner': registry.owner}]
+    finally:
+        proceed.set()
+        loader.join(5)
+        registry.shutdown()
+    assert isinstance(started[0], SimulationEngine)
+
+
+def test_a_discarded_engine_never_writes_back(app, world):
+    from app.models import Character, db
+    from app.simulation import SimulationEngine
+
+    with app.app_context():
+        character = Character(name='Lost', role='Worker', x=1, y=1, target_x=1, target_y=1, map_id=world.id)
+        db.session.add(character)
+        db.session.commit()
+        character_id = character.id
+
+    engine = SimulationEngine(app, map_id=world.id, persist_interval=3600)
+    engine.start()
+    engine.set_target(character_id, 12343.0, 1.0)
+    # The lease moved on: the new owner writes its own state
+    engine.stop(persist=False)
+    with app.app_context():
+        db.session.get(Character, character_id).target_x = 777.0
+        db.session.commit()
+
+    engine.set_target(character_id, 5.0, 5.0)  # a late order from a stale reference
+    engine.stop()  # what the exit hook runs
+    with app.app_context():
+        assert db.session.get(Character, character_id).target_x == 777.0
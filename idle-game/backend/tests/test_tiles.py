@@ -0,0 +1,86 @@
+# tests/test_tiles.py
+import struct
+import zlib
+
+import numpy as np
+
+from app.utils import tiles
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def layer():
+    return tiles.MapLayer(
+        800, 600,
+        buildings=[{'x': 10, 'y': 10, 'width': 100, 'height': 50, 'color': '#ff0000'}],
+        trees=[{'x': 400, 'y': 300, 'size': 20}],
+        lines=[{'x1': 0, 'y1': 500, 'x2': 799, 'y2': 500}],
+        maxsize=2,
+    )
+
+
+def test_grid_covers_the_map_at_every_zoom():
+    map_layer = layer()
+
+    assert map_layer.grid_size(tiles.NATIVE_ZOOM) == (4, 3)
+    assert map_layer.grid_size(tiles.MIN_ZOOM) == (1, 1)
+    assert map_layer.grid_size(tiles.MAX_ZOOM) == (7, 5)
+    assert map_layer.has_tile(tiles.NATIVE_ZOOM, 3, 2)
+    assert not map_layer.has_tile(tiles.NATIVE_ZOOM, 4, 0)
+    assert not map_layer.has_tile(tiles.MAX_ZOOM + 1, 0, 0)
+    assert map_layer.tile(tiles.NATIVE_ZOOM, -1, 0) is None
+
+
+def test_render_draws_the_shapes():
+    pixels = layer().render(tiles.NATIVE_ZOOM, 0, 0)
+
+    assert pixels.shape == (tiles.TILE_SIZE, tiles.TILE_SIZE, 4)
+    assert pixels[30, 50].tolist() == [255, 0, 0, 255]  # inside the building
+    assert pixels[200, 200, 3] == 0  # nothing drawn here
+
+
+def test_tiles_are_cached_in_a_bounded_lru():
+    map_layer = layer()
+    png, etag = map_layer.tile(tiles.NATIVE_ZOOM, 0, 0)
+
+    assert png.startswith(PNG_SIGNATURE)
+    assert map_layer.tile(tiles.NATIVE_ZOOM, 0, 0)[0] is png
+    map_layer.tile(tiles.NATIVE_ZOOM, 1, 0)
+    map_layer.tile(tiles.NATIVE_ZOOM, 2, 0)
+    assert len(map_layer._tiles) == 2
+    assert (tiles.NATIVE_ZOOM, 0, 0) not in map_layer._tiles
+    # A re-rendered tile keeps its ETag
+    assert map_layer.tile(tiles.NATIVE_ZOOM, 0, 0)[1] == etag
+
+
+def test_encode_png_decodes_to_the_pixels():
+    pixels = np.zeros((3, 2, 4), dtype=np.uint8)
+    pixels[1:, 1] = (1, 2, 3, 4)
+    png = tiles.encode_png(pixels)
+
+    assert struct.unpack('>II', png[16:24]) == (2, 3)
+    start = png.index(b'IDAT') + 4
+    length = struct.unpack('>I', png[start - 8:start - 4])[0]
+    raw = np.frombuffer(zlib.decompress(png[start:start + length]), dtype=np.uint8).reshape(3, 9)
+    # Up filter on every row: undo it by summing down the columns
+    assert raw[:, 0].tolist() == [2, 2, 2]
+    decoded = np.cumsum(raw[:, 1:], axis=0, dtype=np.uint8).reshape(3, 2, 4)
+    assert np.array_equal(decoded, pixels)
+
+
+def test_tile_endpoints(client, world):
+    info = client.get(f'/api/map/{world.id}/tiles').get_json()
+    assert info['url'] == f'/api/map/{world.id}/tiles/{{z}}/{{x}}/{{y}}.png'
+
+    response = client.get(f'/api/map/{world.id}/tiles/{tiles.NATIVE_ZOOM}/0/0.png')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data.startswith(PNG_SIGNATURE)
+    assert response.cache_control.immutable
+
+    revalidated = client.get(f'/api/map/{world.id}/tiles/{tiles.NATIVE_ZOOM}/0/0.png',
+                             headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    assert client.get(f'/api/map/{world.id}/tiles/{tiles.NATIVE_ZOOM}/99/0.png').status_code == 404
+    assert client.get('/api/map/999999/tiles/0/0/0.png').status_code == 404
@@ -0,0 +1,117 @@
+-- Schema for the idle game backend (MySQL 8).
+-- Matches backend/app/models.py; db.create_all() creates the same tables.
+
+CREATE DATABASE IF NOT EXISTS idle_game
+    CHARACTER SET utf8mb4
+    COLLATE utf8mb4_unicode_ci;
+
+USE idle_game;
+
+CREATE TABLE IF NOT EXISTS game_map (
+    id INT NOT NULL AUTO_INCREMENT,
+    width INT DEFAULT 800,
+    height INT DEFAULT 600,
+    -- JSON geometry of maps saved before the map_* tables below; NULL for newer maps
+    buildings TEXT,
+    trees TEXT,
+    paths TEXT,
+    -- MapGenerator seed that reproduces the map
+    seed BIGINT,
+    -- Bit-packed walkability grid, one bit per 20 px cell, row-major
+    grid LONGBLOB,
+    created_at DATETIME,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB;
+
+-- Map geometry, one row per item. min_x/min_y/max_x/max_y is the item's
+-- bounding box. The region index covers every predicate of a region query:
+--   WHERE map_id = ? AND min_x <= ? AND max_x >= ? AND min_y <= ? AND max_y >= ?
+-- Rows are returned in id order, which is the order the generator produced them.
+
+CREATE TABLE IF NOT EXISTS map_buildings (
+    id INT NOT NULL AUTO_INCREMENT,
+    map_id INT NOT NULL,
+    x INT NOT NULL,
+    y INT NOT NULL,
+    width INT NOT NULL,
+    height INT NOT NULL,
+    color VARCHAR(7),
+    min_x FLOAT NOT NULL,
+    min_y FLOAT NOT NULL,
+    max_x FLOAT NOT NULL,
+    max_y FLOAT NOT NULL,
+    PRIMARY KEY (id),
+    KEY ix_map_buildings_region (map_id, min_x, max_x, min_y, max_y),
+    CONSTRAINT fk_map_buildings_map FOREIGN KEY (map_id) REFERENCES game_map (id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS map_trees (
+    id INT NOT NULL AUTO_INCREMENT,
+    map_id INT NOT NULL,
+    x INT NOT NULL,
+    y INT NOT NULL,
+    size INT NOT NULL,
+    color VARCHAR(7),
+    min_x FLOAT NOT NULL,
+    min_y FLOAT NOT NULL,
+    max_x FLOAT NOT NULL,
+    max_y FLOAT NOT NULL,
+    PRIMARY KEY (id),
+    KEY ix_map_trees_region (map_id, min_x, max_x, min_y, max_y),
+    CONSTRAINT fk_map_trees_map FOREIGN KEY (map_id) REFERENCES game_map (id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS map_path_lines (
+    id INT NOT NULL AUTO_INCREMENT,
+    map_id INT NOT NULL,
+    x1 INT NOT NULL,
+    y1 INT NOT NULL,
+    x2 INT NOT NULL,
+    y2 INT NOT NULL,
+    color VARCHAR(7),
+    min_x FLOAT NOT NULL,
+    min_y FLOAT NOT NULL,
+    max_x FLOAT NOT NULL,
+    max_y FLOAT NOT NULL,
+    PRIMARY KEY (id),
+    KEY ix_map_path_lines_region (map_id, min_x, max_x, min_y, max_y),
+    CONSTRAINT fk_map_path_lines_map FOREIGN KEY (map_id) REFERENCES game_map (id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS map_path_points (
+    id INT NOT NULL AUTO_INCREMENT,
+    map_id INT NOT NULL,
+    x DOUBLE NOT NULL,
+    y DOUBLE NOT NULL,
+    min_x DOUBLE NOT NULL,
+    min_y DOUBLE NOT NULL,
+    max_x DOUBLE NOT NULL,
+    max_y DOUBLE NOT NULL,
+    PRIMARY KEY (id),
+    KEY ix_map_path_points_region (map_id, min_x, max_x, min_y, max_y),
+    CONSTRAINT fk_map_path_points_map FOREIGN KEY (map_id) REFERENCES game_map (id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS characters (
+    id INT NOT NULL AUTO_INCREMENT,
+    name VARCHAR(100) NOT NULL,
+    role VARCHAR(50) NOT NULL,
+    x FLOAT DEFAULT 100,
+    y FLOAT DEFAULT 100,
+    target_x FLOAT DEFAULT 100,
+    target_y FLOAT DEFAULT 100,
+    speed FLOAT DEFAULT 2,
+    color VARCHAR(7) DEFAULT '#3498db',
+    map_id INT DEFAULT 1,
+    last_update DATETIME,
+    PRIMARY KEY (id),
+    -- Worlds load and persist their characters by map
+    KEY ix_characters_map_id (map_id),
+    CONSTRAINT fk_characters_map FOREIGN KEY (map_id) REFERENCES game_map (id)
+) ENGINE=InnoDB;
+
+-- Upgrading a database created before these indexes and tables:
+--   ALTER TABLE game_map ADD COLUMN seed BIGINT, ADD COLUMN grid LONGBLOB;
+--   CREATE INDEX ix_characters_map_id ON characters (map_id);
+-- The map_* tables above are created as usual. Maps saved before them keep their
+-- JSON columns, which the backend still reads.
@@ -5,11 +5,16 @@ const LoadingPage = () => {
   const [progress, setProgress] = useState(0);
 
   useEffect(() => {
-    // Optionally trigger backend process start
-    fetch('http://localhost:5000/api/start-process').catch(console.error);
+    // Start the loading job and follow that job's progress
+    let jobId = null;
+    fetch('http://localhost:5000/api/start-process')
+      .then((res) => res.json())
+      .then((data) => { jobId = data.job_id; })
+      .catch(console.error);
 
     const interval = setInterval(() => {
-      fetch('http://localhost:5000/api/progress')
+      if (!jobId) return;
+      fetch(`http://localhost:5000/api/progress?job_id=${jobId}`)
         .then((res) => res.json())
         .then((data) => {
           setProgress(data.progress || 0);
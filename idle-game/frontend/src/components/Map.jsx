@@ -1,68 +1,52 @@
 // components/Map.jsx
 import React, { useRef, useEffect } from 'react';
 
-// Map Component
-const Map = ({ mapData, characters, onCharacterClick }) => {
+// Draw the map's pre-rendered static layer (buildings, trees, paths) from its tiles
+const drawTiles = (ctx, tileLayer) => {
+  const zoom = tileLayer.zooms.find(z => z.zoom === tileLayer.native_zoom);
+  const span = tileLayer.tile_size / zoom.scale; // map pixels covered by one tile
+  let cancelled = false;
+
+  for (let x = 0; x < zoom.columns; x++) {
+    for (let y = 0; y < zoom.rows; y++) {
+      const image = new Image();
+      image.onload = () => {
+        if (!cancelled) ctx.drawImage(image, x * span, y * span, span, span);
+      };
+      image.onerror = () => console.error(`Failed to load map tile ${x},${y}`);
+      image.src = tileLayer.url
+        .replace('{z}', zoom.zoom)
+        .replace('{x}', x)
+        .replace('{y}', y);
+    }
+  }
+  return () => { cancelled = true; };
+};
+
+// Map Component: the tile layer underneath, characters redrawn on a canvas above it
+const Map = ({ mapData, tileLayer, characters, onCharacterClick }) => {
+  const backgroundRef = useRef(null);
   const canvasRef = useRef(null);
+  const width = mapData?.width || 800;
+  const height = mapData?.height || 600;
+
+  useEffect(() => {
+    if (!tileLayer || !backgroundRef.current) return undefined;
+
+    const ctx = backgroundRef.current.getContext('2d');
+    ctx.clearRect(0, 0, width, height);
+    return drawTiles(ctx, tileLayer);
+  }, [tileLayer, width, height]);
 
   useEffect(() => {
-    if (!mapData || !canvasRef.current) return;
+    if (!canvasRef.current) return;
 
     const canvas = canvasRef.current;
     const ctx = canvas.getContext('2d');
     
-    // Clear canvas
+    // Clear canvas; the static layer underneath is never redrawn
     ctx.clearRect(0, 0, canvas.width, canvas.height);
     
-    // Draw buildings (rectangles)
-    mapData.buildings?.forEach(building => {
-      ctx.fillStyle = building.color || '#8B4513';
-      ctx.fillRect(building.x, building.y, building.width, building.height);
-      
-      // Add border
-      ctx.strokeStyle = '#654321';
-      ctx.lineWidth = 2;
-      ctx.strokeRect(building.x, building.y, building.width, building.height);
-    });
-    
-    // Draw trees (triangles)
-    mapData.trees?.forEach(tree => {
-      ctx.fillStyle = tree.color || '#228B22';
-      ctx.beginPath();
-      ctx.moveTo(tree.x, tree.y - tree.size);
-      ctx.lineTo(tree.x - tree.size, tree.y + tree.size);
-      ctx.lineTo(tree.x + tree.size, tree.y + tree.size);
-      ctx.closePath();
-      ctx.fill();
-      
-      // Add border
-      ctx.strokeStyle = '#006400';
-      ctx.lineWidth = 1;
-      ctx.stroke();
-    });
-    
-    // Draw paths (yellow lines)
-    if (mapData.paths?.lines) {
-      ctx.strokeStyle = '#FFD700';
-      ctx.lineWidth = 8;
-      mapData.paths.lines.forEach(line => {
-        ctx.beginPath();
-        ctx.moveTo(line.x1, line.y1);
-        ctx.lineTo(line.x2, line.y2);
-        ctx.stroke();
-      });
-    }
-    
-    // Draw path points (for debugging)
-    if (mapData.paths?.points) {
-      ctx.fillStyle = '#FFA500';
-      mapData.paths.points.forEach(point => {
-        ctx.beginPath();
-        ctx.arc(point.x, point.y, 3, 0, 2 * Math.PI);
-        ctx.fill();
-      });
-    }
-    
     // Draw characters
     characters.forEach(character => {
       // Draw character circle
@@ -97,7 +81,7 @@ const Map = ({ mapData, characters, onCharacterClick }) => {
       }
     });
     
-  }, [mapData, characters]);
+  }, [characters]);
 
   const handleCanvasClick = (e) => {
     const canvas = canvasRef.current;
@@ -115,13 +99,20 @@ const Map = ({ mapData, characters, onCharacterClick }) => {
   };
 
   return (
-    <div className="border-2 border-gray-300 rounded-lg">
+    <div className="border-2 border-gray-300 rounded-lg" style={{ position: 'relative', width, height }}>
+      <canvas
+        ref={backgroundRef}
+        width={width}
+        height={height}
+        style={{ position: 'absolute', left: 0, top: 0 }}
+      />
       <canvas
         ref={canvasRef}
-        width={800}
-        height={600}
+        width={width}
+        height={height}
         onClick={handleCanvasClick}
         className="cursor-pointer"
+        style={{ position: 'absolute', left: 0, top: 0 }}
       />
     </div>
   );
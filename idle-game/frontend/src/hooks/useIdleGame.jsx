@@ -1,10 +1,12 @@
 // hooks/useIdleGame.js
 import { useState, useEffect } from 'react';
+import { SNAPSHOT_MIME_TYPE, decodeMap } from '../utils/snapshot';
 
 const API_BASE_URL = 'http://localhost:5000';
 
 const useIdleGame = () => {
   const [mapData, setMapData] = useState(null);
+  const [tileLayer, setTileLayer] = useState(null);
   const [characters, setCharacters] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -12,10 +14,18 @@ const useIdleGame = () => {
   const fetchMapData = async () => {
     try {
       setIsLoading(true);
-      const response = await fetch(`${API_BASE_URL}/api/map`);
-      const data = await response.json();
+      const response = await fetch(`${API_BASE_URL}/api/map`, {
+        headers: { Accept: `${SNAPSHOT_MIME_TYPE}, application/json;q=0.5` },
+      });
+      const isBinary = response.headers.get('Content-Type')?.startsWith(SNAPSHOT_MIME_TYPE);
+      const data = isBinary ? decodeMap(await response.arrayBuffer()) : await response.json();
       setMapData(data);
 
+      // Buildings, trees and paths are drawn from the map's pre-rendered tiles
+      const tilesResponse = await fetch(`${API_BASE_URL}/api/map/${data.id}/tiles`);
+      const tiles = await tilesResponse.json();
+      setTileLayer({ ...tiles, url: `${API_BASE_URL}${tiles.url}` });
+
       const charactersResponse = await fetch(`${API_BASE_URL}/api/characters`);
       const charactersData = await charactersResponse.json();
       setCharacters(charactersData);
@@ -27,17 +37,19 @@ const useIdleGame = () => {
     }
   };
 
-  const updateCharacters = async () => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/api/characters/update`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-      });
-      const updatedCharacters = await response.json();
-      setCharacters(updatedCharacters);
-    } catch (err) {
-      console.error('Error updating characters:', err);
+  // Apply a position delta from /api/stream to the current character list
+  const applyDelta = (prev, delta) => {
+    const positions = new Map();
+    delta.ids.forEach((id, i) => positions.set(id, { x: delta.x[i], y: delta.y[i] }));
+    const targets = new Map();
+    if (delta.targets) {
+      delta.targets.ids.forEach((id, i) => targets.set(id, { target_x: delta.targets.x[i], target_y: delta.targets.y[i] }));
     }
+    return prev.map(char => {
+      const position = positions.get(char.id);
+      const target = targets.get(char.id);
+      return position || target ? { ...char, ...position, ...target } : char;
+    });
   };
 
   const createCharacter = async (characterData) => {
@@ -86,14 +98,26 @@ const useIdleGame = () => {
   }, []);
 
   useEffect(() => {
-    const interval = setInterval(() => {
-      if (characters.length > 0) updateCharacters();
-    }, 100);
-    return () => clearInterval(interval);
-  }, [characters.length]);
+    // The server sends the full world once, then only what changed each tick
+    const source = new EventSource(`${API_BASE_URL}/api/stream?quantize=1`);
+    source.addEventListener('full', (event) => {
+      setCharacters(JSON.parse(event.data).characters);
+    });
+    source.addEventListener('added', (event) => {
+      const added = JSON.parse(event.data);
+      setCharacters(prev => [...prev.filter(char => !added.some(a => a.id === char.id)), ...added]);
+    });
+    source.addEventListener('delta', (event) => {
+      const delta = JSON.parse(event.data);
+      setCharacters(prev => applyDelta(prev, delta));
+    });
+    source.onerror = (err) => console.error('World stream error:', err);
+    return () => source.close();
+  }, []);
 
   return {
     mapData,
+    tileLayer,
     characters,
     isLoading,
     error,
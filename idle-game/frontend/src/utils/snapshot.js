@@ -0,0 +1,100 @@
+// utils/snapshot.js
+// Decoder for the backend's binary snapshot format (application/x-idle-snapshot).
+// See backend/app/utils/binary.py for the layout.
+
+export const SNAPSHOT_MIME_TYPE = 'application/x-idle-snapshot';
+
+const TYPED_ARRAYS = {
+  1: Uint8Array,
+  2: Uint16Array,
+  3: Uint32Array,
+  4: Float32Array,
+};
+
+const HEADER_SIZE = 8;
+const SECTION_SIZE = 12;
+
+// Returns { TAG: { data: TypedArray, columns } } without copying the payloads
+export const readSnapshot = (buffer) => {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'IDLE' || view.getUint16(4, true) !== 1) {
+    throw new Error('Not an idle-game snapshot');
+  }
+
+  const count = view.getUint16(6, true);
+  const sections = {};
+  let offset = HEADER_SIZE;
+  for (let i = 0; i < count; i++) {
+    const tag = String.fromCharCode(...new Uint8Array(buffer, offset, 4));
+    const dtype = view.getUint8(offset + 4);
+    const columns = view.getUint8(offset + 5);
+    const length = view.getUint32(offset + 8, true);
+    offset += SECTION_SIZE;
+
+    const TypedArray = TYPED_ARRAYS[dtype];
+    sections[tag] = {
+      data: new TypedArray(buffer, offset, length / TypedArray.BYTES_PER_ELEMENT),
+      columns,
+    };
+    offset += length + ((4 - (length % 4)) % 4);
+  }
+  return sections;
+};
+
+const toColor = (value) => `#${value.toString(16).padStart(6, '0')}`;
+
+const rows = ({ data, columns }) => {
+  const result = [];
+  for (let i = 0; i < data.length; i += columns) {
+    result.push(data.subarray(i, i + columns));
+  }
+  return result;
+};
+
+// Decode a map snapshot into the same shape as the JSON /api/map response
+export const decodeMap = (buffer) => {
+  const s = readSnapshot(buffer);
+  const [id, width, height] = s.META.data;
+  const palette = Array.from(s.PALT.data, toColor);
+
+  return {
+    id,
+    width,
+    height,
+    buildings: rows(s.BLDG).map(([x, y, w, h], i) => ({
+      x, y, width: w, height: h, color: palette[s.BLDC.data[i]],
+    })),
+    trees: rows(s.TREE).map(([x, y, size], i) => ({
+      x, y, size, color: palette[s.TREC.data[i]],
+    })),
+    paths: {
+      lines: rows(s.LINE).map(([x1, y1, x2, y2], i) => ({
+        x1, y1, x2, y2, color: palette[s.LINC.data[i]],
+      })),
+      points: rows(s.PNTS).map(([x, y]) => ({ x, y })),
+    },
+  };
+};
+
+// Decode a character snapshot into the same shape as the JSON /api/characters response
+export const decodeCharacters = (buffer) => {
+  const s = readSnapshot(buffer);
+  const strings = new TextDecoder().decode(s.CSTR.data).split('\0');
+
+  return Array.from(s.CIDS.data, (id, i) => {
+    const [x, y, targetX, targetY, speed] = s.CPOS.data.subarray(i * 5, i * 5 + 5);
+    return {
+      id,
+      name: strings[i * 2],
+      role: strings[i * 2 + 1],
+      x,
+      y,
+      target_x: targetX,
+      target_y: targetY,
+      speed,
+      color: toColor(s.CCOL.data[i]),
+      map_id: s.CMAP.data[i],
+    };
+  });
+};